@@ -0,0 +1,83 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Run the client and the server over the loopback interface with different
+ACK coalescing settings and report DATA and ACK packet rates.
+"""
+import asyncio
+import logging
+import sys
+
+from testledbat import udpserver
+from testledbat import clientrole
+from testledbat import serverrole
+
+TEST_LEN = 3
+
+class CountingUdpServer(udpserver.UdpServer):
+    """UdpServer counting the datagrams sent"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.num_sent = 0
+
+    def send_data(self, data, addr):
+        self.num_sent += 1
+        super().send_data(data, addr)
+
+def run_test(ack_every, test_len):
+    """Run one test and return (data_packets, ack_packets)"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    (srv_transport, srv_protocol) = loop.run_until_complete(loop.create_datagram_endpoint(
+        CountingUdpServer, local_addr=('127.0.0.1', 0)))
+    (cli_transport, cli_protocol) = loop.run_until_complete(loop.create_datagram_endpoint(
+        CountingUdpServer, local_addr=('127.0.0.1', 0)))
+
+    server = serverrole.ServerRole(srv_protocol)
+    server.start_server(ack_every=ack_every)
+
+    client = clientrole.ClientRole(cli_protocol)
+    client.start_client(remote_ip='127.0.0.1',
+                        remote_port=srv_transport.get_extra_info('sockname')[1],
+                        make_log=False, log_name=None, log_dir=None,
+                        test_len=test_len, ledbat_params={}, parallel=1)
+
+    # Client stops the loop when the test ends
+    loop.run_forever()
+
+    srv_transport.close()
+    cli_transport.close()
+    loop.close()
+
+    return (cli_protocol.num_sent, srv_protocol.num_sent)
+
+def main():
+    """Run the test for several ACK_EVERY values"""
+
+    logging.basicConfig(level=logging.WARNING)
+    test_len = float(sys.argv[1]) if len(sys.argv) > 1 else TEST_LEN
+
+    print('{:>9} {:>12} {:>12} {:>10}'.format('ACK every', 'DATA [pkt/s]', 'ACK [pkt/s]', 'ACK/DATA'))
+    for ack_every in [1, 2, 4, 8, 16]:
+        (num_data, num_ack) = run_test(ack_every, test_len)
+        print('{:>9} {:>12.0f} {:>12.0f} {:>10.3f}'.format(
+            ack_every, num_data / test_len, num_ack / test_len, num_ack / max(num_data, 1)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Compare cost of ACKs carrying a different number of delay samples when fed
+as Python lists (update_measurements) and as raw buffers
+(update_measurements_raw).
+"""
+import array
+import random
+import time
+
+from ledbat import simpleledbat
+
+NUM_ACKS = 20000
+
+def bench_lists(acks):
+    """Feed ACKs the way the test application used to: struct per sample,
+       conversion to milliseconds and seconds in list comprehensions"""
+
+    ledbat = simpleledbat.SimpleLedbat()
+    t_start = time.perf_counter()
+    for (delays, rtts) in acks:
+        ledbat.update_measurements(None, [x / 1000 for x in delays], [x / 1000000 for x in rtts])
+    return time.perf_counter() - t_start
+
+def bench_raw(acks):
+    """Feed ACKs as array.array buffers of microseconds"""
+
+    ledbat = simpleledbat.SimpleLedbat()
+    t_start = time.perf_counter()
+    for (delays, rtts) in acks:
+        ledbat.update_measurements_raw(None, delays, rtts)
+    return time.perf_counter() - t_start
+
+def main():
+    """Run the benchmark for several ACK sizes"""
+
+    print('{:>8} {:>14} {:>14}'.format('Samples', 'lists [ACK/s]', 'raw [ACK/s]'))
+
+    for num_samples in [1, 4, 16, 64]:
+        acks = [(array.array('Q', [random.randint(10000, 100000) for _ in range(num_samples)]),
+                 array.array('d', [random.uniform(20000, 200000) for _ in range(num_samples)]))
+                for _ in range(NUM_ACKS)]
+
+        t_lists = bench_lists(acks)
+        t_raw = bench_raw(acks)
+        print('{:>8} {:>14.0f} {:>14.0f}'.format(
+            num_samples, NUM_ACKS / t_lists, NUM_ACKS / t_raw))
+
+if __name__ == '__main__':
+    main()
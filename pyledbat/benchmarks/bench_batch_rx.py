@@ -0,0 +1,106 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Measure how many DATA datagrams per second the UdpServer can receive and
+decode on one core, reading them one by one or in batches. Datagrams are
+sent over the loopback interface by a separate process.
+"""
+import asyncio
+import logging
+import multiprocessing
+import socket
+import sys
+import time
+
+from testledbat import udpserver
+from testledbat import codec
+
+TEST_LEN = 3
+SZ_DATA = 1024
+
+class CountingReceiver(object):
+    """Receiver decoding DATA messages like the server role does"""
+
+    def __init__(self):
+        self.num_received = 0
+
+    def datagram_received(self, data, addr, rx_time=None):
+        if rx_time is None:
+            rx_time = time.time()
+        (msg_type, _, _) = codec.decode_header(data)
+        if msg_type == codec.MSG_DATA:
+            codec.decode_data(data)
+        self.num_received += 1
+
+    def datagrams_received(self, batch):
+        for (data, addr, rx_time) in batch:
+            self.datagram_received(data, addr, rx_time)
+
+def blast(port, test_len):
+    """Send DATA messages to the port for test_len seconds"""
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    encoder = codec.DataEncoder(SZ_DATA)
+    addr = ('127.0.0.1', port)
+
+    seq = 0
+    t_end = time.time() + test_len
+    while time.time() < t_end:
+        for _ in range(100):
+            seq += 1
+            try:
+                sock.sendto(encoder.encode(1, 1, seq, 0), addr)
+            except OSError:
+                pass
+    sock.close()
+
+def run_test(rx_batch, test_len):
+    """Return number of datagrams received per second"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    (transport, protocol) = loop.run_until_complete(loop.create_datagram_endpoint(
+        lambda: udpserver.UdpServer(rx_batch=rx_batch), local_addr=('127.0.0.1', 0)))
+
+    receiver = CountingReceiver()
+    protocol.register_receiver(receiver)
+
+    sender = multiprocessing.Process(
+        target=blast, args=(transport.get_extra_info('sockname')[1], test_len))
+    sender.start()
+
+    loop.run_until_complete(asyncio.sleep(test_len))
+    sender.join()
+
+    transport.close()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+    return receiver.num_received / test_len
+
+def main():
+    """Compare per-datagram and batch reception"""
+
+    logging.basicConfig(level=logging.CRITICAL)
+    test_len = float(sys.argv[1]) if len(sys.argv) > 1 else TEST_LEN
+
+    print('{:>8} {:>12}'.format('RX batch', 'RX [pkt/s]'))
+    for rx_batch in [0, 8, 64]:
+        print('{:>8} {:>12.0f}'.format(rx_batch, run_test(rx_batch, test_len)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Compare encoding and decoding of DATA and ACK messages done with ad-hoc
+struct.pack / bytearray building (as the test application used to do) and
+with the precompiled codec.
+"""
+import struct
+import timeit
+
+from testledbat import codec
+
+NUM_MSGS = 100000
+SZ_DATA = 1024
+NUM_DELAYS = 4
+
+def data_adhoc():
+    """DATA message built and parsed with ad-hoc struct calls"""
+
+    msg = bytearray()
+    msg.extend(struct.pack('>IIIIQ', 2, 1, 2, 12345, 1500000000000000))
+    msg.extend(SZ_DATA * bytes([127]))
+    msg = bytes(msg)
+    struct.unpack('>III', msg[0:12])
+    struct.unpack('>IQ', msg[12:][0:12])
+
+DATA_ENCODER = codec.DataEncoder(SZ_DATA)
+
+def data_codec():
+    """DATA message built and parsed with the codec"""
+
+    msg = DATA_ENCODER.encode(1, 2, 12345, 1500000000000000)
+    codec.decode_header(msg)
+    codec.decode_data(msg)
+
+DELAYS = [12345 + i for i in range(NUM_DELAYS)]
+
+def ack_adhoc():
+    """ACK message built and parsed with ad-hoc struct calls"""
+
+    msg = bytearray()
+    msg.extend(struct.pack('>III', 3, 1, 2))
+    msg.extend(struct.pack('>II', 1, len(DELAYS)))
+    msg.extend(struct.pack('>II', 100, 104))
+    for sample in DELAYS:
+        msg.extend(struct.pack('>Q', int(sample)))
+    msg = bytes(msg)
+    struct.unpack('>III', msg[0:12])
+    data = msg[12:]
+    (num_blocks, num_delays) = struct.unpack('>II', data[0:8])
+    struct.unpack('>{}I'.format(2 * num_blocks), data[8:8+num_blocks*8])
+    offset = 8 + num_blocks * 8
+    [struct.unpack('>Q', data[offset+i*8:offset+8+i*8])[0] / 1000 for i in range(num_delays)]
+
+ACK_ENCODER = codec.AckEncoder()
+BLOCKS = [(100, 104)]
+
+def ack_codec():
+    """ACK message built and parsed with the codec"""
+
+    msg = ACK_ENCODER.encode(1, 2, BLOCKS, DELAYS)
+    codec.decode_header(msg)
+    codec.decode_ack(msg)
+
+def main():
+    """Run the benchmark"""
+
+    print('{:>6} {:>14} {:>14}'.format('Msg', 'ad-hoc [msg/s]', 'codec [msg/s]'))
+    for (name, adhoc, precompiled) in [('DATA', data_adhoc, data_codec),
+                                       ('ACK', ack_adhoc, ack_codec)]:
+        rates = [NUM_MSGS / min(timeit.repeat(func, number=NUM_MSGS, repeat=3))
+                 for func in [adhoc, precompiled]]
+        print('{:>6} {:>14.0f} {:>14.0f}'.format(name, *rates))
+
+if __name__ == '__main__':
+    main()
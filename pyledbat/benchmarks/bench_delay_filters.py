@@ -0,0 +1,79 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Compare per-sample cost of the list based delay filters (as used before
+MinFilter was introduced) with MinFilter ring buffers.
+"""
+import math
+import random
+import timeit
+
+from ledbat.minfilter import MinFilter
+
+NUM_SAMPLES = 100000
+
+def list_filters(samples, current_filter, base_history):
+    """Delay filters implemented with list shifting and min()"""
+
+    current = current_filter * [1000000]
+    base = base_history * [float('inf')]
+    window = -1 * math.ceil(base_history / 4)
+
+    for (num, delay) in enumerate(samples):
+        if num % 100 == 0:
+            base = base[1:]
+            base.append(delay)
+        else:
+            base[-1] = min([base[-1], delay])
+        current = current[1:]
+        current.append(delay)
+        _ = min(current[window:]) - min(base)
+
+def ring_filters(samples, current_filter, base_history):
+    """Delay filters implemented with MinFilter"""
+
+    current = MinFilter(min(current_filter, math.ceil(base_history / 4)), 1000000)
+    base = MinFilter(base_history, float('inf'))
+
+    for (num, delay) in enumerate(samples):
+        if num % 100 == 0:
+            base.append(delay)
+        else:
+            base.update_newest(delay)
+        current.append(delay)
+        _ = current.minimum - base.minimum
+
+def main():
+    """Run the benchmark for several filter sizes"""
+
+    samples = [random.uniform(10, 100) for _ in range(NUM_SAMPLES)]
+
+    print('{:>8} {:>8} {:>14} {:>14}'.format(
+        'CURRENT', 'BASE', 'list [smp/s]', 'ring [smp/s]'))
+
+    for (current_filter, base_history) in [(8, 10), (64, 256), (1024, 4096)]:
+        res = []
+        for func in [list_filters, ring_filters]:
+            t_run = min(timeit.repeat(
+                lambda: func(samples, current_filter, base_history),
+                number=1, repeat=3))
+            res.append(NUM_SAMPLES / t_run)
+
+        print('{:>8} {:>8} {:>14.0f} {:>14.0f}'.format(
+            current_filter, base_history, res[0], res[1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Run the client and the server roles in one event loop connected by the
+emulated link and report the DATA rate of the full stack and the time DATA
+waited in the link queue. With an unlimited link the rate is bound by the
+CPU, otherwise by LEDBAT.
+"""
+import asyncio
+import logging
+import sys
+
+from testledbat import clientrole
+from testledbat import serverrole
+from testledbat import emulink
+
+TEST_LEN = 5
+
+SCENARIOS = [
+    ('unlimited', {}),
+    ('10M/20ms', {'rate': 10000000, 'delay': 0.02, 'queue': 200}),
+    ('10M/20ms/jitter', {'rate': 10000000, 'delay': 0.02, 'jitter': 0.002, 'queue': 200}),
+    ('10M/20ms/reorder', {'rate': 10000000, 'delay': 0.02, 'queue': 200, 'reorder': 0.01}),
+    ('10M/20ms/loss', {'rate': 10000000, 'delay': 0.02, 'queue': 200, 'loss': 0.001}),
+]
+
+def run_test(forward, test_len, parallel=1):
+    """Return tuple (summaries of the streams, forward direction stats)"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    reverse = {'delay': forward.get('delay', 0)}
+    link = emulink.EmulatedLink(forward, reverse, loop=loop)
+
+    server = serverrole.ServerRole(link.server)
+    server.start_server()
+
+    client = clientrole.ClientRole(link.client)
+    client.start_client(remote_ip=link.server.addr[0], remote_port=link.server.addr[1],
+                        test_len=test_len, parallel=parallel)
+
+    # Client stops the loop when the last stream is removed
+    loop.run_forever()
+
+    link.close()
+    loop.close()
+
+    return (client.results, link.forward.get_stats())
+
+def main():
+    """Run the full stack over the emulated links"""
+
+    logging.basicConfig(level=logging.CRITICAL)
+    test_len = float(sys.argv[1]) if len(sys.argv) > 1 else TEST_LEN
+
+    print('{:>16} {:>12} {:>8} {:>8} {:>16}'.format(
+        'Link', 'TX [pkt/s]', 'Acked', 'Resent', 'Queue avg/max ms'))
+    for (name, forward) in SCENARIOS:
+        (results, stats) = run_test(forward, test_len)
+        print('{:>16} {:>12.0f} {:>8} {:>8} {:>16}'.format(
+            name, sum([result['TxRate'] for result in results]),
+            sum([result['Acked'] for result in results]),
+            sum([result['Resent'] for result in results]),
+            '{:.1f}/{:.1f}'.format(stats['QueuingAvg'] * 1000, stats['QueuingMax'] * 1000)))
+
+if __name__ == '__main__':
+    main()
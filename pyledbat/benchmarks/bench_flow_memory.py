@@ -0,0 +1,45 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Measure memory used by SimpleLedbat flow state when many flows share one
+LedbatConfig.
+"""
+import sys
+import tracemalloc
+
+from ledbat import baseledbat
+from ledbat import simpleledbat
+
+NUM_FLOWS = 100000
+
+def main():
+    """Create NUM_FLOWS flows and report the memory used by them"""
+
+    num_flows = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_FLOWS
+    config = baseledbat.LedbatConfig()
+
+    tracemalloc.start()
+    mem_before = tracemalloc.get_traced_memory()[0]
+    flows = [simpleledbat.SimpleLedbat(config) for _ in range(num_flows)]
+    mem_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    total = mem_after - mem_before
+    print('Flows: {}; Total: {:.1f} MiB; Per flow: {:.0f} B'.format(
+        len(flows), total / 2**20, total / num_flows))
+
+if __name__ == '__main__':
+    main()
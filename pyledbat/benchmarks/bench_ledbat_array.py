@@ -0,0 +1,77 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Compare ACK processing and gating rate of LedbatArray with one SimpleLedbat
+instance per flow.
+"""
+import sys
+import time
+
+import numpy as np
+
+from ledbat import baseledbat
+from ledbat import simpleledbat
+from ledbat import ledbatarray
+
+NUM_FLOWS = 100000
+NUM_ROUNDS = 20
+DATA_LEN = 1048
+
+def bench_array(num_flows, acks, ow_delays, rtts):
+    """ACK and gate all flows using LedbatArray"""
+
+    engine = ledbatarray.LedbatArray(num_flows, baseledbat.DEFAULT_CONFIG)
+    engine.try_sending(DATA_LEN)
+
+    t_start = time.perf_counter()
+    for (flows, ow_delay, rtt) in zip(acks, ow_delays, rtts):
+        engine.update_measurements(flows, DATA_LEN, ow_delay, rtt)
+        engine.try_sending(DATA_LEN)
+    return time.perf_counter() - t_start
+
+def bench_objects(num_flows, acks, ow_delays, rtts):
+    """ACK and gate all flows using SimpleLedbat instance per flow"""
+
+    engine = [simpleledbat.SimpleLedbat(baseledbat.DEFAULT_CONFIG) for _ in range(num_flows)]
+    for flow in engine:
+        flow.try_sending(DATA_LEN)
+
+    t_start = time.perf_counter()
+    for (flows, ow_delay, rtt) in zip(acks, ow_delays, rtts):
+        for (flow, delay, rtt_val) in zip(flows.tolist(), ow_delay.tolist(), rtt.tolist()):
+            engine[flow].update_measurements(DATA_LEN, [delay], [rtt_val])
+        for flow in engine:
+            flow.try_sending(DATA_LEN)
+    return time.perf_counter() - t_start
+
+def main():
+    """Run both engines over the same ACK stream"""
+
+    num_flows = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_FLOWS
+
+    # Each round: one ACK for every flow in random order
+    acks = [np.random.permutation(num_flows) for _ in range(NUM_ROUNDS)]
+    ow_delays = [np.random.uniform(10, 100, num_flows) for _ in range(NUM_ROUNDS)]
+    rtts = [np.random.uniform(0.02, 0.2, num_flows) for _ in range(NUM_ROUNDS)]
+    num_acks = num_flows * NUM_ROUNDS
+
+    print('Flows: {}; ACKs: {}'.format(num_flows, num_acks))
+    for (name, func) in [('SimpleLedbat', bench_objects), ('LedbatArray', bench_array)]:
+        t_run = func(num_flows, acks, ow_delays, rtts)
+        print('{:>14}: {:>12.0f} ACK+gate/s'.format(name, num_acks / t_run))
+
+if __name__ == '__main__':
+    main()
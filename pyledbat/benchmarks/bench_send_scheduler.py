@@ -0,0 +1,120 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Compare the shared deficit round-robin send scheduler with each flow
+rescheduling itself with call_soon. Flows are always allowed to send, so
+the event loop is the bottleneck. Reports packets per second, callbacks
+per packet and the share of packets sent by each flow.
+"""
+import asyncio
+import sys
+
+from testledbat import sendscheduler
+
+TEST_LEN = 2
+NUM_FLOWS = 100
+BURST = 16
+
+class DummyFlow(object):
+    """Flow that can always send"""
+
+    def __init__(self):
+        self.num_sent = 0
+
+    def send_next(self):
+        self.num_sent += 1
+        return (True, 0)
+
+class SelfScheduledFlow(DummyFlow):
+    """Flow sending a burst per own call_soon callback (the old way)"""
+
+    def __init__(self, loop, counter):
+        super().__init__()
+        self._loop = loop
+        self._counter = counter
+
+    def start(self):
+        self._loop.call_soon(self._try_next_send)
+
+    def _try_next_send(self):
+        self._counter[0] += 1
+        for _ in range(BURST):
+            self.send_next()
+        self._loop.call_soon(self._try_next_send)
+
+def run_self_scheduled(test_len):
+    """Each flow has its own chain of callbacks"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    counter = [0]
+    flows = [SelfScheduledFlow(loop, counter) for _ in range(NUM_FLOWS)]
+    for flow in flows:
+        flow.start()
+
+    loop.run_until_complete(asyncio.sleep(test_len))
+    loop.close()
+    return (flows, counter[0])
+
+def run_scheduler(test_len, weights):
+    """All flows served by one scheduler"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    scheduler = sendscheduler.SendScheduler(BURST)
+    flows = [DummyFlow() for _ in range(NUM_FLOWS)]
+    for (idx, flow) in enumerate(flows):
+        scheduler.add(flow, weights[idx % len(weights)])
+
+    loop.run_until_complete(asyncio.sleep(test_len))
+    loop.close()
+    return (flows, scheduler.num_rounds)
+
+def report(name, flows, num_callbacks, test_len, weights):
+    """Print results of one run"""
+
+    total = sum([flow.num_sent for flow in flows])
+    shares = []
+    for weight in sorted(set(weights)):
+        sent = [flow.num_sent for (idx, flow) in enumerate(flows)
+                if weights[idx % len(weights)] == weight]
+        shares.append('w{}: {:.1f}%'.format(weight, 100 * sum(sent) / total))
+
+    print('{:<16} {:>10.0f} {:>10.4f}  {}'.format(
+        name, total / test_len, num_callbacks / total, ' '.join(shares)))
+
+def main():
+    """Run all variants"""
+
+    test_len = float(sys.argv[1]) if len(sys.argv) > 1 else TEST_LEN
+
+    print('{} flows, burst {}'.format(NUM_FLOWS, BURST))
+    print('{:<16} {:>10} {:>10}  {}'.format('Variant', 'pkt/s', 'cb/pkt', 'Share'))
+
+    (flows, num_callbacks) = run_self_scheduled(test_len)
+    report('call_soon', flows, num_callbacks, test_len, [1])
+
+    (flows, num_callbacks) = run_scheduler(test_len, [1])
+    report('DRR', flows, num_callbacks, test_len, [1])
+
+    weights = [1, 2, 4]
+    (flows, num_callbacks) = run_scheduler(test_len, weights)
+    report('DRR 1:2:4', flows, num_callbacks, test_len, weights)
+
+if __name__ == '__main__':
+    main()
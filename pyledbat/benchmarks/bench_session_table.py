@@ -0,0 +1,104 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Load test of the server session table. INIT messages of 50k clients (and
+duplicate INITs of some of them) are given to a ServerRole, then all
+sessions are looked up by channel and by peer, and finally removed.
+Checks that every client got its own session and channel.
+"""
+import asyncio
+import logging
+import sys
+import time
+import tracemalloc
+
+from testledbat import serverrole
+from testledbat import udpserver
+from testledbat import codec
+
+NUM_SESSIONS = 50000
+DUP_EVERY = 10          # Every Nth client repeats INIT
+
+class NullProtocol(udpserver.UdpServer):
+    """UdpServer without socket, only counts the sent messages"""
+
+    def send_data(self, data, addr):
+        self.num_datagrams += 1
+
+def client_addr(idx):
+    """Unique address of the idx-th client"""
+    return ('10.{}.{}.{}'.format(idx >> 16 & 255, idx >> 8 & 255, idx & 255), 6888)
+
+def main():
+    """Run the load test"""
+
+    logging.basicConfig(level=logging.WARNING)
+    num_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_SESSIONS
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    protocol = NullProtocol()
+    server = serverrole.ServerRole(protocol)
+    server.start_server()
+
+    # All clients use remote channel 1, duplicates add the same peers again
+    init_msg = codec.encode_init(0, 1)
+    addrs = [client_addr(idx) for idx in range(num_sessions)]
+
+    tracemalloc.start()
+    mem_start = tracemalloc.get_traced_memory()[0]
+    t_start = time.perf_counter()
+    for (idx, addr) in enumerate(addrs):
+        server.datagram_received(init_msg, addr, 0)
+        if idx % DUP_EVERY == 0:
+            server.datagram_received(init_msg, addr, 0)
+    t_init = time.perf_counter() - t_start
+
+    mem_used = tracemalloc.get_traced_memory()[0] - mem_start
+    tracemalloc.stop()
+
+    tests = server._tests
+    assert len(tests) == num_sessions, 'Duplicate INIT created a session'
+
+    # Each peer has its own session and channel
+    t_start = time.perf_counter()
+    channels = set()
+    for addr in addrs:
+        test = tests.get_by_peer(addr, 1)
+        assert tests.get(test.local_channel) is test
+        channels.add(test.local_channel)
+    t_lookup = time.perf_counter() - t_start
+    assert len(channels) == num_sessions, 'Channel collision'
+
+    t_start = time.perf_counter()
+    for test in tests.values():
+        test.dispose()
+    t_remove = time.perf_counter() - t_start
+    assert not len(tests)
+
+    loop.close()
+
+    num_dup = (num_sessions + DUP_EVERY - 1) // DUP_EVERY
+    print('Sessions: {}; Duplicate INITs: {}; INIT-ACKs sent: {}'.format(
+        num_sessions, num_dup, protocol.num_datagrams))
+    print('INIT:    {:8.2f} us/session'.format(t_init / (num_sessions + num_dup) * 1e6))
+    print('Lookup:  {:8.2f} us/session (by peer and by channel)'.format(t_lookup / num_sessions * 1e6))
+    print('Remove:  {:8.2f} us/session'.format(t_remove / num_sessions * 1e6))
+    print('Memory:  {:8.0f} B/session'.format(mem_used / num_sessions))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Compare arming and cancelling per-session timers with the timer wheel and
+with asyncio call_later. Each session re-arms its timer several times (as
+the INIT-ACK and log timers do) before cancelling it.
+"""
+import asyncio
+import sys
+import time
+
+from testledbat import timerwheel
+
+NUM_SESSIONS = 100000
+REARMS = 5
+
+def callback():
+    pass
+
+def run(call_later, num_sessions):
+    """Arm, re-arm and cancel timers of num_sessions sessions"""
+
+    t_start = time.perf_counter()
+    timers = [call_later(10.0, callback) for _ in range(num_sessions)]
+    for _ in range(REARMS):
+        for (idx, timer) in enumerate(timers):
+            timer.cancel()
+            timers[idx] = call_later(5.0 + idx % 100, callback)
+    for timer in timers:
+        timer.cancel()
+    return (time.perf_counter() - t_start) / (num_sessions * (REARMS + 1))
+
+def main():
+    """Run both variants"""
+
+    num_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_SESSIONS
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    wheel = timerwheel.TimerWheel(loop=loop)
+    t_wheel = run(wheel.call_later, num_sessions)
+    t_loop = run(loop.call_later, num_sessions)
+
+    # Cancelled asyncio timers stay in the heap until the loop runs
+    heap_size = len(loop._scheduled)
+    loop.close()
+
+    print('{} sessions, {} re-arms each'.format(num_sessions, REARMS))
+    print('Timer wheel: {:6.2f} us per arm+cancel'.format(t_wheel * 1e6))
+    print('call_later:  {:6.2f} us per arm+cancel ({} entries left in the loop heap)'.format(
+        t_loop * 1e6, heap_size))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Microbenchmark suite of the LEDBAT controller and in-flight tracker hot
+paths, compared against the baselines stored in microbench_baselines.json.
+
+Speed is reported in ops/s and, to compare results between machines, as a
+score relative to a fixed pure Python loop run on the same machine (1000 -
+as fast as one iteration of the loop). Alloc/op is the number of memory
+blocks left allocated per op (with the garbage collector off), so steady
+state ops should be at 0.
+
+Exits with status 1 if any score drops, or Alloc/op grows, by more than the
+threshold compared to the baseline.
+
+Usage: python -m benchmarks.microbench [--save] [--threshold 0.3] [<name filter>]
+"""
+import argparse
+import array
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+from ledbat import baseledbat
+from ledbat import simpleledbat
+from testledbat.inflight_track import InflightTrack
+
+NUM_OPS = 50000
+CALIBRATE_OPS = 500000  # Iterations of the calibration loop
+REPEAT = 7
+THRESHOLD = 0.3         # Allowed relative drop of the score
+ALLOC_SLACK = 0.05      # Allowed growth of Alloc/op (blocks)
+SCORE_SCALE = 1000      # Score of a benchmark as fast as the calibration loop
+PKT_SIZE = 1048
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'microbench_baselines.json')
+
+class FixedClock(object):
+    """Clock that moves only when told to, so runs are repeatable"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def _primed_ledbat(**kwargs):
+    """SimpleLedbat with a fixed clock that has seen one ACK"""
+
+    clock = FixedClock()
+    ledbat = simpleledbat.SimpleLedbat(baseledbat.LedbatConfig(**kwargs), clock=clock)
+    ledbat.try_sending(PKT_SIZE)
+    ledbat.update_measurements_raw(PKT_SIZE, array.array('q', [20000]), array.array('d', [40000]))
+    return (ledbat, clock)
+
+def calibrate(num_ops):
+    """Reference pure Python loop"""
+
+    def run():
+        total = 0
+        for num in range(num_ops):
+            total += num * 3 % 7
+        return total
+    return run
+
+def try_sending_open(num_ops):
+    """try_sending when cwnd allows sending"""
+
+    (ledbat, _) = _primed_ledbat(init_cwnd=10 * num_ops)
+    ledbat._cwnd = 10 * num_ops * PKT_SIZE
+
+    def run():
+        try_sending = ledbat.try_sending
+        for _ in range(num_ops):
+            try_sending(PKT_SIZE)
+    return run
+
+def try_sending_cwnd_full(num_ops):
+    """try_sending_timed when waiting for the window"""
+
+    (ledbat, _) = _primed_ledbat()
+    while ledbat.try_sending(PKT_SIZE)[0]:
+        pass
+
+    def run():
+        try_sending_timed = ledbat.try_sending_timed
+        for _ in range(num_ops):
+            try_sending_timed(PKT_SIZE)
+    return run
+
+def ack_received_steady(num_ops):
+    """_ack_received (update_measurements) with one sample per ACK"""
+
+    (ledbat, clock) = _primed_ledbat()
+    delays = [[random.uniform(20, 30)] for _ in range(num_ops)]
+
+    def run():
+        update = ledbat.update_measurements
+        for ow_delays in delays:
+            clock.now += 0.001
+            ledbat._flightsize = ledbat._cwnd
+            update(PKT_SIZE, ow_delays, (0.04,))
+    return run
+
+def ack_received_many_samples(num_ops):
+    """_ack_received_raw with 64 delay samples per ACK"""
+
+    (ledbat, clock) = _primed_ledbat()
+    acks = [(array.array('q', [random.randint(20000, 30000) for _ in range(64)]),
+             array.array('d', [random.uniform(40000, 50000) for _ in range(64)]))
+            for _ in range(64)]
+
+    def run():
+        update = ledbat.update_measurements_raw
+        for num in range(num_ops):
+            (ow_delays, rtts) = acks[num & 63]
+            clock.now += 0.001
+            ledbat._flightsize = ledbat._cwnd
+            update(64 * PKT_SIZE, ow_delays, rtts)
+    return run
+
+def update_cto(num_ops):
+    """_update_cto with one RTT sample"""
+
+    (ledbat, _) = _primed_ledbat()
+    rtts = [(random.uniform(0.04, 0.05),) for _ in range(64)]
+
+    def run():
+        update = ledbat._update_cto
+        for num in range(num_ops):
+            update(rtts[num & 63])
+    return run
+
+def inflight_steady(num_ops, window=64):
+    """InflightTrack add and in-order ACK of the oldest item"""
+
+    inflight = InflightTrack()
+    for seq in range(1, window + 1):
+        inflight.add(seq, 0.0, None)
+
+    def run():
+        add = inflight.add
+        ack_range = inflight.ack_range
+        for seq in range(window + 1, window + 1 + num_ops):
+            add(seq, 0.0, None)
+            ack_range(seq - window, seq - window)
+    return run
+
+def inflight_large_window(num_ops):
+    """As inflight_steady with 100000 items in-flight"""
+    return inflight_steady(num_ops, 100000)
+
+def inflight_reordering(num_ops, window=256):
+    """InflightTrack with ACKs in random order within the window, and
+       loss detection on every 64th ACK
+    """
+
+    rand = random.Random(1)
+    order = []
+    for base in range(0, num_ops + window, window):
+        block = list(range(base + 1, base + window + 1))
+        rand.shuffle(block)
+        order.extend(block)
+
+    inflight = InflightTrack()
+    for seq in range(1, 2 * window + 1):
+        inflight.add(seq, 0.0, None)
+
+    def run():
+        add = inflight.add
+        ack_range = inflight.ack_range
+        for num in range(num_ops):
+            add(2 * window + 1 + num, 0.0, None)
+            seq = order[num]
+            ack_range(seq, seq)
+            if num & 63 == 0:
+                inflight.get_resendable(seq)
+    return run
+
+BENCHMARKS = [
+    calibrate,
+    try_sending_open,
+    try_sending_cwnd_full,
+    ack_received_steady,
+    ack_received_many_samples,
+    update_cto,
+    inflight_steady,
+    inflight_large_window,
+    inflight_reordering,
+]
+
+def _run_time(setup, num_ops):
+    """Run the benchmark on a fresh setup. Returns time taken"""
+
+    run = setup(num_ops)
+    t_start = time.perf_counter()
+    run()
+    return time.perf_counter() - t_start
+
+def measure(setup, num_ops):
+    """Get tuple (ops/s, calibration loop ops/s, Alloc/op) of the benchmark.
+       Runs alternate with the calibration runs, so both see the same
+       CPU speed.
+    """
+
+    best = None
+    best_calibrate = None
+    for _ in range(REPEAT):
+        duration = _run_time(calibrate, CALIBRATE_OPS)
+        best_calibrate = duration if best_calibrate is None else min(best_calibrate, duration)
+        duration = _run_time(setup, num_ops)
+        best = duration if best is None else min(best, duration)
+
+    # Blocks left allocated by a run on a fresh setup
+    run = setup(num_ops)
+    gc.collect()
+    gc.disable()
+    blocks_before = sys.getallocatedblocks()
+    run()
+    blocks_after = sys.getallocatedblocks()
+    gc.enable()
+
+    return (num_ops / best, CALIBRATE_OPS / best_calibrate,
+            max(0, blocks_after - blocks_before) / num_ops)
+
+def run_all(name_filter=None, num_ops=NUM_OPS):
+    """Run the benchmarks. Returns dict name -> {OpsPerSec, Score, AllocPerOp}"""
+
+    random.seed(0)
+
+    results = {}
+    for setup in BENCHMARKS[1:]:
+        if name_filter and name_filter not in setup.__name__:
+            continue
+
+        (ops_per_sec, calibrate_ops, alloc_per_op) = measure(setup, num_ops)
+        results[setup.__name__] = {
+            'OpsPerSec': ops_per_sec,
+            'Score': SCORE_SCALE * ops_per_sec / calibrate_ops,
+            'AllocPerOp': alloc_per_op,
+        }
+
+    return results
+
+def find_regressions(results, baselines, threshold=THRESHOLD):
+    """Get list of (name, reason) of results worse than the baselines"""
+
+    regressions = []
+    for (name, result) in sorted(results.items()):
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+
+        if result['Score'] < baseline['Score'] * (1 - threshold):
+            regressions.append((name, 'score {:.1f} < baseline {:.1f}'.format(
+                result['Score'], baseline['Score'])))
+
+        if result['AllocPerOp'] > baseline['AllocPerOp'] * (1 + threshold) + ALLOC_SLACK:
+            regressions.append((name, 'Alloc/op {:.3f} > baseline {:.3f}'.format(
+                result['AllocPerOp'], baseline['AllocPerOp'])))
+
+    return regressions
+
+def main():
+    """Run the suite and compare with (or save) the baselines"""
+
+    parser = argparse.ArgumentParser(description='LEDBAT microbenchmarks')
+    parser.add_argument('filter', help='Run only benchmarks with names containing this', nargs='?')
+    parser.add_argument('--save', help='Save the results as the new baselines', action='store_true')
+    parser.add_argument('--threshold', help='Allowed relative regression (default 0.3)', type=float, default=THRESHOLD)
+    parser.add_argument('--ops', help='Number of ops per run', type=int, default=NUM_OPS)
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as fp_json:
+            baselines = json.load(fp_json)
+
+    results = run_all(args.filter, args.ops)
+
+    print('{:>28} {:>12} {:>8} {:>10} {:>10}'.format(
+        'Benchmark', 'ops/s', 'Score', 'Baseline', 'Alloc/op'))
+    for (name, result) in sorted(results.items()):
+        baseline = baselines.get(name)
+        print('{:>28} {:>12.0f} {:>8.1f} {:>10} {:>10.3f}'.format(
+            name, result['OpsPerSec'], result['Score'],
+            '{:.1f}'.format(baseline['Score']) if baseline else '-',
+            result['AllocPerOp']))
+
+    if args.save:
+        baselines.update(results)
+        with open(BASELINES_PATH, 'w') as fp_json:
+            json.dump(baselines, fp_json, indent=2, sort_keys=True)
+            fp_json.write('\n')
+        print('Baselines saved to {}'.format(BASELINES_PATH))
+        return
+
+    regressions = find_regressions(results, baselines, args.threshold)
+    for (name, reason) in regressions:
+        print('REGRESSION {}: {}'.format(name, reason))
+
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -21,9 +21,47 @@ implementation and in the test application.
 """
 
 import time
-import datetime
 import math
 import logging
+import collections
+
+from ledbat.minfilter import MinFilter
+
+_CONFIG_FIELDS = ('current_filter', 'base_history', 'init_cwnd', 'mss',
+                  'target', 'gain', 'allowed_increase', 'min_cwnd')
+
+class LedbatConfig(collections.namedtuple('LedbatConfig', _CONFIG_FIELDS)):
+    """Immutable set of LEDBAT parameters. A single instance can be shared
+       by any number of flows. Parameters not given keep BaseLedbat defaults.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, **kwargs):
+        values = [kwargs.pop(field, getattr(BaseLedbat, field.upper()))
+                  for field in _CONFIG_FIELDS]
+
+        if kwargs:
+            raise TypeError('Unknown LEDBAT parameter(s): {}'.format(', '.join(kwargs)))
+
+        return super().__new__(cls, *values)
+
+    @classmethod
+    def from_params(cls, params):
+        """Build config from dict of set_<parameter> values (as used by the
+           test application). Unknown keys are ignored.
+        """
+
+        changes = {}
+        for key, value in (params or {}).items():
+            if key.startswith('set_') and key[4:] in _CONFIG_FIELDS:
+                changes[key[4:]] = value
+                logging.info('LEDBAT parameter changed: %s => %s', key, value)
+
+        if not changes:
+            return DEFAULT_CONFIG
+
+        return cls(**changes)
 
 class BaseLedbat(object):
     """Base class with constante defined"""
@@ -37,42 +75,42 @@ class BaseLedbat(object):
     ALLOWED_INCREASE = 1
     MIN_CWND = 2
 
-    def __init__(self, **kwargs):
-        """Initialize the instance"""
-        self._current_delays = BaseLedbat.CURRENT_FILTER * [1000000]
-        self._base_delays = BaseLedbat.BASE_HISTORY * [float('inf')]
+    ROLLOVER_INTERVAL = 60      # Base delay history granularity in seconds (one minute)
+
+    __slots__ = ('_config', '_clock', '_flightsize', '_cwnd', '_next_rollover',
+                 '_cto', '_queuing_delay', '_rtt', '_last_data_loss',
+                 '_last_ack_received', '_current_delays', '_base_delays')
+
+    def __init__(self, config=None, **kwargs):
+        """Initialize the instance. Parameters are taken from the LedbatConfig
+           given as config, or, if not given, built from set_<parameter>
+           keyword arguments. Monotonic clock returning seconds used by the
+           instance can be given as clock=callable (e.g. simulated time).
+        """
+
+        if config is None:
+            config = LedbatConfig.from_params(kwargs)
+
+        self._config = config
+        self._clock = kwargs.get('clock', time.monotonic)
         self._flightsize = 0
-        self._cwnd = BaseLedbat.INIT_CWND * BaseLedbat.MSS  # Congestion window
-        self._last_rollover = time.time()                   # Time last base-delay rollover occured
+        self._cwnd = config.init_cwnd * config.mss          # Congestion window
+        self._next_rollover = self._minute_deadline(self._clock())  # Time next base-delay rollover is due
         self._cto = 1                                       # Congestion timeout (seconds)
         self._queuing_delay = 0
         self._rtt = None                                # Round Trip Time
         self._last_data_loss = 0                        # When was latest dataloss event observed
         self._last_ack_received = None                  # When was the last ACK received
 
-        # Change defaults if given:
-        for key, value in kwargs.items():
-            if key == 'set_current_filter':
-                BaseLedbat.CURRENT_FILTER = value
-            elif key == 'set_base_history':
-                BaseLedbat.BASE_HISTORY = value
-            elif key == 'set_init_cwnd':
-                BaseLedbat.INIT_CWND = value
-            elif key == 'set_mss':
-                BaseLedbat.MSS = value
-            elif key == 'set_target':
-                BaseLedbat.TARGET = value
-            elif key == 'set_gain':
-                BaseLedbat.GAIN = value
-            elif key == 'set_allowed_increase':
-                BaseLedbat.ALLOWED_INCREASE = value
-            elif key == 'set_min_cwnd':
-                BaseLedbat.MIN_CWND = value
-            else:
-                # Fall through option so logging is not done
-                continue
-
-            logging.info('LEDBAT parameter changed: %s => %s', key, value)
+        # FILTER() is MIN over the latest BASE_HISTORY/4 current delays
+        filter_len = min(config.current_filter, math.ceil(config.base_history/4))
+        self._current_delays = MinFilter(filter_len, 1000000)
+        self._base_delays = MinFilter(config.base_history, float('inf'))
+
+    @property
+    def config(self):
+        """Get the parameters used by this instance"""
+        return self._config
 
     def _ack_received(self, bytes_acked, ow_delays, rtt_delays):
         """Parse the received delay sample(s)
@@ -80,32 +118,74 @@ class BaseLedbat(object):
         """
 
         # Update time of last ACK
-        self._last_ack_received = time.time()
+        t_now = self._clock()
+        self._last_ack_received = t_now
 
         # Process all received delay samples
         for delay_sample in ow_delays:
-            self._update_base_delay(delay_sample)
+            self._update_base_delay(delay_sample, t_now)
             self._update_current_delay(delay_sample)
 
-        # Update values
-        self._queuing_delay = self._filter_alg(self._current_delays) - min(self._base_delays)
-        off_target = (BaseLedbat.TARGET - self._queuing_delay) / BaseLedbat.TARGET
-        self._cwnd += int(BaseLedbat.GAIN * off_target * bytes_acked * BaseLedbat.MSS / self._cwnd)
-        max_allowed_cwnd = self._flightsize + BaseLedbat.ALLOWED_INCREASE * BaseLedbat.MSS
+        self._update_cwnd(bytes_acked)
+        self._update_cto(rtt_delays)
+
+    def _ack_received_raw(self, bytes_acked, ow_delays_us, rtt_delays_us):
+        """Same as _ack_received, but delays are given as buffers (array,
+           memoryview, NumPy array) of microseconds, oldest to newest. All
+           samples are folded into the filters in one pass without copying.
+           Zero round-trip times are ignored.
+        """
+
+        # Update time of last ACK
+        t_now = self._clock()
+        self._last_ack_received = t_now
+
+        num_delays = len(ow_delays_us)
+        if num_delays:
+            # All samples of the ACK arrive at the same time, so only the
+            # smallest one ends up in the base delay history...
+            self._update_base_delay(min(ow_delays_us) / 1000, t_now)
+
+            # ...and only the latest ones stay in the current delay filter
+            filter_size = self._current_delays.size
+            if num_delays > filter_size:
+                ow_delays_us = memoryview(ow_delays_us)[-filter_size:]
+
+            for delay_sample in ow_delays_us:
+                self._update_current_delay(delay_sample / 1000)
+
+        self._update_cwnd(bytes_acked)
+
+        # Zero round-trip times mark missing measurements
+        if any(rtt_delays_us):
+            rtt_min = min(rtt_delays_us)
+            if not rtt_min:
+                rtt_min = min(rtt for rtt in rtt_delays_us if rtt)
+            self._update_cto((rtt_min / 1000000,))
+        else:
+            self._update_cto(())
+
+    def _update_cwnd(self, bytes_acked):
+        """Update queuing delay, cwnd and flightsize after the ACK"""
+
+        cfg = self._config
+        self._queuing_delay = self._filter_alg(self._current_delays) - self._base_delays.minimum
+        off_target = (cfg.target - self._queuing_delay) / cfg.target
+        self._cwnd += int(cfg.gain * off_target * bytes_acked * cfg.mss / self._cwnd)
+        # Keep cwnd in whole bytes with fractional increase factors
+        max_allowed_cwnd = self._flightsize + int(cfg.allowed_increase * cfg.mss)
         self._cwnd = min([self._cwnd, max_allowed_cwnd])
-        self._cwnd = max([self._cwnd, BaseLedbat.MIN_CWND * BaseLedbat.MSS])
+        self._cwnd = max([self._cwnd, int(cfg.min_cwnd * cfg.mss)])
         self._flightsize = max([0, self._flightsize - bytes_acked])
 
-        self._update_cto(rtt_delays)
-
     def data_loss(self, will_retransmit=True, loss_size=None):
         """Reduce cwnd if data loss is experienced"""
 
         # Get the current time
-        t_now = time.time()
+        t_now = self._clock()
 
         if loss_size is None:
-            loss_size = BaseLedbat.MSS
+            loss_size = self._config.mss
 
         # Prevent calling too often
         if self._last_data_loss != 0:
@@ -119,7 +199,7 @@ class BaseLedbat(object):
         # Reduce the congestion window size
         self._cwnd = min([
             self._cwnd,
-            int(max([self._cwnd / 2, BaseLedbat.MIN_CWND * BaseLedbat.MSS]))
+            int(max([self._cwnd / 2, self._config.min_cwnd * self._config.mss]))
         ])
 
         # Account for data in-flight
@@ -129,7 +209,7 @@ class BaseLedbat(object):
     def _no_ack_in_cto(self):
         """Update CWND if no ACK was received in CTO"""
 
-        self._cwnd = 1 * BaseLedbat.MSS
+        self._cwnd = 1 * self._config.mss
         self._cto = 2 * self._cto
 
     def _update_cto(self, rtt_values):
@@ -139,33 +219,35 @@ class BaseLedbat(object):
     def _filter_alg(self, filter_data):
         """Implements FILTER() algorithm"""
 
-        # Implemented per [RFC6817] MIN filter over a small window
-        # multiplied by -1 to get latest window_size values
-        window_size = -1 * math.ceil(self.BASE_HISTORY/4)
-        return min(filter_data[window_size:])
+        # Implemented per [RFC6817] MIN filter over a small window.
+        # The window is maintained by the MinFilter itself
+        return filter_data.minimum
 
-    def _update_base_delay(self, delay):
-        """Update value in base_delay tracker list"""
+    def _minute_deadline(self, t_now):
+        """Get the start of the minute following t_now"""
+        return (int(t_now // self.ROLLOVER_INTERVAL) + 1) * self.ROLLOVER_INTERVAL
 
-        t_now = time.time()
+    def _update_base_delay(self, delay, t_now=None):
+        """Update value in base_delay tracker list"""
 
-        # Implemented per [RFC6817]
-        minute_now = datetime.datetime.fromtimestamp(t_now).minute
-        minute_then = datetime.datetime.fromtimestamp(self._last_rollover).minute
+        if t_now is None:
+            t_now = self._clock()
 
-        if minute_now != minute_then:
+        # Implemented per [RFC6817]. Minute boundaries are precomputed on the
+        # monotonic clock, so wall-clock jumps do not cause extra rollovers
+        if t_now >= self._next_rollover:
             # Shift value at next minute
-            self._last_rollover = t_now
-            self._base_delays = self._base_delays[1:]
+            self._next_rollover = self._minute_deadline(t_now)
             self._base_delays.append(delay)
         else:
             # For each measurements during the same minute keep minimum value
             # at the end of the list
-            self._base_delays[-1] = min([self._base_delays[-1], delay])
+            self._base_delays.update_newest(delay)
 
     def _update_current_delay(self, delay):
         """Add new value to the current delays list"""
 
         # Implemented per [RFC6817]
-        self._current_delays = self._current_delays[1:]
         self._current_delays.append(delay)
+
+DEFAULT_CONFIG = LedbatConfig()
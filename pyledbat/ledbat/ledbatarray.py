@@ -0,0 +1,405 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Vectorized LEDBAT engine for driving many flows at once. State of all flows
+is kept in NumPy arrays (struct-of-arrays) and ACKs / gating requests for
+many flows are handled in one vectorized step. Per flow results are the same
+as running one SimpleLedbat instance per flow.
+
+Requires NumPy.
+"""
+import time
+import math
+
+import numpy as np
+
+from ledbat import baseledbat
+from ledbat.simpleledbat import SimpleLedbat, FailReason
+
+# Reasons as returned by LedbatArray (FailReason values)
+REASON_NOFAIL = FailReason.NOFAIL.value
+REASON_CTO = FailReason.CTO.value
+REASON_CWND = FailReason.CWND.value
+
+class LedbatArray(object):
+    """LEDBAT (as in SimpleLedbat) for num_flows flows. Flows are addressed
+       by their index 0..num_flows-1. All flows share one LedbatConfig.
+    """
+
+    def __init__(self, num_flows, config=None, clock=time.monotonic):
+        """Allocate state arrays for num_flows flows"""
+
+        if config is None:
+            config = baseledbat.DEFAULT_CONFIG
+
+        self._config = config
+        self._clock = clock
+        self._num_flows = num_flows
+
+        # Same filter lengths as in BaseLedbat
+        self._filter_len = min(config.current_filter, math.ceil(config.base_history/4))
+        self._history_len = config.base_history
+
+        # Delay filters as ring buffers, one row per flow
+        self._current_delays = np.empty((num_flows, self._filter_len))
+        self._current_pos = np.empty(num_flows, dtype=np.intp)  # Next slot to write
+        self._base_delays = np.empty((num_flows, self._history_len))
+        self._base_pos = np.empty(num_flows, dtype=np.intp)     # Slot of the newest value
+        self._next_rollover = np.empty(num_flows)
+
+        # BaseLedbat state. NaN stands for None
+        self._flightsize = np.empty(num_flows)
+        self._cwnd = np.empty(num_flows)
+        self._cto = np.empty(num_flows)
+        self._queuing_delay = np.empty(num_flows)
+        self._rtt = np.empty(num_flows)
+        self._last_data_loss = np.empty(num_flows)
+        self._last_ack_received = np.empty(num_flows)
+
+        # SimpleLedbat state
+        self._last_send_time = np.empty(num_flows)
+        self._last_cto_fail_time = np.empty(num_flows)
+        self._in_cto = np.empty(num_flows, dtype=bool)
+        self._rt_measured = np.empty(num_flows, dtype=bool)
+        self._srtt = np.empty(num_flows)
+        self._rttvar = np.empty(num_flows)
+
+        self.reset()
+
+    @property
+    def num_flows(self):
+        """Get number of flows in the engine"""
+        return self._num_flows
+
+    @property
+    def config(self):
+        """Get the parameters used by the engine"""
+        return self._config
+
+    @property
+    def cwnd(self):
+        """Get Congestion Window Sizes"""
+        return self._cwnd
+
+    @property
+    def flightsize(self):
+        """Get amounts of data in-flight (sent but not ACKed)"""
+        return self._flightsize
+
+    @property
+    def rtt(self):
+        """Get Round-trip time estimates (NaN if not measured)"""
+        return self._rtt
+
+    @property
+    def queuing_delay(self):
+        """Get queuing delay estimates"""
+        return self._queuing_delay
+
+    @property
+    def srtt(self):
+        """Get smoothed-rtt values (NaN if not measured)"""
+        return self._srtt
+
+    @property
+    def rttvar(self):
+        """Get rtt variance values (NaN if not measured)"""
+        return self._rttvar
+
+    @property
+    def cto(self):
+        """Get Congestion timeout values"""
+        return self._cto
+
+    def reset(self, flows=None):
+        """Put given flows (all if None) into the initial state"""
+
+        if flows is None:
+            flows = slice(None)
+
+        cfg = self._config
+        t_now = self._clock()
+        interval = SimpleLedbat.ROLLOVER_INTERVAL
+
+        self._current_delays[flows] = 1000000
+        self._current_pos[flows] = 0
+        self._base_delays[flows] = float('inf')
+        self._base_pos[flows] = self._history_len - 1
+        self._next_rollover[flows] = (int(t_now // interval) + 1) * interval
+
+        self._flightsize[flows] = 0
+        self._cwnd[flows] = cfg.init_cwnd * cfg.mss
+        self._cto[flows] = 1
+        self._queuing_delay[flows] = 0
+        self._rtt[flows] = np.nan
+        self._last_data_loss[flows] = 0
+        self._last_ack_received[flows] = np.nan
+
+        self._last_send_time[flows] = np.nan
+        self._last_cto_fail_time[flows] = np.nan
+        self._in_cto[flows] = False
+        self._rt_measured[flows] = False
+        self._srtt[flows] = np.nan
+        self._rttvar[flows] = np.nan
+
+    def try_sending(self, data_len, flows=None):
+        """Vectorized SimpleLedbat.try_sending for given flows (all if None).
+           Each flow can be given at most once. Returns arrays
+           (can_send, reason), reason being FailReason values.
+        """
+
+        if flows is None:
+            flows = np.arange(self._num_flows)
+        else:
+            flows = np.asarray(flows, dtype=np.intp)
+
+        t_now = self._clock()
+        reason = np.full(len(flows), REASON_NOFAIL, dtype=np.int8)
+
+        last_send = self._last_send_time[flows]
+        last_ack = self._last_ack_received[flows]
+        cto = self._cto[flows]
+        in_cto = self._in_cto[flows]
+
+        # By definition we can *always* send the first segment
+        first = np.isnan(last_send)
+        has_ack = ~first & ~np.isnan(last_ack)
+
+        # In CTO and no ACKs within CTO
+        in_cto_now = has_ack & in_cto
+        no_recent_ack = ~(last_ack > t_now - cto)
+        still_cto = in_cto_now & no_recent_ack & (self._last_cto_fail_time[flows] + cto > t_now)
+        in_cto[in_cto_now & ~still_cto] = False
+
+        # Not in CTO, check if there is congestion
+        with np.errstate(invalid='ignore'):
+            congested = (has_ack & ~self._in_cto[flows] &
+                         (last_ack + cto < t_now) &
+                         (last_send + (2 * self._rtt[flows]) > t_now))
+
+        if congested.any():
+            cto_fail = self._last_cto_fail_time[flows]
+            new_fail = congested & (np.isnan(cto_fail) | (cto_fail + cto < t_now))
+            new_fail_flows = flows[new_fail]
+            self._last_cto_fail_time[new_fail_flows] = t_now
+            self._no_ack_in_cto(new_fail_flows)
+            in_cto[congested] = True
+
+        self._in_cto[flows] = in_cto
+        reason[still_cto | congested] = REASON_CTO
+
+        # Check congestion window
+        check_cwnd = ~first & (reason == REASON_NOFAIL)
+        no_room = check_cwnd & (self._flightsize[flows] + data_len > self._cwnd[flows])
+        reason[no_room] = REASON_CWND
+
+        can_send = reason == REASON_NOFAIL
+        send_flows = flows[can_send]
+        self._flightsize[send_flows] += data_len
+        self._last_send_time[send_flows] = t_now
+
+        return (can_send, reason)
+
+    def try_sending_timed(self, data_len, flows=None):
+        """Vectorized SimpleLedbat.try_sending_timed. Returns arrays
+           (can_send, reason, wait_time).
+        """
+
+        if flows is None:
+            flows = np.arange(self._num_flows)
+        else:
+            flows = np.asarray(flows, dtype=np.intp)
+
+        (can_send, reason) = self.try_sending(data_len, flows)
+
+        t_now = self._clock()
+        wait_time = np.zeros(len(flows))
+        cto = self._cto[flows]
+
+        in_cto = reason == REASON_CTO
+        wait_time[in_cto] = (self._last_cto_fail_time[flows] + cto - t_now)[in_cto]
+
+        in_cwnd = reason == REASON_CWND
+        if in_cwnd.any():
+            rtt = self._rtt[flows]
+            excess = self._flightsize[flows] + data_len - self._cwnd[flows]
+            cwnd_wait = np.minimum(rtt * excess / self._cwnd[flows], cto)
+            t_cto = self._last_ack_received[flows] + cto - t_now
+            with np.errstate(invalid='ignore'):
+                use_cto = t_cto > 0
+            cwnd_wait[use_cto] = np.minimum(cwnd_wait, t_cto)[use_cto]
+
+            # Without RTT estimate the only thing to wait for is the CTO
+            no_rtt = np.isnan(rtt)
+            cwnd_wait[no_rtt] = cto[no_rtt]
+            wait_time[in_cwnd] = cwnd_wait[in_cwnd]
+
+        return (can_send, reason, np.maximum(wait_time, 0))
+
+    def update_measurements(self, flows, data_acked, ow_times, rt_times):
+        """Vectorized SimpleLedbat.update_measurements for a batch of ACKs.
+           flows - flow index of each ACK; data_acked - bytes acked by each
+           ACK (if None - number of delay samples * MSS); ow_times - one-way
+           delays (ms), rt_times - round-trip times (s). Delays are either
+           one value per ACK or 2D array (ACK x samples, oldest to newest)
+           padded with NaN. Several ACKs of the same flow are applied in the
+           order they appear in the batch.
+        """
+
+        flows = np.asarray(flows, dtype=np.intp)
+        ow_times = np.asarray(ow_times, dtype=float)
+        rt_times = np.asarray(rt_times, dtype=float)
+
+        if ow_times.ndim == 1:
+            ow_times = ow_times[:, np.newaxis]
+        if rt_times.ndim == 1:
+            rt_times = rt_times[:, np.newaxis]
+
+        if data_acked is None:
+            data_acked = (~np.isnan(ow_times)).sum(axis=1) * self._config.mss
+        data_acked = np.broadcast_to(np.asarray(data_acked, dtype=float), flows.shape)
+
+        t_now = self._clock()
+
+        # Split into rounds where each flow appears at most once
+        order = np.argsort(flows, kind='stable')
+        sorted_flows = flows[order]
+        starts = np.flatnonzero(np.r_[True, sorted_flows[1:] != sorted_flows[:-1]])
+        counts = np.diff(np.r_[starts, len(flows)])
+        rank = np.arange(len(flows)) - np.repeat(starts, counts)
+
+        for round_num in range(int(counts.max()) if len(flows) else 0):
+            sel = order[rank == round_num]
+            self._ack_received(flows[sel], data_acked[sel], ow_times[sel], rt_times[sel], t_now)
+
+    def data_loss(self, flows, will_retransmit=True, loss_size=None):
+        """Vectorized BaseLedbat.data_loss for the given flows"""
+
+        flows = np.asarray(flows, dtype=np.intp)
+        t_now = self._clock()
+        cfg = self._config
+
+        if loss_size is None:
+            loss_size = cfg.mss
+
+        # At most once per RTT
+        last_loss = self._last_data_loss[flows]
+        with np.errstate(invalid='ignore'):
+            too_soon = (last_loss != 0) & (t_now - last_loss < self._rtt[flows])
+        flows = flows[~too_soon]
+
+        self._last_data_loss[flows] = t_now
+        cwnd = self._cwnd[flows]
+        self._cwnd[flows] = np.minimum(
+            cwnd, np.trunc(np.maximum(cwnd / 2, cfg.min_cwnd * cfg.mss)))
+
+        if not will_retransmit:
+            self._flightsize[flows] -= loss_size
+
+    def _no_ack_in_cto(self, flows):
+        """Update CWND of flows where no ACK was received in CTO"""
+
+        self._cwnd[flows] = 1 * self._config.mss
+        self._cto[flows] *= 2
+
+    def _ack_received(self, flows, bytes_acked, ow_delays, rtt_delays, t_now):
+        """Apply one ACK to each of the given (unique) flows"""
+
+        cfg = self._config
+        rows = np.arange(len(flows))
+        self._last_ack_received[flows] = t_now
+
+        # Process all received delay samples
+        base = self._base_delays[flows]
+        base_pos = self._base_pos[flows]
+        current = self._current_delays[flows]
+        current_pos = self._current_pos[flows]
+        rollover = t_now >= self._next_rollover[flows]
+
+        for column in range(ow_delays.shape[1]):
+            delay = ow_delays[:, column]
+            has = ~np.isnan(delay)
+
+            # Base delay, shift value at next minute
+            shift = has & rollover
+            base_pos[shift] = (base_pos[shift] + 1) % self._history_len
+            base[rows[shift], base_pos[shift]] = delay[shift]
+            keep = has & ~shift
+            base[rows[keep], base_pos[keep]] = np.minimum(
+                base[rows[keep], base_pos[keep]], delay[keep])
+            rollover &= ~has
+
+            # Current delay
+            current[rows[has], current_pos[has]] = delay[has]
+            current_pos[has] = (current_pos[has] + 1) % self._filter_len
+
+        had_rollover = t_now >= self._next_rollover[flows]
+        rolled = had_rollover & ~rollover
+        interval = SimpleLedbat.ROLLOVER_INTERVAL
+        self._next_rollover[flows[rolled]] = (int(t_now // interval) + 1) * interval
+
+        self._base_delays[flows] = base
+        self._base_pos[flows] = base_pos
+        self._current_delays[flows] = current
+        self._current_pos[flows] = current_pos
+
+        # Update values
+        queuing_delay = current.min(axis=1) - base.min(axis=1)
+        self._queuing_delay[flows] = queuing_delay
+        off_target = (cfg.target - queuing_delay) / cfg.target
+        cwnd = self._cwnd[flows]
+        flightsize = self._flightsize[flows]
+        cwnd = cwnd + np.trunc(cfg.gain * off_target * bytes_acked * cfg.mss / cwnd)
+        cwnd = np.minimum(cwnd, flightsize + int(cfg.allowed_increase * cfg.mss))
+        self._cwnd[flows] = np.maximum(cwnd, int(cfg.min_cwnd * cfg.mss))
+        self._flightsize[flows] = np.maximum(0, flightsize - bytes_acked)
+
+        self._update_cto(flows, rtt_delays)
+
+    def _update_cto(self, flows, rtt_values):
+        """Vectorized SimpleLedbat._update_cto"""
+
+        # NOP if no valid rtt_values (Karn's Algorithm)
+        valid = (~np.isnan(rtt_values) & (rtt_values != 0)).any(axis=1)
+        if not valid.any():
+            return
+
+        flows = flows[valid]
+        rtt = np.nanmin(rtt_values[valid], axis=1)
+
+        srtt = self._srtt[flows]
+        rttvar = self._rttvar[flows]
+        measured = self._rt_measured[flows]
+
+        # First measurement per [RFC6298]
+        first = ~measured
+        srtt[first] = rtt[first]
+        rttvar[first] = rtt[first] / 2
+
+        # Update based on round trip time measurements
+        rttvar[measured] = ((1 - SimpleLedbat.COEF_BETA) * rttvar[measured] +
+                            SimpleLedbat.COEF_BETA * np.fabs(srtt[measured] - rtt[measured]))
+        srtt[measured] = ((1 - SimpleLedbat.COEF_ALPHA) * srtt[measured] +
+                          SimpleLedbat.COEF_ALPHA * rtt[measured])
+
+        cto = srtt + np.maximum(SimpleLedbat.COEF_G, SimpleLedbat.COEF_K * rttvar)
+
+        # Per [RFC6298] p2.4
+        self._cto[flows] = np.maximum(cto, 1.0)
+        self._srtt[flows] = srtt
+        self._rttvar[flows] = rttvar
+        self._rt_measured[flows] = True
+        self._rtt[flows] = rtt
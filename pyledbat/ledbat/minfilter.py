@@ -0,0 +1,89 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Fixed size sliding window keeping the running minimum of the values in it.
+Used for LEDBAT current and base delay filters.
+"""
+
+class MinFilter(object):
+    """Sliding window of the last `size` values. Implemented as a monotonic
+       queue stored in preallocated ring buffers, so adding a value and
+       getting the minimum are O(1) (amortized) and do not allocate.
+    """
+
+    __slots__ = ('_size', '_seq', '_idx', '_val', '_head', '_len')
+
+    def __init__(self, size, fill):
+        """Create window of `size` elements, all set to `fill`"""
+
+        self._size = size
+        self._idx = size * [0]      # Sequence numbers of the queued values
+        self._val = size * [fill]   # Queued values, increasing from head
+        self._seq = size - 1        # Sequence number of the newest value
+        self._idx[0] = self._seq
+        self._head = 0
+        self._len = 1
+
+    @property
+    def size(self):
+        """Get number of values in the window"""
+        return self._size
+
+    @property
+    def minimum(self):
+        """Get the minimum value in the window"""
+        return self._val[self._head]
+
+    @property
+    def newest(self):
+        """Get the most recently added value"""
+        return self._val[(self._head + self._len - 1) % self._size]
+
+    def append(self, value):
+        """Add the value to the window, dropping the oldest one"""
+
+        size = self._size
+        seq = self._seq + 1
+        self._seq = seq
+
+        # At most one value can fall out of the window
+        if self._idx[self._head] <= seq - size:
+            self._head = (self._head + 1) % size
+            self._len -= 1
+
+        self._push(seq, value)
+
+    def update_newest(self, value):
+        """Replace the newest value with `value` if it is smaller"""
+
+        if value < self.newest:
+            self._push(self._seq, value)
+
+    def _push(self, seq, value):
+        """Drop queued values not smaller than `value` and queue it"""
+
+        size = self._size
+        head = self._head
+        val = self._val
+
+        length = self._len
+        while length and val[(head + length - 1) % size] >= value:
+            length -= 1
+
+        tail = (head + length) % size
+        self._idx[tail] = seq
+        val[tail] = value
+        self._len = length + 1
@@ -16,7 +16,6 @@ limitations under the License.
 """
 Wrapper class implementing simple RT and RTT measurements.
 """
-import time
 import math
 import enum
 
@@ -40,6 +39,9 @@ class SimpleLedbat(baseledbat.BaseLedbat):
     COEF_ALPHA = 0.125
     COEF_BETA = 0.25
 
+    __slots__ = ('_last_send_time', '_last_cto_fail_time', '_in_cto',
+                 '_rt_measured', '_srtt', '_rttvar')
+
     @property
     def cwnd(self):
         """Get Congestion Window Size"""
@@ -60,6 +62,11 @@ class SimpleLedbat(baseledbat.BaseLedbat):
         """Get queuing delay estimate"""
         return self._queuing_delay
 
+    @property
+    def base_delay(self):
+        """Get base delay estimate"""
+        return self._base_delays.minimum
+
     @property
     def srtt(self):
         """Get smoothed-rtt value"""
@@ -75,7 +82,7 @@ class SimpleLedbat(baseledbat.BaseLedbat):
         """Get Congestion timeout value"""
         return self._cto
 
-    def __init__(self, **kwargs):
+    def __init__(self, config=None, **kwargs):
         """Init the required variables"""
 
         self._last_send_time = None     # When data was actually sent last time
@@ -87,12 +94,12 @@ class SimpleLedbat(baseledbat.BaseLedbat):
         self._srtt = None
         self._rttvar = None
 
-        super().__init__(**kwargs)
+        super().__init__(config, **kwargs)
 
     def try_sending(self, data_len):
         """Implement data sending gating and congestion check"""
 
-        time_now = time.time()
+        time_now = self._clock()
 
         if self._last_send_time is None:
             # By definition we can *always* send the first segment
@@ -156,6 +163,44 @@ class SimpleLedbat(baseledbat.BaseLedbat):
             # Will have to wait
             return (False, FailReason.CWND)
 
+    def try_sending_timed(self, data_len):
+        """Gate the sending same as try_sending, but on failure also return
+        the time (in seconds) after which the next try should be made.
+        Returns tuple (can_send, reason, wait_time). ACKs received in the
+        meantime can open the window earlier than wait_time.
+        """
+
+        (can_send, reason) = self.try_sending(data_len)
+        if can_send:
+            return (True, reason, 0)
+
+        return (False, reason, self._time_to_send(data_len, reason))
+
+    def _time_to_send(self, data_len, reason):
+        """Estimate time until sending of data_len can succeed"""
+
+        time_now = self._clock()
+
+        if reason == FailReason.CTO:
+            # Wait until the congestion timeout expires
+            return max(0, self._last_cto_fail_time + self._cto - time_now)
+
+        # Without RTT estimate the only thing to wait for is the CTO
+        if self._rtt is None:
+            return self._cto
+
+        # Time to get enough data ACKed at the current cwnd/rtt rate
+        excess = self._flightsize + data_len - self._cwnd
+        wait_time = min(self._rtt * excess / self._cwnd, self._cto)
+
+        # Wake-up in time to check for the congestion
+        if self._last_ack_received is not None:
+            t_cto = self._last_ack_received + self._cto - time_now
+            if t_cto > 0:
+                wait_time = min(wait_time, t_cto)
+
+        return max(0, wait_time)
+
     def update_measurements(self, data_acked, ow_times, rt_times):
         """Update LEDBAT calculations. data_acked - number of bytes acked,
         if None, will be num of ow_times * MSS, ow_limes - array of one-way
@@ -163,12 +208,23 @@ class SimpleLedbat(baseledbat.BaseLedbat):
         measurements, oldest to newest"""
 
         if data_acked is None:
-            num_data = len(ow_times) * self.MSS
+            num_data = len(ow_times) * self._config.mss
         else:
             num_data = data_acked
 
         self._ack_received(num_data, ow_times, rt_times)
 
+    def update_measurements_raw(self, data_acked, ow_delays_us, rt_delays_us):
+        """Same as update_measurements, but one-way delays and round-trip
+        times are buffers (array.array, memoryview, NumPy array) of raw
+        microsecond values (zero round-trip times are ignored). ACKs with
+        many samples cost about the same as ACKs with one sample."""
+
+        if data_acked is None:
+            data_acked = len(ow_delays_us) * self._config.mss
+
+        self._ack_received_raw(data_acked, ow_delays_us, rt_delays_us)
+
     def _update_cto(self, rtt_values):
         """Calculate Congestion Timeout value"""
 
@@ -16,7 +16,7 @@ limitations under the License.
 """
 LEDBAT Implementation following libswift[1] approach.
 
-NOTES: set SwiftLedbat.last_send_time = NOW when
+NOTES: set SwiftLedbat.last_send_time = SwiftLedbat.now() when
 actually sending data.
 
 Most of the implementation of libswift's LEDBAT is in [2].
@@ -24,8 +24,6 @@ Most of the implementation of libswift's LEDBAT is in [2].
 [1] - https://github.com/libswift/libswift
 [2] - https://github.com/libswift/libswift/blob/master/send_control.cpp
 """
-import time
-
 from ledbat import baseledbat
 
 class SwiftLedbat(baseledbat.BaseLedbat):
@@ -33,7 +31,50 @@ class SwiftLedbat(baseledbat.BaseLedbat):
        not specified in the [RFC6817]
     """
 
-    def __init__(self):
+    __slots__ = ('last_send_time', '_next_send_time', '_last_data_time',
+                 '_reschedule_delay', '_rtt_dev')
+
+    @property
+    def cwnd(self):
+        """Get Congestion Window Size"""
+        return self._cwnd
+
+    @property
+    def flightsize(self):
+        """Get amount of data in-flight (sent but not ACKed)"""
+        return self._flightsize
+
+    @property
+    def rtt(self):
+        """Get average round-trip time"""
+        return self._rtt
+
+    @property
+    def queuing_delay(self):
+        """Get queuing delay estimate"""
+        return self._queuing_delay
+
+    @property
+    def base_delay(self):
+        """Get base delay estimate"""
+        return self._base_delays.minimum
+
+    @property
+    def srtt(self):
+        """Get smoothed-rtt value (same as rtt)"""
+        return self._rtt
+
+    @property
+    def rttvar(self):
+        """Get rtt deviation value"""
+        return self._rtt_dev
+
+    @property
+    def cto(self):
+        """Get Congestion timeout value"""
+        return self._cto
+
+    def __init__(self, config=None, **kwargs):
         """Extend the class with our specific parameters"""
 
         # Swiftish
@@ -42,15 +83,20 @@ class SwiftLedbat(baseledbat.BaseLedbat):
         self._next_send_time = None     # Next time data should go out
         self._last_data_time = None     # Last time data out was requested
         self._reschedule_delay = 0      # Delay adjustment if this is delayed call
+        self._rtt_dev = None            # Average deviation of RTT
 
         # Init the base class
-        super().__init__()
+        super().__init__(config, **kwargs)
+
+    def now(self):
+        """Get the current time on the clock used by this instance"""
+        return self._clock()
 
     def data_sent(self, data_len):
         """Inform LEDBAT about data sent to the network"""
 
         self._flightsize += data_len
-        self._next_send_time = time.time()
+        self._next_send_time = self._clock()
 
     def try_sending(self, data_len):
         """Check if data can be sent. If data can be sent now, (True, None) will be returned.
@@ -59,7 +105,7 @@ class SwiftLedbat(baseledbat.BaseLedbat):
         """
 
         # Swiftish implementation
-        t_now = time.time()
+        t_now = self._clock()
 
         # Last client wanted to send data
         self._last_data_time = t_now
@@ -74,6 +120,10 @@ class SwiftLedbat(baseledbat.BaseLedbat):
 
         # Check if we have any RT measurements? (Slow start some-day)
         if self._rtt is None:
+            # Send at most cwnd before the first RTT sample
+            if self._flightsize + data_len > self._cwnd:
+                return (False, self._cto)
+
             # Send now
             self._flightsize += data_len
             self._next_send_time = t_now
@@ -85,15 +135,17 @@ class SwiftLedbat(baseledbat.BaseLedbat):
                 self._reschedule_delay = t_now - self._next_send_time
 
         # Get next send time
+        last_out = self.last_send_time if self.last_send_time is not None else t_now
         send_interval = self._rtt / (self._cwnd / data_len)
         if (self._flightsize + data_len < self._cwnd or
-                self._cwnd >= baseledbat.BaseLedbat.MIN_CWND * baseledbat.BaseLedbat.MSS):
+                self._cwnd >= self._config.min_cwnd * self._config.mss):
 
-            # Calculate when next send can happen (might be in the past)
-            self._next_send_time = self._last_data_time + send_interval - self._reschedule_delay
+            # Calculate when next send can happen (might be in the past). As in
+            # libswift, the interval counts from the last data out
+            self._next_send_time = last_out + send_interval - self._reschedule_delay
         else:
             # ??
-            self._next_send_time = self._last_data_time + 1.0   # X + ack_timeout()
+            self._next_send_time = last_out + 1.0   # X + ack_timeout()
 
         t_dif = self._next_send_time - t_now
         if t_dif <= 0:
@@ -104,3 +156,35 @@ class SwiftLedbat(baseledbat.BaseLedbat):
         else:
             # Send later
             return (False, t_dif)
+
+    def update_measurements(self, data_acked, ow_times, rt_times):
+        """Update LEDBAT calculations after the ACK. data_acked - number of
+        bytes acked, ow_times - one-way delays in milliseconds, rt_times -
+        round-trip times in seconds (oldest to newest)"""
+
+        self._ack_received(data_acked, ow_times, rt_times)
+
+    def update_measurements_raw(self, data_acked, ow_delays_us, rt_delays_us):
+        """Same as update_measurements, but delays are buffers of raw
+        microsecond values (zero round-trip times are ignored)"""
+
+        self._ack_received_raw(data_acked, ow_delays_us, rt_delays_us)
+
+    def _update_cto(self, rtt_values):
+        """Keep the RTT average and deviation as libswift does
+        (send_control.cpp) and derive the congestion timeout from them"""
+
+        rtt_values = [rtt for rtt in rtt_values if rtt]
+        if not rtt_values:
+            return
+
+        rtt = min(rtt_values)
+
+        if self._rtt is None:
+            self._rtt = rtt
+            self._rtt_dev = rtt / 2
+        else:
+            self._rtt_dev = (self._rtt_dev * 3 + abs(rtt - self._rtt)) / 4
+            self._rtt = (self._rtt * 7 + rtt) / 8
+
+        self._cto = max(1.0, self._rtt + 4 * self._rtt_dev)
@@ -0,0 +1,92 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Run LEDBAT flows over a simulated bottleneck link in virtual time
+"""
+import logging
+import argparse
+import time
+import os
+
+from testledbat import extract_ledbat_params
+from testledbat import simulator
+from testledbat import metricslog
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(message)s')
+
+def main():
+    """Main entrance point"""
+
+    parser = argparse.ArgumentParser(description='LEDBAT Simulator')
+
+    parser.add_argument('--controller', help='LEDBAT implementation {simple|swift}', default='simple')
+    parser.add_argument('--time', help='Virtual time to simulate (s)', type=float, default=60)
+    parser.add_argument('--rate', help='Bottleneck rate (Mbit/s)', type=float, default=10)
+    parser.add_argument('--buffer', help='Bottleneck buffer size (KB)', type=float, default=150)
+    parser.add_argument('--delay', help='One-way propagation delay (ms)', type=float, default=25)
+    parser.add_argument('--loss', help='Random loss probability', type=float, default=0)
+    parser.add_argument('--cross-rate', help='Average rate of Poisson cross traffic (Mbit/s)', type=float)
+    parser.add_argument('--cross-on', help='Cross traffic on period (s)', type=float)
+    parser.add_argument('--cross-off', help='Cross traffic off period (s)', type=float)
+    parser.add_argument('--parallel', help='Number of LEDBAT flows', type=int, default=1)
+    parser.add_argument('--stagger', help='Time between starts of the flows (s)', type=float, default=0)
+    parser.add_argument('--seed', help='Random seed', type=int, default=0)
+    parser.add_argument('--makelog', help='Save runtime values of the flows into CSV files', action='store_true')
+    parser.add_argument('--log-name', help='Name of the log files', default='sim')
+    parser.add_argument('--log-dir', help='Directory to place results files')
+    parser.add_argument('--ledbat-set-target', help='Set LEDBAT target queuing delay', type=int)
+    parser.add_argument('--ledbat-set-allowed-increase', help='Set LEDBAT allowed cwnd increase factor', type=float)
+    parser.add_argument('--ack-every', help='Send ACK after this many DATA packets', type=int)
+    parser.add_argument('--ack-delay', help='Max time to delay ACK (ms, 0 - ACK at once)', type=float)
+
+    args = parser.parse_args()
+
+    log_name = None
+    if args.makelog:
+        log_name = os.path.join(args.log_dir, args.log_name) if args.log_dir else args.log_name
+
+    time_start = time.perf_counter()
+    (summaries, link_stats, num_events) = simulator.run_simulation(
+        ledbat=args.controller,
+        sim_time=args.time,
+        rate=args.rate * 1000000,
+        buffer_size=args.buffer * 1000,
+        delay=args.delay / 1000,
+        loss=args.loss,
+        cross_rate=args.cross_rate * 1000000 if args.cross_rate else None,
+        cross_on=args.cross_on,
+        cross_off=args.cross_off,
+        flows=args.parallel,
+        stagger=args.stagger,
+        seed=args.seed,
+        ledbat_params=extract_ledbat_params(args),
+        ack_every=args.ack_every,
+        ack_delay=None if args.ack_delay is None else args.ack_delay / 1000,
+        log_name=log_name)
+    run_time = time.perf_counter() - time_start
+
+    logging.info('Link: Sent/Dropped/Lost: %s/%s/%s Queuing avg/max: %.2f/%.2f ms',
+                 link_stats['Sent'], link_stats['Dropped'], link_stats['Lost'],
+                 link_stats['QueuingAvg'] * 1000, link_stats['QueuingMax'] * 1000)
+    logging.info('Simulated %.0f s in %.2f s (%.0fx real time, %d events)',
+                 args.time, run_time, args.time / run_time, num_events)
+
+    # Logs are exported as the test application does
+    for summary in summaries:
+        if summary['LogFile']:
+            metricslog.export_csv(summary['LogFile'], summary['LogFile'][:-4] + '.csv')
+
+if __name__ == '__main__':
+    main()
@@ -29,15 +29,24 @@ def main():
     # Setup the command line parser
     parser = argparse.ArgumentParser(description='LEDBAT Test program')
 
-    parser.add_argument('--role', help='Role of the instance {client|server}. Server ignores all other arguments!', default='server')
+    parser.add_argument('--role', help='Role of the instance {client|server}. Server ignores all other arguments except --ack-*, --workers, --no-gso, --rx-batch and --kernel-ts!', default='server')
     parser.add_argument('--remote', help='IP Address of the test server')
     parser.add_argument('--makelog', help='Save runtime values into CSV file', action='store_true')
+    parser.add_argument('--trace', help='Record LEDBAT state on every ACK into <log name>.trace.npy', action='store_true')
+    parser.add_argument('--record-acks', help='Record ACKs given to LEDBAT into <log name>.acks.npy for replay', action='store_true')
     parser.add_argument('--log-name', help='Name of the log file (replace default UnixTime-IP-Port)')
     parser.add_argument('--log-dir', help='Directory to place results file')
     parser.add_argument('--time', help='Time to run the test', type=int)
     parser.add_argument('--parallel', help='Number of parallel streams to send', type=int)
+    parser.add_argument('--weights', help='Comma separated send shares of the parallel streams (e.g. 1,2)')
     parser.add_argument('--ledbat-set-target', help='Set LEDBAT target queuing delay', type=int)
     parser.add_argument('--ledbat-set-allowed-increase', help='Set LEDBAT allowed cwnd increase factor', type=float)
+    parser.add_argument('--ack-every', help='Server: send ACK after this many DATA packets', type=int)
+    parser.add_argument('--ack-delay', help='Server: max time to delay ACK (ms, 0 - ACK at once)', type=float)
+    parser.add_argument('--workers', help='Number of worker processes. Server: share the port (SO_REUSEPORT); Client: split --parallel streams', type=int)
+    parser.add_argument('--no-gso', help='Do not use UDP segmentation offload when sending', action='store_true')
+    parser.add_argument('--rx-batch', help='Max datagrams read per socket readiness (0 - read one by one)', type=int)
+    parser.add_argument('--kernel-ts', help='Use kernel receive timestamps (SO_TIMESTAMPNS) for delay measurements', action='store_true')
 
     # Parse the command line params
     args = parser.parse_args()
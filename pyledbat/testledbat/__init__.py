@@ -21,10 +21,14 @@ import logging
 import asyncio
 import socket
 import os
+import functools
 
 from testledbat import udpserver
 from testledbat import clientrole
+from testledbat import clientworkers
 from testledbat import serverrole
+from testledbat import serverworkers
+from testledbat import ledbat_test
 
 UDP_PORT = 6888
 
@@ -38,6 +42,16 @@ def test_ledbat(params):
         logging.error('Address of the remote server must be provided for the client role!')
         return
 
+    weights = None
+    if params.weights:
+        try:
+            weights = [float(weight) for weight in params.weights.split(',')]
+        except ValueError:
+            weights = None
+        if not weights or min(weights) <= 0:
+            logging.error('Weights must be comma separated positive numbers!')
+            return
+
     # Prevent negative test times
     if not params.time or params.time < 0:
         params.time = None
@@ -61,7 +75,9 @@ def test_ledbat(params):
         logging.info('Starting LEDBAT test client. Remote: %s; Length: %s;',
                      params.remote, str_test_len)
     else:
-        logging.info('Starting LEDBAT test server.')
+        logging.info('Starting LEDBAT test server. ACK every: %s; ACK delay: %s ms;',
+                     params.ack_every or ledbat_test.ACK_EVERY,
+                     ledbat_test.ACK_DELAY * 1000 if params.ack_delay is None else params.ack_delay)
 
     if params.makelog:
         log_info = ''
@@ -76,10 +92,53 @@ def test_ledbat(params):
 
         logging.info('Run-time values will be saved to the log file%s', log_info)
 
+    rx_batch = udpserver.RX_BATCH if params.rx_batch is None else params.rx_batch
+    protocol_factory = functools.partial(udpserver.UdpServer, gso=not params.no_gso,
+                                         rx_batch=rx_batch, kernel_ts=params.kernel_ts)
+
+    # Server in several processes sharing the port
+    if params.role != 'client' and params.workers and params.workers > 1:
+        server_args = {
+            'ack_every': params.ack_every,
+            'ack_delay': None if params.ack_delay is None else params.ack_delay / 1000,
+        }
+        serverworkers.run_workers(params.workers, ('0.0.0.0', UDP_PORT),
+                                  protocol_factory, server_args)
+        return
+
+    client_args = {
+        'remote_ip': params.remote,
+        'remote_port': UDP_PORT,
+        'make_log': params.makelog,
+        'trace': params.trace,
+        'record_acks': params.record_acks,
+        'log_name': params.log_name,
+        'log_dir': params.log_dir,
+        'test_len': params.time,
+        'ledbat_params': ledbat_params,
+        'parallel': params.parallel,
+        'weights': weights,
+    }
+
+    # Client with streams split between several processes
+    if params.role == 'client' and params.workers and params.workers > 1:
+        results = clientworkers.run_workers(params.workers, protocol_factory, client_args)
+        clientworkers.log_summary(results)
+        if params.makelog:
+            clientworkers.save_summary(results, clientworkers.summary_path(
+                params.log_dir, params.log_name, params.remote, UDP_PORT))
+        return
+
     # Init the events loop and udp transport
     loop = asyncio.get_event_loop()
-    listen = loop.create_datagram_endpoint(udpserver.UdpServer, local_addr=('0.0.0.0', UDP_PORT))
+    listen = loop.create_datagram_endpoint(protocol_factory, local_addr=('0.0.0.0', UDP_PORT))
     transport, protocol = loop.run_until_complete(listen)
+    logging.info('UDP GSO: %s; Batch receive: %s; Kernel timestamps: %s;',
+                 'enabled' if protocol.gso_enabled else 'disabled',
+                 'enabled' if protocol.batch_rx_enabled else 'disabled',
+                 'enabled' if protocol.kernel_ts_enabled else 'disabled')
+    if params.kernel_ts and not protocol.kernel_ts_enabled:
+        logging.warning('Kernel timestamps need batch receive, using userspace time')
 
     # Enable Ctrl-C closing in WinNT
     # Ref: http://stackoverflow.com/questions/24774980/why-cant-i-catch-sigint-when-asyncio-event-loop-is-running
@@ -92,18 +151,12 @@ def test_ledbat(params):
     if params.role == 'client':
         # Run the client
         client = clientrole.ClientRole(protocol)
-        client.start_client(remote_ip=params.remote,
-                            remote_port=UDP_PORT,
-                            make_log=params.makelog,
-                            log_name=params.log_name,
-                            log_dir=params.log_dir,
-                            test_len=params.time,
-                            ledbat_params=ledbat_params,
-                            parallel=params.parallel)
+        client.start_client(**client_args)
     else:
         # Do the Server thing
         server = serverrole.ServerRole(protocol)
-        server.start_server()
+        server.start_server(ack_every=params.ack_every,
+                            ack_delay=None if params.ack_delay is None else params.ack_delay / 1000)
 
     # Wait for Ctrl-C
     try:
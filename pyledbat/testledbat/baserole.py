@@ -15,6 +15,11 @@ limitations under the License.
 """
 """Base class that is extended by Client and Server roles"""
 
+from testledbat import ledbat_test
+from testledbat import sendscheduler
+from testledbat import sessiontable
+from testledbat import timerwheel
+
 class BaseRole(object):
     """BaseRole with minimal actions what are common
        for both client and the server.
@@ -27,17 +32,46 @@ class BaseRole(object):
         # Inform receiver to deliver data to us
         self._udp_protocol.register_receiver(self)
 
-        # Keep all tests here. LocalID -> ledbat_test
-        self._tests = {}
+        # Keep all tests here. Indexed by local channel and by remote peer
+        self._tests = sessiontable.SessionTable()
+
+        # Per-test timers
+        self.timer_wheel = timerwheel.TimerWheel()
+
+        # Shared by the tests to send DATA
+        self.send_scheduler = sendscheduler.SendScheduler(ledbat_test.SEND_BURST)
 
-    def datagram_received(self, data, addr):
-        """Callback on received datagram"""
+    def datagram_received(self, data, addr, rx_time=None):
+        """Callback on received datagram. rx_time - time of reception
+           (None - now)
+        """
         pass
 
+    def datagrams_received(self, batch):
+        """Callback on received batch of (data, addr, rx_time)"""
+
+        for (data, addr, rx_time) in batch:
+            self.datagram_received(data, addr, rx_time)
+
     def send_data(self, data, addr):
         """Send the data to the indicated addr"""
         self._udp_protocol.send_data(data, addr)
 
+    def tx_stats(self):
+        """Get tuple (datagrams sent, send syscalls made)"""
+        return (self._udp_protocol.num_datagrams, self._udp_protocol.num_syscalls)
+
+    def rx_ts_gap(self):
+        """Get tuple (average, max) time in seconds from the kernel receive
+           timestamp until datagram was read (None - no kernel timestamps)
+        """
+
+        protocol = self._udp_protocol
+        if not protocol.num_rx_ts:
+            return None
+
+        return (protocol.rx_ts_gap_sum / protocol.num_rx_ts, protocol.rx_ts_gap_max)
+
     def remove_test(self, test):
         """Remove the given test from the list of tests"""
-        del self._tests[test.local_channel]
+        self._tests.remove(test.local_channel)
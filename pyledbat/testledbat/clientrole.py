@@ -18,27 +18,33 @@ Implementation of the client role in the test application.
 """
 
 import asyncio
-import random
-import struct
 import logging
 import time
 
+from ledbat import baseledbat
 from testledbat import baserole
+from testledbat import codec
 from testledbat import ledbat_test
 
 class ClientRole(baserole.BaseRole):
     """description of class"""
 
-    def datagram_received(self, data, addr):
+    def __init__(self, udp_protocol):
+        super().__init__(udp_protocol)
+
+        self.results = []   # Summaries of the finished tests
+
+    def datagram_received(self, data, addr, rx_time=None):
         """Process the received datagram"""
 
         # save time of reception
-        rx_time = time.time()
+        if rx_time is None:
+            rx_time = time.time()
 
         # Extract the header
-        (msg_type, rem_ch, loc_ch) = struct.unpack('>III', data[0:12])
+        (msg_type, rem_ch, loc_ch) = codec.decode_header(data)
 
-        if msg_type == 1 and rem_ch == 0:
+        if msg_type == codec.MSG_INIT and rem_ch == 0:
             logging.warning('Client should not get INIT messages')
             return
 
@@ -48,17 +54,21 @@ class ClientRole(baserole.BaseRole):
             logging.warning('Could not find ledbat test with our id: %s', rem_ch)
             return
 
-        if msg_type == 1:       # INIT-ACK
+        if msg_type == codec.MSG_INIT:     # INIT-ACK
             ledbattest.init_ack_received(loc_ch)
-        elif msg_type == 2:     # DATA
+        elif msg_type == codec.MSG_DATA:   # DATA
             logging.warning('Client should not receive DATA messages')
-        elif msg_type == 3:     # ACK
-            ledbattest.ack_received(data[12:], rx_time)
+        elif msg_type == codec.MSG_ACK:    # ACK
+            ledbattest.ack_received(data, rx_time)
         else:
             logging.warning('Discarded unknown message type (%s) from %s', msg_type, addr)
 
     def start_client(self, **kwargs):
-        """Start the functioning of the client by starting a new test"""
+        """Start the functioning of the client by starting a new test.
+           Streams with ids given as stream_ids (default - all of parallel)
+           are run. Optional weights list gives the share of each stream
+           in the send scheduler.
+        """
 
         # Create instance of this test
         test_args = {
@@ -67,31 +77,39 @@ class ClientRole(baserole.BaseRole):
             'remote_port':kwargs.get('remote_port'),
             'owner':self,
             'make_log':kwargs.get('make_log'),
+            'trace':kwargs.get('trace'),
+            'record_acks':kwargs.get('record_acks'),
             'log_name':kwargs.get('log_name'),
-            'ledbat_params':kwargs.get('ledbat_params'),
+            'ledbat_config':baseledbat.LedbatConfig.from_params(kwargs.get('ledbat_params')),
             'log_dir':kwargs.get('log_dir'),
             'stream_id':None,
         }
 
         total_streams = kwargs.get('parallel')
+        stream_ids = kwargs.get('stream_ids')
+        if stream_ids is None:
+            stream_ids = range(0, total_streams)
 
         # Run required number of tests
-        for stream_id in range(0, total_streams):
+        for stream_id in stream_ids:
 
             # Leave stream id -> None if running only one
             if total_streams != 1:
                 test_args['stream_id'] = stream_id
 
+            weights = kwargs.get('weights')
+            if weights:
+                test_args['weight'] = weights[stream_id % len(weights)]
+
             ledbattest = ledbat_test.LedbatTest(**test_args)
-            ledbattest.local_channel = random.randint(1, 65534)
 
-            # Save in the list of tests
-            self._tests[ledbattest.local_channel] = ledbattest
+            # Save in the list of tests. This gives the local channel
+            self._tests.add(ledbattest)
 
             # Schedule test stop if required
             test_len = kwargs.get('test_len')
             if test_len:
-                ledbattest.stop_hdl = asyncio.get_event_loop().call_later(
+                ledbattest.stop_hdl = self.timer_wheel.call_later(
                     test_len, self._stop_test, ledbattest)
 
             # Send the init message to the server
@@ -106,6 +124,7 @@ class ClientRole(baserole.BaseRole):
     def remove_test(self, test):
         """Extend remove_test to close client when the last test is removed"""
         super().remove_test(test)
+        self.results.append(test.get_summary())
 
         if not self._tests:
             logging.info('Last test removed. Closing client')
@@ -114,8 +133,7 @@ class ClientRole(baserole.BaseRole):
     def stop_all_tests(self):
         """Request to stop all tests"""
 
-        # Make copy not to iterate over list being removed
-        tests_copy = self._tests.copy()
-        for test in tests_copy.values():
+        # values() is a copy, tests are removed while iterating
+        for test in self._tests.values():
             test.stop_test()
             test.dispose()
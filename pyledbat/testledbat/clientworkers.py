@@ -0,0 +1,160 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Multi-process LEDBAT test client. The parallel streams are split between
+worker processes, each running its own event loop and UDP socket. When all
+streams end, the parent collects the per-stream results from the workers
+and logs (and optionally saves) a merged summary.
+"""
+import asyncio
+import csv
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+
+from testledbat import clientrole
+
+SUMMARY_FIELDS = ['StreamId', 'Duration', 'Sent', 'Acked', 'Resent', 'OooPkt',
+                  'DupPkt', 'LostPkt', 'TxRate', 'LogFile']
+
+def run_workers(num_workers, protocol_factory, client_args):
+    """Run the streams of the client in num_workers processes. Returns
+       list of per-stream summaries.
+    """
+
+    total_streams = client_args['parallel']
+    num_workers = min(num_workers, total_streams)
+
+    context = multiprocessing.get_context('fork')
+    workers = []
+    connections = []
+    for worker_id in range(num_workers):
+        (parent_conn, child_conn) = context.Pipe(duplex=False)
+        stream_ids = list(range(worker_id, total_streams, num_workers))
+        worker = context.Process(target=_worker_main,
+                                 args=(protocol_factory, client_args, stream_ids, child_conn),
+                                 name='ledbat-client-{}'.format(worker_id),
+                                 daemon=True)
+        worker.start()
+        child_conn.close()
+        workers.append(worker)
+        connections.append(parent_conn)
+
+    logging.info('Started %s client workers running %s streams', num_workers, total_streams)
+
+    # Each worker sends its results once, when its last stream ends
+    results = []
+    pending = list(connections)
+    while pending:
+        try:
+            ready = multiprocessing.connection.wait(pending)
+        except KeyboardInterrupt:
+            # Workers get Ctrl-C too and report what they have
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            continue
+
+        for conn in ready:
+            try:
+                results.extend(conn.recv())
+            except EOFError:
+                logging.warning('Client worker exited without results')
+            pending.remove(conn)
+
+    for worker in workers:
+        worker.join()
+
+    results.sort(key=lambda result: result['StreamId'])
+    return results
+
+def log_summary(results):
+    """Log per-stream results and the totals"""
+
+    for result in results:
+        logging.info('Stream %s: Time: %.2f TX/ACK/RES: %s/%s/%s TxR: %.2f',
+                     result['StreamId'], result['Duration'], result['Sent'],
+                     result['Acked'], result['Resent'], result['TxRate'])
+
+    total = merge_results(results)
+    logging.info('Total of %s streams: TX/ACK/RES: %s/%s/%s TxR: %.2f',
+                 len(results), total['Sent'], total['Acked'], total['Resent'],
+                 total['TxRate'])
+
+def merge_results(results):
+    """Sum per-stream results into one summary"""
+
+    total = {field: 0 for field in SUMMARY_FIELDS}
+    total['StreamId'] = 'Total'
+    total['LogFile'] = None
+
+    for result in results:
+        for field in ('Sent', 'Acked', 'Resent', 'OooPkt', 'DupPkt', 'LostPkt', 'TxRate'):
+            total[field] += result[field]
+        total['Duration'] = max(total['Duration'], result['Duration'])
+
+    return total
+
+def save_summary(results, filepath):
+    """Save per-stream results and the totals as CSV"""
+
+    with open(filepath, 'w', newline='') as fp_csv:
+        csvwriter = csv.DictWriter(fp_csv, fieldnames=SUMMARY_FIELDS)
+        csvwriter.writeheader()
+
+        for result in results:
+            csvwriter.writerow(result)
+        csvwriter.writerow(merge_results(results))
+
+def summary_path(log_dir, log_name, remote_ip, remote_port):
+    """Get path of the summary file, named like the stream logs"""
+
+    if log_name:
+        filename = '{}-summary.csv'.format(log_name)
+    else:
+        filename = '{}-{}-{}-summary.csv'.format(int(time.time()), remote_ip, remote_port)
+
+    if log_dir:
+        return os.path.join(log_dir, filename)
+    return filename
+
+def _worker_main(protocol_factory, client_args, stream_ids, conn):
+    """Entry point of the worker process"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    # Each worker has its own socket on an ephemeral port
+    listen = loop.create_datagram_endpoint(protocol_factory, local_addr=('0.0.0.0', 0))
+    (transport, protocol) = loop.run_until_complete(listen)
+
+    client = clientrole.ClientRole(protocol)
+    client.start_client(stream_ids=stream_ids, **client_args)
+
+    # Client stops the loop when the last test is removed
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        client.stop_all_tests()
+
+    conn.send(client.results)
+    conn.close()
+
+    transport.close()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
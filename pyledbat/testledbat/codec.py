@@ -0,0 +1,142 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Wire format of the test application messages. All messages start with the
+header (type, remote channel, local channel). Encoders pack messages into
+reusable preallocated buffers, decoders read from the received datagram in
+place. Encoded messages are valid until the next call of the same encoder.
+
+INIT / INIT-ACK: header
+DATA:            header, seq, timestamp (us), payload
+ACK:             header, num_blocks, num_delays, (first, last) * num_blocks,
+                 one-way delay (us) * num_delays
+"""
+import array
+import struct
+import sys
+
+MSG_INIT = 1
+MSG_DATA = 2
+MSG_ACK = 3
+
+HEADER = struct.Struct('>III')          # Type, Rem_ch, Loc_ch
+DATA_HEADER = struct.Struct('>IIIIQ')   # Header, Seq, Timestamp
+DATA_FIELDS = struct.Struct('>IQ')      # Seq, Timestamp
+ACK_HEADER = struct.Struct('>IIIII')    # Header, Num_blocks, Num_delays
+ACK_COUNTS = struct.Struct('>II')       # Num_blocks, Num_delays
+ACK_BLOCK = struct.Struct('>II')        # First, Last
+
+HEADER_SIZE = HEADER.size
+DATA_HEADER_SIZE = DATA_HEADER.size
+ACK_HEADER_SIZE = ACK_HEADER.size
+
+_ARRAY_STRUCTS = {}
+
+def _array_struct(code, count):
+    """Get (cached) struct for count values of the given type"""
+
+    key = (code, count)
+    array_struct = _ARRAY_STRUCTS.get(key)
+    if array_struct is None:
+        array_struct = struct.Struct('>{}{}'.format(count, code))
+        _ARRAY_STRUCTS[key] = array_struct
+
+    return array_struct
+
+def decode_header(msg):
+    """Get (msg_type, remote_channel, local_channel) of the message"""
+    return HEADER.unpack_from(msg)
+
+def encode_init(remote_channel, local_channel):
+    """Build INIT (remote_channel == 0) or INIT-ACK message"""
+    return HEADER.pack(MSG_INIT, remote_channel, local_channel)
+
+def decode_data(msg):
+    """Get (seq, time_stamp) of DATA message"""
+    return DATA_FIELDS.unpack_from(msg, HEADER_SIZE)
+
+def decode_ack(msg):
+    """Get (blocks, delays) of ACK message. blocks is flat tuple of
+       first, last pairs, delays is array of one-way delays (us).
+    """
+
+    (num_blocks, num_delays) = ACK_COUNTS.unpack_from(msg, HEADER_SIZE)
+    blocks = _array_struct('I', 2 * num_blocks).unpack_from(msg, ACK_HEADER_SIZE)
+
+    # Delays in one go. Network order is big-endian
+    offset = ACK_HEADER_SIZE + num_blocks * 8
+    delays = array.array('Q')
+    delays.frombytes(memoryview(msg)[offset:offset+num_delays*8])
+    if sys.byteorder == 'little':
+        delays.byteswap()
+
+    return (blocks, delays)
+
+class DataEncoder(object):
+    """Encoder of DATA messages with constant payload"""
+
+    def __init__(self, payload_size, fill=127):
+        """Preallocate message buffer with the payload in place"""
+
+        self._buf = bytearray(DATA_HEADER_SIZE) + payload_size * bytes([fill])
+        self._view = memoryview(self._buf)
+
+    def encode(self, remote_channel, local_channel, seq, time_stamp, payload=None):
+        """Build DATA message. time_stamp is in microseconds"""
+
+        DATA_HEADER.pack_into(self._buf, 0, MSG_DATA, remote_channel,
+                              local_channel, seq, time_stamp)
+
+        if payload is None:
+            return self._view
+
+        return self._view[:DATA_HEADER_SIZE].tobytes() + payload
+
+class AckEncoder(object):
+    """Encoder of ACK messages"""
+
+    def __init__(self, max_blocks=4, max_delays=16):
+        """Preallocate buffer for the given number of blocks and delays"""
+        self._alloc(ACK_HEADER_SIZE + 8 * (max_blocks + max_delays))
+
+    def _alloc(self, size):
+        """(Re)allocate the message buffer"""
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+
+    def encode(self, remote_channel, local_channel, blocks, delays):
+        """Build ACK message. blocks - list of (first, last) tuples,
+           delays - one-way delays in microseconds (int).
+        """
+
+        num_blocks = len(blocks)
+        num_delays = len(delays)
+        size = ACK_HEADER_SIZE + 8 * (num_blocks + num_delays)
+        if size > len(self._buf):
+            self._alloc(size)
+
+        buf = self._buf
+        ACK_HEADER.pack_into(buf, 0, MSG_ACK, remote_channel, local_channel,
+                             num_blocks, num_delays)
+
+        offset = ACK_HEADER_SIZE
+        for block in blocks:
+            ACK_BLOCK.pack_into(buf, offset, *block)
+            offset += 8
+
+        _array_struct('Q', num_delays).pack_into(buf, offset, *delays)
+
+        return self._view[:size]
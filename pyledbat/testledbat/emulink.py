@@ -0,0 +1,237 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Emulated link connecting two roles inside one event loop, in place of the
+UDP sockets (UdpServer) and the network between them.
+
+Each direction works like netem: datagrams wait in a queue of limited depth
+while the link sends the ones ahead at the given rate, then get the delay
+(with optional jitter). Datagrams can be lost, or reordered by skipping the
+delay. Datagrams due at the same time are given to the receiver in one
+batch, as with batch receive of UdpServer.
+"""
+import asyncio
+import collections
+import heapq
+import itertools
+import random
+import time
+
+class LinkDirection(object):
+    """One direction of the link"""
+
+    def __init__(self, loop, rng, **kwargs):
+        """rate - bits/s (None - unlimited), queue - max datagrams waiting
+           to be sent (None - unlimited; needs rate, as datagrams never wait
+           on a link without a rate limit), delay and jitter - seconds, loss
+           and reorder - probabilities
+        """
+
+        self._loop = loop
+        self._random = rng
+        rate = kwargs.get('rate')
+        self._byte_rate = rate / 8 if rate else None
+        self._queue_limit = kwargs.get('queue')
+        self._delay = kwargs.get('delay', 0)
+        self._jitter = kwargs.get('jitter', 0)
+        self._loss = kwargs.get('loss', 0)
+        self._reorder = kwargs.get('reorder', 0)
+
+        self._busy_until = 0.0              # Time the last queued datagram is sent
+        self._departures = collections.deque()  # Send times of queued datagrams
+        self._in_flight = []                # Heap of (arrival, order, data, addr, endpoint)
+        self._order = itertools.count()
+        self._hdl_deliver = None
+        self._t_deliver = None              # Time the delivery is scheduled at
+
+        self.num_sent = 0                   # Datagrams accepted
+        self.num_dropped = 0                # Datagrams dropped at full queue
+        self.num_lost = 0                   # Datagrams lost at random
+        self.num_reordered = 0              # Datagrams that skipped the delay
+        self.queuing_sum = 0                # Sum and max of time datagrams
+        self.queuing_max = 0                # waited in the queue (seconds)
+
+    def send(self, data, addr, endpoint):
+        """Put the datagram on the link. It is given to the endpoint's
+           receiver as coming from addr.
+        """
+
+        t_now = self._loop.time()
+
+        # Datagrams sent by now left the queue
+        departures = self._departures
+        while departures and departures[0] <= t_now:
+            departures.popleft()
+
+        if self._queue_limit is not None and len(departures) >= self._queue_limit:
+            self.num_dropped += 1
+            return
+
+        # Wait for the datagrams ahead to be sent
+        t_send = max(t_now, self._busy_until)
+        if self._byte_rate:
+            self._busy_until = t_send + len(data) / self._byte_rate
+            departures.append(self._busy_until)
+            self.queuing_sum += t_send - t_now
+            self.queuing_max = max(self.queuing_max, t_send - t_now)
+        self.num_sent += 1
+
+        rng = self._random
+        if self._loss and rng.random() < self._loss:
+            self.num_lost += 1
+            return
+
+        t_arrive = max(t_send, self._busy_until)
+        if self._reorder and rng.random() < self._reorder:
+            self.num_reordered += 1
+        else:
+            delay = self._delay
+            if self._jitter:
+                delay = max(0, delay + rng.uniform(-self._jitter, self._jitter))
+            t_arrive += delay
+
+        heapq.heappush(self._in_flight, (t_arrive, next(self._order), data, addr, endpoint))
+        if self._t_deliver is None or t_arrive < self._t_deliver:
+            self._schedule(t_arrive)
+
+    def _schedule(self, when):
+        """(Re)schedule delivery at the given loop time"""
+
+        if self._hdl_deliver is not None:
+            self._hdl_deliver.cancel()
+        self._t_deliver = when
+        self._hdl_deliver = self._loop.call_at(when, self._deliver)
+
+    def _deliver(self):
+        """Give all datagrams due by now to the receivers"""
+
+        self._hdl_deliver = None
+        self._t_deliver = None
+
+        t_now = self._loop.time()
+        rx_time = time.time()
+        in_flight = self._in_flight
+
+        batch = []
+        endpoint = None
+        while in_flight and in_flight[0][0] <= t_now:
+            (_, _, data, addr, endpoint) = heapq.heappop(in_flight)
+            batch.append((data, addr, rx_time))
+
+        if batch:
+            endpoint.datagrams_arrived(batch)
+
+        if in_flight:
+            self._schedule(in_flight[0][0])
+
+    def close(self):
+        """Drop datagrams in flight"""
+
+        if self._hdl_deliver is not None:
+            self._hdl_deliver.cancel()
+            self._hdl_deliver = None
+        self._t_deliver = None
+        self._in_flight = []
+
+    def get_stats(self):
+        """Get dict with the statistics of the direction"""
+
+        return {
+            'Sent': self.num_sent,
+            'Dropped': self.num_dropped,
+            'Lost': self.num_lost,
+            'Reordered': self.num_reordered,
+            'QueuingAvg': self.queuing_sum / self.num_sent if self.num_sent else 0,
+            'QueuingMax': self.queuing_max,
+        }
+
+class EmulatedEndpoint(object):
+    """Replacement of UdpServer attached to the emulated link"""
+
+    def __init__(self, addr, direction):
+        self.addr = addr
+        self.peer = None                # Endpoint on the other side
+        self._direction = direction     # Direction towards the peer
+        self._receiver = None
+
+        self.num_rx_ts = 0              # No kernel timestamps
+        self.rx_ts_gap_sum = 0
+        self.rx_ts_gap_max = 0
+
+        self.num_received = 0           # Datagrams received
+        self.num_datagrams = 0          # Datagrams sent
+        self.num_syscalls = 0           # No system calls are made
+
+    @property
+    def gso_enabled(self):
+        """Check if datagrams are sent with UDP GSO"""
+        return False
+
+    @property
+    def batch_rx_enabled(self):
+        """Check if datagrams are received in batches"""
+        return True
+
+    @property
+    def kernel_ts_enabled(self):
+        """Check if kernel receive timestamps are used"""
+        return False
+
+    def register_receiver(self, receiver):
+        self._receiver = receiver
+
+    def send_data(self, data, addr):
+        """Send the data to the peer. The data is copied, so the caller
+           can reuse the buffer. Datagrams not to the peer's address are
+           dropped.
+        """
+
+        self.num_datagrams += 1
+        if addr != self.peer.addr:
+            return
+
+        self._direction.send(bytes(data), self.addr, self.peer)
+
+    def datagrams_arrived(self, batch):
+        """Give the batch of (data, addr, rx_time) to the receiver"""
+
+        self.num_received += len(batch)
+        if self._receiver is not None:
+            self._receiver.datagrams_received(batch)
+
+class EmulatedLink(object):
+    """Link between the client and the server endpoints. forward and reverse
+       are dicts of LinkDirection parameters of the client to server and
+       server to client directions.
+    """
+
+    def __init__(self, forward=None, reverse=None, **kwargs):
+        loop = kwargs.get('loop') or asyncio.get_event_loop()
+        rng = random.Random(kwargs.get('seed', 0))
+
+        self.forward = LinkDirection(loop, rng, **(forward or {}))
+        self.reverse = LinkDirection(loop, rng, **(reverse or {}))
+
+        self.client = EmulatedEndpoint(kwargs.get('client_addr', ('10.0.0.1', 50000)), self.forward)
+        self.server = EmulatedEndpoint(kwargs.get('server_addr', ('10.0.0.2', 6888)), self.reverse)
+        self.client.peer = self.server
+        self.server.peer = self.client
+
+    def close(self):
+        """Drop datagrams in flight in both directions"""
+
+        self.forward.close()
+        self.reverse.close()
@@ -15,80 +15,215 @@ limitations under the License.
 """
 """
 Helper class to track data that is inflight and hide data structure.
+Items are kept in ring buffers indexed by the sequence number. Items ACKed
+out of order are kept as intervals, so ACKing a range of items, adding and
+looking up items are O(1) (or O(log n) in number of holes) and moving the
+head past ACKed items is amortized O(1).
 """
-import collections
+import array
+
+from .interval_set import IntervalSet
+
+FLAG_RESENT = 1     # Item was resent
+
+INIT_CAPACITY = 64
 
 class InflightTrack(object):
     """In-Flight data tracker"""
 
     def __init__(self):
         """Initialize data structures"""
-        self._deq = collections.deque() # Contains only seq numbers
-        self._store = {}                # Contains [timestamp_sent, resent, data]
+
+        self._capacity = INIT_CAPACITY              # Always a power of 2
+        self._mask = INIT_CAPACITY - 1
+        self._time = array.array('d', bytes(8 * INIT_CAPACITY))  # timestamp_sent
+        self._flags = bytearray(INIT_CAPACITY)                  # FLAG_* bits
+        self._data = INIT_CAPACITY * [None]
+
+        self._head = None       # Lowest seq number in-flight
+        self._tail = None       # Seq number following the highest added one
+        self._fresh = None      # Lowest seq that might be in-flight and not resent
+        self._count = 0         # Number of items in-flight
+        self._acked = IntervalSet()     # Seq numbers in [head, tail) not in-flight
 
     def add(self, seq, time_stamp, data):
-        """Add item to the list of data in-flight"""
+        """Add item to the list of data in-flight. Seq numbers must increase"""
+
+        if self._tail is not None and seq < self._tail:
+            raise ValueError('Seq number {} already added'.format(seq))
+
+        if not self._count:
+            self._head = self._tail = self._fresh = seq
+            self._acked.clear()
+        elif seq > self._tail:
+            # Seq numbers skipped are not in-flight
+            self._acked.add(self._tail, seq - 1)
+
+        while seq - self._head >= self._capacity:
+            self._grow()
 
-        self._deq.appendleft(seq)
-        self._store[seq] = [time_stamp, False, data]
+        idx = seq & self._mask
+        self._time[idx] = time_stamp
+        self._flags[idx] = 0
+        self._data[idx] = data
+        self._tail = seq + 1
+        self._count += 1
 
     def peek(self):
-        """Get the seq number of the right-most item"""
-        return self._deq[-1]
+        """Get the seq number of the oldest item"""
+
+        if not self._count:
+            raise IndexError('peek from an empty InflightTrack')
+        return self._head
 
     def pop(self, get_item=True):
-        """Remove the rightmost item"""
-        seq_num = self._deq.pop()
+        """Remove the oldest item"""
+
+        item = self.pop_given(self.peek())
 
         if get_item:
-            item = self._store[seq_num]
-            del self._store[seq_num]
-            return item
-        else:
-            del self._store[seq_num]
+            return item[:3]
 
     def get_item(self, seq_num):
-        """Get the indicated item"""
-        return self._store[seq_num]
+        """Get the indicated item as (timestamp_sent, resent, data)"""
+
+        idx = self._index(seq_num)
+        return (self._time[idx], bool(self._flags[idx] & FLAG_RESENT), self._data[idx])
 
     def set_resent(self, seq_num):
         """Set given item as resent"""
-        self._store[seq_num][1] = True
+        self._flags[self._index(seq_num)] |= FLAG_RESENT
 
-    def get_resendable(self, last_seq_acked):
-        """Going right-to-left get all seq nums until last_seq_acked"""
-
-        resendable = []
-        for seq in reversed(self._deq):
-            if last_seq_acked > seq:
-                resendable.append(seq)
+    def unacked_below(self, seq_limit):
+        """Iterate over seq numbers in-flight below seq_limit, oldest first"""
 
-        return resendable
+        if not self._count:
+            return
 
-    def pop_given(self, seq, return_item=True):
-        """Remove diven SEQ number"""
-        is_ooo = False
+        for (first, last) in self._acked.gaps(self._head, min(seq_limit, self._tail) - 1):
+            yield from range(first, last + 1)
 
-        # Check if there is at least on non-resent item
-        for sent_seq in reversed(self._deq):
-            # Exit as-soon as we find ourselves
-            if sent_seq == seq:
-                break
+    def get_resendable(self, last_seq_acked):
+        """Get all seq nums in-flight below last_seq_acked, oldest first"""
+        return list(self.unacked_below(last_seq_acked))
 
-            (_, resent, _) = self._store[sent_seq]
-            if resent:
-                continue
-            else:
-                is_ooo = True
-                break
+    def pop_given(self, seq, return_item=True):
+        """Remove given SEQ number. Item is out-of-order if there is at least
+           one older not resent item in-flight.
+        """
 
-        self._deq.remove(seq)
-        (time_stamp, resent, data) = self._store[seq]
-        del self._store[seq]
+        item = self.get_item(seq)
+        (_, _, is_ooo, _, _) = self.ack_range(seq, seq)[0]
 
         if return_item:
-            return (time_stamp, resent, data, is_ooo)
+            return item + (is_ooo,)
+
+    def ack_range(self, first, last):
+        """Remove items [first, last] from in-flight. Returns list of ranges
+           that were in-flight as tuples (first, last, is_ooo, at_head,
+           time_stamp). is_ooo - there is an older not resent item in-flight,
+           at_head - range was the oldest data in-flight, time_stamp - time
+           the newest not resent item in the range was sent (or None).
+        """
+
+        if not self._count:
+            return []
+
+        first = max(first, self._head)
+        last = min(last, self._tail - 1)
+        if first > last:
+            return []
+
+        ranges = self._acked.add(first, last)
+        if not ranges:
+            return []
+
+        # Find the oldest not resent item still in-flight
+        self._advance_fresh()
+
+        mask = self._mask
+        flags = self._flags
+        result = []
+        for (range_first, range_last) in ranges:
+            self._count -= range_last - range_first + 1
+
+            # Newest not resent item in the range gives the lowest RTT
+            time_stamp = None
+            for seq in range(range_last, range_first - 1, -1):
+                if not flags[seq & mask] & FLAG_RESENT:
+                    time_stamp = self._time[seq & mask]
+                    break
+
+            # Range is at head if everything before it is ACKed
+            at_head = range_first <= self._head
+            result.append((range_first, range_last, self._fresh < range_first,
+                           at_head, time_stamp))
+
+            if at_head:
+                self._advance_head()
+
+        return result
 
     def size(self):
-        """Get size of deque"""
-        return len(self._deq)
+        """Get number of items in-flight"""
+        return self._count
+
+    def _index(self, seq):
+        """Get ring buffer index of seq in-flight"""
+
+        if not self._count or not self._head <= seq < self._tail or seq in self._acked:
+            raise KeyError(seq)
+
+        return seq & self._mask
+
+    def _advance_head(self):
+        """Move head over ACKed items"""
+
+        if not self._count:
+            self._head = self._tail
+            self._acked.clear()
+        else:
+            acked = self._acked.first()
+            if acked is not None and acked[0] <= self._head:
+                self._head = acked[1] + 1
+                self._acked.remove_below(self._head)
+
+        if self._fresh < self._head:
+            self._fresh = self._head
+
+    def _advance_fresh(self):
+        """Move fresh over ACKed and resent items"""
+
+        fresh = max(self._fresh, self._head)
+        while fresh < self._tail:
+            acked = self._acked.find(fresh)
+            if acked is not None:
+                fresh = acked[1] + 1
+            elif self._flags[fresh & self._mask] & FLAG_RESENT:
+                fresh += 1
+            else:
+                break
+
+        self._fresh = fresh
+
+    def _grow(self):
+        """Double the capacity of the ring buffers"""
+
+        capacity = 2 * self._capacity
+        mask = capacity - 1
+        times = array.array('d', bytes(8 * capacity))
+        flags = bytearray(capacity)
+        data = capacity * [None]
+
+        for seq in range(self._head, self._tail):
+            old_idx = seq & self._mask
+            new_idx = seq & mask
+            times[new_idx] = self._time[old_idx]
+            flags[new_idx] = self._flags[old_idx]
+            data[new_idx] = self._data[old_idx]
+
+        self._capacity = capacity
+        self._mask = mask
+        self._time = times
+        self._flags = flags
+        self._data = data
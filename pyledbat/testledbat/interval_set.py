@@ -0,0 +1,127 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Set of integers stored as sorted, disjoint, non-adjacent closed intervals.
+Used to keep track of (S)ACKed sequence numbers.
+"""
+import bisect
+
+class IntervalSet(object):
+    """Set of integers kept as intervals [first, last]"""
+
+    def __init__(self):
+        """Initialize empty set"""
+        self._starts = []   # Interval starts, sorted
+        self._ends = []     # Interval ends (inclusive), sorted
+
+    def __len__(self):
+        """Get number of intervals"""
+        return len(self._starts)
+
+    def __iter__(self):
+        """Iterate over (first, last) intervals in ascending order"""
+        return zip(self._starts, self._ends)
+
+    def __reversed__(self):
+        """Iterate over (first, last) intervals in descending order"""
+        return zip(reversed(self._starts), reversed(self._ends))
+
+    def first(self):
+        """Get the lowest interval or None if set is empty"""
+
+        if not self._starts:
+            return None
+        return (self._starts[0], self._ends[0])
+
+    def last(self):
+        """Get the highest interval or None if set is empty"""
+
+        if not self._starts:
+            return None
+        return (self._starts[-1], self._ends[-1])
+
+    def find(self, value):
+        """Get the interval containing value or None"""
+
+        idx = bisect.bisect_right(self._starts, value) - 1
+        if idx >= 0 and self._ends[idx] >= value:
+            return (self._starts[idx], self._ends[idx])
+        return None
+
+    def __contains__(self, value):
+        return self.find(value) is not None
+
+    def add(self, first, last):
+        """Add interval [first, last]. Returns list of (first, last) parts
+           that were not in the set before, in ascending order.
+        """
+
+        starts = self._starts
+        ends = self._ends
+
+        # Intervals [lo, hi) overlap or touch the new one
+        lo = bisect.bisect_left(ends, first - 1)
+        hi = bisect.bisect_right(starts, last + 1)
+
+        added = []
+        cur = first
+        for idx in range(lo, hi):
+            if starts[idx] > cur:
+                added.append((cur, min(starts[idx] - 1, last)))
+            cur = max(cur, ends[idx] + 1)
+        if cur <= last:
+            added.append((cur, last))
+
+        if lo < hi:
+            first = min(first, starts[lo])
+            last = max(last, ends[hi - 1])
+
+        starts[lo:hi] = [first]
+        ends[lo:hi] = [last]
+
+        return added
+
+    def remove_below(self, value):
+        """Remove all values lower than value"""
+
+        idx = bisect.bisect_left(self._ends, value)
+        del self._starts[:idx]
+        del self._ends[:idx]
+
+        if self._starts and self._starts[0] < value:
+            self._starts[0] = value
+
+    def clear(self):
+        """Remove all values"""
+        del self._starts[:]
+        del self._ends[:]
+
+    def gaps(self, first, last):
+        """Iterate over (first, last) parts of [first, last] not in the set"""
+
+        idx = bisect.bisect_right(self._starts, first) - 1
+        if idx >= 0 and self._ends[idx] >= first:
+            first = self._ends[idx] + 1
+        idx += 1
+
+        while first <= last:
+            if idx < len(self._starts) and self._starts[idx] <= last:
+                yield (first, self._starts[idx] - 1)
+                first = self._ends[idx] + 1
+                idx += 1
+            else:
+                yield (first, last)
+                return
@@ -19,13 +19,15 @@ and server.
 """
 import logging
 import asyncio
-import struct
 import time
-import csv
 import os
+import array
 
 from ledbat import simpleledbat
 from .inflight_track import InflightTrack
+from .interval_set import IntervalSet
+from . import codec
+from . import metricslog
 
 T_INIT_ACK = 5.0    # Time to wait for INIT-ACK
 T_INIT_DATA = 5.0   # Time to wait for DATA after sending INIT-ACK
@@ -35,6 +37,205 @@ SZ_DATA = 1024      # Data size in each message
 OOO_THRESH = 3      # When to declare dataloss
 PRINT_EVERY = 5000  # Print debug every this many packets sent
 LOG_INTERVAL = 0.1  # Log every 0.1 sec
+TRACE_BUFFER = 4096 # ACK trace records kept in memory before writing
+MAX_SACK_BLOCKS = 4 # Max number of SACK blocks in ACK
+ACK_EVERY = 1       # Send ACK after this many DATA packets
+ACK_DELAY = 0.005   # Max time to delay ACK waiting for more DATA
+SEND_BURST = 16     # DATA packets a flow sends per scheduler round
+
+# Encoders are shared by all tests, as messages are sent right after encoding
+DATA_ENCODER = codec.DataEncoder(SZ_DATA)
+ACK_ENCODER = codec.AckEncoder(MAX_SACK_BLOCKS)
+
+def new_stats():
+    """Get the counters of a new test, as used by log_record"""
+
+    stats = {}
+    stats['Init'] = False
+    stats['Sent'] = 0
+    stats['Ack'] = 0
+    stats['Resent'] = 0
+    stats['OooPkt'] = 0
+    stats['DupPkt'] = 0
+    stats['LostPkt'] = 0
+    stats['SentPrev'] = 0
+    stats['AckPrev'] = 0
+    stats['ResentPrev'] = 0
+    stats['TPrev'] = 0
+    stats['GateSent'] = 0
+    stats['GateWaitCTO'] = 0
+    stats['GateWaitCWND'] = 0
+    stats['GateSentPrev'] = 0
+    stats['GateWaitCTOPrev'] = 0
+    stats['GateWaitCWNDPrev'] = 0
+    stats['OooPktPrev'] = 0
+    stats['DupPktPrev'] = 0
+    stats['LostPktPrev'] = 0
+    return stats
+
+def log_record(stats, ledbat, time_now):
+    """Build the log record (fields as in metricslog.LOG_FIELDS) from the
+       test stats and LEDBAT state, and start the next logging interval.
+    """
+
+    if not stats['Init']:
+        record = (
+            time_now, 0,
+            stats['Sent'], stats['Resent'], stats['Ack'],
+            stats['OooPkt'], stats['DupPkt'], stats['LostPkt'],
+            ledbat.cwnd, ledbat.flightsize, 0,
+            0, 0, 0, ledbat.cto,
+            0, 0, 0,
+            0, 0, 0,
+            0, 0, 0,
+        )
+        stats['Init'] = True
+    else:
+        record = (
+            time_now, time_now - stats['TPrev'],
+            stats['Sent'], stats['Resent'], stats['Ack'],
+            stats['OooPkt'], stats['DupPkt'], stats['LostPkt'],
+            ledbat.cwnd, ledbat.flightsize, ledbat.queuing_delay,
+            ledbat.rtt, ledbat.srtt, ledbat.rttvar, ledbat.cto,
+            stats['Sent'] - stats['SentPrev'],
+            stats['Resent'] - stats['ResentPrev'],
+            stats['Ack'] - stats['AckPrev'],
+            stats['GateSent'] - stats['GateSentPrev'],
+            stats['GateWaitCTO'] - stats['GateWaitCTOPrev'],
+            stats['GateWaitCWND'] - stats['GateWaitCWNDPrev'],
+            stats['OooPkt'] - stats['OooPktPrev'],
+            stats['DupPkt'] - stats['DupPktPrev'],
+            stats['LostPkt'] - stats['LostPktPrev'],
+        )
+
+    stats['TPrev'] = time_now
+    stats['SentPrev'] = stats['Sent']
+    stats['AckPrev'] = stats['Ack']
+    stats['ResentPrev'] = stats['Resent']
+    stats['GateSentPrev'] = stats['GateSent']
+    stats['GateWaitCTOPrev'] = stats['GateWaitCTO']
+    stats['GateWaitCWNDPrev'] = stats['GateWaitCWND']
+    stats['OooPktPrev'] = stats['OooPkt']
+    stats['DupPktPrev'] = stats['DupPkt']
+    stats['LostPktPrev'] = stats['LostPkt']
+
+    return record
+
+def data_rx(rx_seqs, seq, num_waiting, ack_every, ack_delay):
+    """Add the seq of received DATA to rx_seqs (IntervalSet). num_waiting -
+       number of DATA waiting to be ACKed (including this one). Returns True
+       if the ACK must be sent at once, False if it can be delayed.
+    """
+
+    # Out-of-order DATA is ACKed at once to speed up loss detection
+    last_block = rx_seqs.last()
+    in_order = last_block is None or seq == last_block[1] + 1
+
+    rx_seqs.add(seq, seq)
+
+    # Coalesce ACKs: ACK every N packets or after the delay (0 - at once)
+    return not in_order or num_waiting >= ack_every or not ack_delay
+
+def sack_blocks(rx_seqs, seq):
+    """Get up to MAX_SACK_BLOCKS blocks of received data. The first block
+       contains the given seq, others are the latest received blocks.
+    """
+
+    latest = rx_seqs.find(seq)
+    blocks = [latest]
+    for block in reversed(rx_seqs):
+        if len(blocks) == MAX_SACK_BLOCKS:
+            break
+        if block != latest:
+            blocks.append(block)
+
+    return blocks
+
+def ack_rx(inflight, blocks, rx_time, cnt_ooo, stats):
+    """Apply the SACK blocks ((first, last) pairs) of the ACK received at
+       rx_time to the InflightTrack and update Ack, OooPkt and DupPkt of
+       the stats. cnt_ooo - count of out-of-order packets so far. Returns
+       tuple (num_acked, rtts, resendable, cnt_ooo), where rtts are
+       round-trip times in microseconds and resendable is the list of
+       seqs to resend if data loss was detected (None if not).
+    """
+
+    rtts = array.array('d')
+    num_acked = 0
+    last_acked = None
+
+    # Apply SACK blocks oldest first, check for out-of-order and calculate rtts
+    for (ack_from, ack_to) in sorted(blocks):
+        for (first, last, is_ooo, at_head, time_stamp) in inflight.ack_range(ack_from, ack_to):
+            num_range = last - first + 1
+            num_acked += num_range
+            last_acked = last
+
+            if at_head:
+                # Reset if clearing non-resends from head of line
+                if time_stamp is not None:
+                    cnt_ooo = 0
+            elif is_ooo:
+                cnt_ooo += num_range
+                stats['OooPkt'] += num_range
+
+            # Only newest non-resent packet matters, as LEDBAT takes min RTT
+            if time_stamp is not None:
+                rtts.append((rx_time - time_stamp) * 1000000)
+
+    # Do not process duplicates
+    if not num_acked:
+        stats['DupPkt'] += 1
+        return (0, rtts, None, cnt_ooo)
+
+    stats['Ack'] += num_acked
+
+    resendable = None
+    if cnt_ooo >= OOO_THRESH:
+        resendable = inflight.get_resendable(last_acked)
+        cnt_ooo = 0
+
+    return (num_acked, rtts, resendable, cnt_ooo)
+
+def trace_record(ledbat, rx_time, bytes_acked, delays, rtts):
+    """Build the trace record (fields as in metricslog.TRACE_FIELDS) of
+       LEDBAT state after the ACK
+    """
+
+    return (
+        rx_time, bytes_acked,
+        len(delays), min(delays) if delays else 0, delays[-1] if delays else 0,
+        min(rtts) if rtts else None,
+        ledbat.base_delay, ledbat.queuing_delay,
+        ledbat.cwnd, ledbat.flightsize, ledbat.cto,
+    )
+
+class AckTrace(object):
+    """Per-ACK trace of LEDBAT state (metricslog.TRACE_FIELDS) in trace_path
+       and the raw one-way delays of the ACKs (metricslog.TRACE_DELAY_FIELDS)
+       in <trace_path without .npy>.delays.npy
+    """
+
+    def __init__(self, trace_path):
+        self._trace = metricslog.MetricsLog(
+            trace_path, metricslog.TRACE_FIELDS,
+            buffer_records=TRACE_BUFFER, flush_interval=None)
+        self._delays = metricslog.MetricsLog(
+            os.path.splitext(trace_path)[0] + '.delays.npy', metricslog.TRACE_DELAY_FIELDS,
+            buffer_records=TRACE_BUFFER, flush_interval=None)
+
+    def append(self, ledbat, rx_time, bytes_acked, delays, rtts):
+        """Trace LEDBAT state after the ACK"""
+
+        self._trace.append(trace_record(ledbat, rx_time, bytes_acked, delays, rtts))
+        for delay in delays:
+            self._delays.append((rx_time, delay))
+
+    def close(self):
+        """Write the rest and close the files"""
+
+        self._trace.close()
+        self._delays.close()
 
 class LedbatTest(object):
     """An instance representing a single LEDBAT test"""
@@ -46,12 +247,17 @@ class LedbatTest(object):
         self._remote_port = kwargs.get('remote_port')
         self._owner = kwargs.get('owner')
         self._make_log = kwargs.get('make_log')
-        self._ledbat_params = kwargs.get('ledbat_params')
+        self._ledbat_config = kwargs.get('ledbat_config')
         self._log_dir = kwargs.get('log_dir')
         self._log_name = kwargs.get('log_name')
         self._stream_id = kwargs.get('stream_id')
+        self._ack_every = kwargs.get('ack_every') or ACK_EVERY
+        self._ack_delay = kwargs.get('ack_delay')
+        if self._ack_delay is None:
+            self._ack_delay = ACK_DELAY
 
         self._ev_loop = asyncio.get_event_loop()
+        self._timers = self._owner.timer_wheel  # Per-test timers (except ACK delay)
 
         self._num_init_sent = 0
         self._hdl_init_ack = None       # Receive INIT-ACK after ACK
@@ -59,14 +265,18 @@ class LedbatTest(object):
         self._num_init_ack_sent = 0
         self._hdl_act_to_data = None    # Receive DATA after INIT-ACK
 
-        self._hdl_send_data = None      # Used to schedule data sending
+        self._weight = kwargs.get('weight') or 1    # Share of the send scheduler
         self._hdl_idle = None           # Idle check handle
 
-        self._ledbat = simpleledbat.SimpleLedbat(**self._ledbat_params)
+        self._ledbat = simpleledbat.SimpleLedbat(self._ledbat_config)
         self._next_seq = 1
 
         self._inflight = InflightTrack()
         self._cnt_ooo = 0               # Count of Out-of-Order packets
+        self._rx_seqs = IntervalSet()   # Seq numbers of received DATA
+        self._ack_delays = []           # One-way delays waiting to be ACKed
+        self._ack_seq = None            # Latest seq waiting to be ACKed
+        self._hdl_ack = None            # Delayed ACK timer
 
         self.is_init = False
         self.local_channel = None
@@ -74,36 +284,23 @@ class LedbatTest(object):
 
         self._time_start = None
         self._time_stop = None
-        self._time_last_rx = None
-
-        self.stats = {}
-        self.stats['Init'] = False
-        self.stats['Sent'] = 0
-        self.stats['Ack'] = 0
-        self.stats['Resent'] = 0
-        self.stats['OooPkt'] = 0
-        self.stats['DupPkt'] = 0
-        self.stats['LostPkt'] = 0
-        self.stats['SentPrev'] = 0
-        self.stats['AckPrev'] = 0
-        self.stats['ResentPrev'] = 0
-        self.stats['TPrev'] = 0
-        self.stats['GateSent'] = 0
-        self.stats['GateWaitCTO'] = 0
-        self.stats['GateWaitCWND'] = 0
-        self.stats['GateSentPrev'] = 0
-        self.stats['GateWaitCTOPrev'] = 0
-        self.stats['GateWaitCWNDPrev'] = 0
-        self.stats['OooPktPrev'] = 0
-        self.stats['DupPktPrev'] = 0
-        self.stats['LostPktPrev'] = 0
-
-        # Run periodic checks if object should be removed due to being idle
-        # JP: Disable as test timeout in severe congestionconditions
-        self._hdl_idle = None # self._ev_loop.call_later(T_IDLE, self._check_for_idle)
+        self._time_last_rx = time.time()    # Last time anything was received from the peer
+
+        self.stats = new_stats()
+
+        # Remove the test if nothing is received from the peer for T_IDLE.
+        # Client tests are stopped by the client, as in severe congestion
+        # there can be no ACKs for longer than that
+        if not self._is_client:
+            self._hdl_idle = self._timers.call_later(T_IDLE, self._check_for_idle)
 
         self._hdl_log = None
-        self._log_data_list = []
+        self._metrics_log = None    # Streaming log (only if make_log)
+        self._make_trace = kwargs.get('trace')
+        self._trace = None          # Per-ACK trace (only if trace)
+        self._make_ack_log = kwargs.get('record_acks')
+        self._ack_log = None        # Recording of ACKs for replay (only if record_acks)
+        self.log_path = None        # Path of the saved CSV log (if any)
 
         self.stop_hdl = None    # Stop event handle (if any)
 
@@ -120,27 +317,25 @@ class LedbatTest(object):
         self._build_and_send_init()
 
         # Schedule re-sender / disposer
-        self._hdl_init_ack = self._ev_loop.call_later(T_INIT_ACK, self._check_for_idle)
+        self._hdl_init_ack = self._timers.call_later(T_INIT_ACK, self._init_ack_missing)
 
     def _check_for_idle(self):
-        """Periodic check to see if idle test should be removed"""
+        """Remove the test if nothing was received for T_IDLE, otherwise
+           check again T_IDLE after the last reception
+        """
 
-        if self._time_last_rx is None or time.time() - self._time_last_rx > T_IDLE:
+        idle_time = time.time() - self._time_last_rx
+        if idle_time >= T_IDLE:
             logging.info('%s Destroying due to being idle', self)
             self.dispose()
         else:
-            self._hdl_init_ack = self._ev_loop.call_later(T_INIT_ACK, self._check_for_idle)
+            self._hdl_idle = self._timers.call_later(T_IDLE - idle_time, self._check_for_idle)
 
     def _build_and_send_init(self):
         """Build and send the INIT message"""
 
-        # Build the message
-        msg_bytes = bytearray(12)
-        struct.pack_into('>III', msg_bytes, 0,
-                         1,                     # Type - ACK
-                         0,                     # Remote Channel
-                         self.local_channel     # Local channel
-                        )
+        # Build the message. Remote channel is 0
+        msg_bytes = codec.encode_init(0, self.local_channel)
 
         # Send it to the remote
         self._owner.send_data(msg_bytes, (self._remote_ip, self._remote_port))
@@ -155,7 +350,7 @@ class LedbatTest(object):
         # Keep resending INIT for up to 3 times
         if self._num_init_sent < 3:
             self._build_and_send_init()
-            self._hdl_init_ack = self._ev_loop.call_later(T_INIT_ACK, self._init_ack_missing)
+            self._hdl_init_ack = self._timers.call_later(T_INIT_ACK, self._init_ack_missing)
         else:
             # After 3 time, dispose the test
             logging.info('%s INI-ACK missing!', self)
@@ -168,7 +363,15 @@ class LedbatTest(object):
         self._build_and_send_init_ack()
 
         # Start timer to wait for data
-        self._hdl_act_to_data = self._ev_loop.call_later(T_INIT_DATA, self._init_data_missing)
+        self._hdl_act_to_data = self._timers.call_later(T_INIT_DATA, self._init_data_missing)
+
+    def init_received(self):
+        """Handle duplicate INIT from the remote (INIT-ACK was lost or
+           INIT was delayed)
+        """
+
+        self._time_last_rx = time.time()
+        self._build_and_send_init_ack()
 
     def _init_data_missing(self):
         """Called when DATA is not received after INIT-ACK"""
@@ -176,7 +379,7 @@ class LedbatTest(object):
         # Keep resending INIT-ACK up to 3 times
         if self._num_init_ack_sent < 3:
             self._build_and_send_init_ack()
-            self._hdl_act_to_data = self._ev_loop.call_later(T_INIT_DATA, self._init_data_missing)
+            self._hdl_act_to_data = self._timers.call_later(T_INIT_DATA, self._init_data_missing)
         else:
             # After 3 times dispose
             logging.info('%s DATA missing after 3 INIT-ACK', self)
@@ -186,12 +389,7 @@ class LedbatTest(object):
         """Build and send INI-ACK message"""
 
         # Build message bytes
-        msg_bytes = bytearray(12)
-        struct.pack_into('>III', msg_bytes, 0,
-                         1,                     # Type
-                         self.remote_channel,   # Remote channel
-                         self.local_channel     # Local channel
-                        )
+        msg_bytes = codec.encode_init(self.remote_channel, self.local_channel)
 
         # Send it
         self._owner.send_data(msg_bytes, (self._remote_ip, self._remote_port))
@@ -230,11 +428,21 @@ class LedbatTest(object):
         # Take time when starting
         self._time_start = time.time()
 
-        # Scedule sending event on the loop
+        # Start sending via the scheduler of the owner
         logging.info('%s Starting test', self)
-        self._hdl_send_data = self._ev_loop.call_soon(self._try_next_send)
+        self._owner.send_scheduler.add(self, self._weight)
+
+        if self._make_log:
+            self._metrics_log = metricslog.MetricsLog(self._log_path('npy'))
+            self._log_data()
 
-        self._log_data()
+        if self._make_trace:
+            self._trace = AckTrace(self._log_path('trace.npy'))
+
+        if self._make_ack_log:
+            self._ack_log = metricslog.MetricsLog(
+                self._log_path('acks.npy'), metricslog.ACK_FIELDS,
+                buffer_records=TRACE_BUFFER, flush_interval=None)
 
     def _log_data(self):
         """Make LOG entry"""
@@ -243,115 +451,49 @@ class LedbatTest(object):
         if self._hdl_log is not None:
             self._hdl_log.cancel()
 
-        time_now = time.time()
-
-        if not self.stats['Init']:
-            stats = {
-                'Time': time_now,
-                'dT': 0,
-                'Sent': self.stats['Sent'],
-                'Resent': self.stats['Resent'],
-                'Acked': self.stats['Ack'],
-                'OooPkt': self.stats['OooPkt'],
-                'DupPkt': self.stats['DupPkt'],
-                'LostPkt': self.stats['LostPkt'],
-                'Cwnd': self._ledbat.cwnd,
-                'FlightSz': self._ledbat.flightsize,
-                'QueuingDly': 0,
-                'Rtt': 0,
-                'Srtt': 0,
-                'Rttvar': 0,
-                'Cto': self._ledbat.cto,
-                'dSent': 0,
-                'dResent': 0,
-                'dAck': 0,
-                'dGateSent': 0,
-                'dGateWaitCTO': 0,
-                'dGateWaitCWND': 0,
-                'dOooPkt': 0,
-                'dDupPkt': 0,
-                'dLostPkt' : 0,
-            }
-            self.stats['Init'] = True
-        else:
-            stats = {
-                'Time': time_now,
-                'dT': time_now - self.stats['TPrev'],
-                'Sent': self.stats['Sent'],
-                'Resent': self.stats['Resent'],
-                'Acked': self.stats['Ack'],
-                'OooPkt': self.stats['OooPkt'],
-                'DupPkt': self.stats['DupPkt'],
-                'LostPkt': self.stats['LostPkt'],
-                'Cwnd': self._ledbat.cwnd,
-                'FlightSz': self._ledbat.flightsize,
-                'QueuingDly': self._ledbat.queuing_delay,
-                'Rtt': self._ledbat.rtt,
-                'Srtt': self._ledbat.srtt,
-                'Rttvar': self._ledbat.rttvar,
-                'Cto': self._ledbat.cto,
-                'dSent': self.stats['Sent'] - self.stats['SentPrev'],
-                'dResent': self.stats['Resent'] - self.stats['ResentPrev'],
-                'dAck': self.stats['Ack'] - self.stats['AckPrev'],
-                'dGateSent': self.stats['GateSent'] - self.stats['GateSentPrev'],
-                'dGateWaitCTO': self.stats['GateWaitCTO'] - self.stats['GateWaitCTOPrev'],
-                'dGateWaitCWND': self.stats['GateWaitCWND'] - self.stats['GateWaitCWNDPrev'],
-                'dOooPkt': self.stats['OooPkt'] - self.stats['OooPktPrev'],
-                'dDupPkt': self.stats['DupPkt'] - self.stats['DupPktPrev'],
-                'dLostPkt' : self.stats['LostPkt'] - self.stats['LostPktPrev'],
-            }
-
-        self._log_data_list.append(stats)
-
-        self.stats['TPrev'] = time_now
-        self.stats['SentPrev'] = self.stats['Sent']
-        self.stats['AckPrev'] = self.stats['Ack']
-        self.stats['ResentPrev'] = self.stats['Resent']
-        self.stats['GateSentPrev'] = self.stats['GateSent']
-        self.stats['GateWaitCTOWPrev'] = self.stats['GateWaitCTO']
-        self.stats['GateWaitCWNDPrev'] = self.stats['GateWaitCWND']
-        self.stats['OooPktPrev'] = self.stats['OooPkt']
-        self.stats['DupPktPrev'] = self.stats['DupPkt']
-        self.stats['LostPktPrev'] = self.stats['LostPkt']
+        # Fields as in metricslog.LOG_FIELDS
+        self._metrics_log.append(log_record(self.stats, self._ledbat, time.time()))
 
         # Schedule next call
-        self._hdl_log = self._ev_loop.call_later(LOG_INTERVAL, self._log_data)
+        self._hdl_log = self._timers.call_later(LOG_INTERVAL, self._log_data)
 
-    def _save_log(self):
-        """Save log to the file"""
+    def _log_path(self, extension):
+        """Get path of the log file with the given extension"""
 
         if self._log_name:
             if self._stream_id is None:
-                filename = '{}.csv'.format(self._log_name)
+                filename = '{}.{}'.format(self._log_name, extension)
             else:
-                filename = '{}-stream-{}.csv'.format(
-                    self._log_name, self._stream_id)
+                filename = '{}-stream-{}.{}'.format(
+                    self._log_name, self._stream_id, extension)
         else:
             if self._stream_id is None:
-                filename = '{}-{}-{}.csv'.format(
+                filename = '{}-{}-{}.{}'.format(
                     int(self._time_start),
                     self._remote_ip,
-                    self._remote_port)
+                    self._remote_port,
+                    extension)
             else:
-                filename = '{}-{}-{}-stream-{}.csv'.format(
+                filename = '{}-{}-{}-stream-{}.{}'.format(
                     int(self._time_start),
                     self._remote_ip,
                     self._remote_port,
-                    self._stream_id)
+                    self._stream_id,
+                    extension)
 
         if self._log_dir:
-            filepath = os.path.join(self._log_dir, filename)
-        else:
-            filepath = filename
+            return os.path.join(self._log_dir, filename)
+
+        return filename
+
+    def _save_log(self):
+        """Close the streaming log and export it to CSV"""
 
-        with open(filepath, 'w', newline='') as fp_csv:
-            fields = list(self._log_data_list[0].keys())
-            csvwriter = csv.DictWriter(fp_csv, fieldnames = fields)
-            csvwriter.writeheader()
+        self._metrics_log.close()
 
-            # Write all rows
-            for row in self._log_data_list:
-                csvwriter.writerow(row)
+        self.log_path = self._log_path('csv')
+        metricslog.export_csv(self._metrics_log.filepath, self.log_path)
+        self._metrics_log = None
 
     def stop_test(self):
         """Stop the test and print results"""
@@ -361,34 +503,59 @@ class LedbatTest(object):
         self._print_status()
 
         # Make the last log entry
-        if self._log_data:
+        if self._metrics_log is not None:
             self._log_data()
             if self._hdl_log is not None:
                 self._hdl_log.cancel()
+                self._hdl_log = None
             self._save_log()
 
-    def _try_next_send(self):
-        """Try sending next data segment. This implementation sends data
-           as fast as possible using polling. A more elegant solution using
-           semaphore would be nicer.
+    def get_summary(self):
+        """Get dict with the results of the stopped test"""
+
+        if self._time_start is None:
+            duration = 0
+        else:
+            duration = (self._time_stop or time.time()) - self._time_start
+
+        all_sent = self.stats['Sent'] + self.stats['Resent']
+
+        return {
+            'StreamId': self._stream_id,
+            'Duration': duration,
+            'Sent': self.stats['Sent'],
+            'Acked': self.stats['Ack'],
+            'Resent': self.stats['Resent'],
+            'OooPkt': self.stats['OooPkt'],
+            'DupPkt': self.stats['DupPkt'],
+            'LostPkt': self.stats['LostPkt'],
+            'TxRate': all_sent / duration if duration else 0,
+            'LogFile': self.log_path,
+        }
+
+    def send_next(self):
+        """Send next data segment if LEDBAT allows. Called by the send
+           scheduler. Returns tuple (sent, wait_time), where wait_time is
+           the time to sleep (until an ACK wakes the sender up).
         """
 
         # SZ_DATA + 24 Bytes for header
-        (can_send, reason) = self._ledbat.try_sending(SZ_DATA + 24)
-        if can_send:
-            self.stats['GateSent'] += 1
-            self._build_and_send_data()
-
-            # Print stats
-            if self.stats['Sent'] % PRINT_EVERY == 0:
-                self._print_status()
-        else:
+        (can_send, reason, wait_time) = self._ledbat.try_sending_timed(SZ_DATA + 24)
+        if not can_send:
             if reason == simpleledbat.FailReason.CTO:
                 self.stats['GateWaitCTO'] += 1
             elif reason == simpleledbat.FailReason.CWND:
                 self.stats['GateWaitCWND'] += 1
+            return (False, wait_time)
+
+        self.stats['GateSent'] += 1
+        self._build_and_send_data()
 
-        self._hdl_send_data = self._ev_loop.call_soon(self._try_next_send)
+        # Print stats
+        if self.stats['Sent'] % PRINT_EVERY == 0:
+            self._print_status()
+
+        return (True, 0)
 
     def _print_status(self):
         """Print status during sending"""
@@ -406,28 +573,27 @@ class LedbatTest(object):
         all_sent = self.stats['Sent'] + self.stats['Resent']
         tx_rate = all_sent / test_time
 
+        # Syscalls per datagram of the whole socket
+        (num_datagrams, num_syscalls) = self._owner.tx_stats()
+        sys_per_pkt = num_syscalls / num_datagrams if num_datagrams else 0
+
         # Print data
-        logging.info('Time: %.2f TX/ACK/RES: %s/%s/%s TxR: %.2f',
+        logging.info('Time: %.2f TX/ACK/RES: %s/%s/%s TxR: %.2f Sys/Pkt: %.2f',
                      test_time, self.stats['Sent'], self.stats['Ack'],
-                     self.stats['Resent'], tx_rate)
+                     self.stats['Resent'], tx_rate, sys_per_pkt)
+
+        # Time ACKs waited in the socket before being read
+        rx_ts_gap = self._owner.rx_ts_gap()
+        if rx_ts_gap is not None:
+            logging.info('Kernel to user RX gap avg/max: %.3f/%.3f ms',
+                         rx_ts_gap[0] * 1000, rx_ts_gap[1] * 1000)
 
     def _send_data(self, seq_num, time_sent, data):
         """Frame given data and send it"""
 
-        # Build the header
-        msg_data = bytearray()
-        msg_data.extend(struct.pack(
-            '>IIIIQ', # Type, Rem_ch, Loc_ch, Seq, Timestamp
-            2,
-            self.remote_channel,
-            self.local_channel,
-            seq_num,
-            int(time_sent * 1000000)))
-
-        if data is None:
-            msg_data.extend(SZ_DATA * bytes([127]))
-        else:
-            msg_data.extend(data)
+        # Build the message in the shared buffer
+        msg_data = DATA_ENCODER.encode(self.remote_channel, self.local_channel,
+                                       seq_num, int(time_sent * 1000000), data)
 
         # Send the message
         self._owner.send_data(msg_data, (self._remote_ip, self._remote_port))
@@ -450,10 +616,10 @@ class LedbatTest(object):
         self.stats['Sent'] += 1
 
     def data_received(self, data, receive_time):
-        """Handle the DATA message for this test"""
+        """Handle the DATA message (including the header) for this test"""
 
         # Update time of latest datain
-        self._time_last_rx = time.time()
+        self._time_last_rx = receive_time
 
         # If we are acceptor, update the stat
         if not self._is_client and not self.is_init:
@@ -464,31 +630,38 @@ class LedbatTest(object):
             self.is_init = True
             logging.info('%s Got first data. Test is init', self)
 
-        # data is binary data _without_ the header
-        (seq, time_stamp) = struct.unpack('>IQ', data[0:12])
+        (seq, time_stamp) = codec.decode_data(data)
 
         # Get the delay
-        one_way_delay = (receive_time * 1000000) - time_stamp
+        one_way_delay = int(receive_time * 1000000) - time_stamp
 
-        # Send ACK, no delays/grouping
-        self._send_ack(seq, seq, [one_way_delay])
+        self._ack_delays.append(one_way_delay)
+        self._ack_seq = seq
 
-    def _send_ack(self, ack_from, ack_to, one_way_delays):
-        """Build and send ACK message"""
+        if data_rx(self._rx_seqs, seq, len(self._ack_delays), self._ack_every, self._ack_delay):
+            self._flush_ack()
+        elif self._hdl_ack is None:
+            self._hdl_ack = self._ev_loop.call_later(self._ack_delay, self._flush_ack)
 
-        msg_bytes = bytearray()
+    def _flush_ack(self):
+        """Send ACK for DATA received since the last ACK"""
+
+        if self._hdl_ack is not None:
+            self._hdl_ack.cancel()
+            self._hdl_ack = None
+
+        if not self._ack_delays:
+            return
 
-        # Header
-        msg_bytes.extend(struct.pack('>III', 3, self.remote_channel, self.local_channel))
+        # Block of the latest packet goes first
+        self._send_ack(sack_blocks(self._rx_seqs, self._ack_seq), self._ack_delays)
+        self._ack_delays = []
 
-        # ACK data
-        msg_bytes.extend(struct.pack('>II', ack_from, ack_to))
+    def _send_ack(self, blocks, one_way_delays):
+        """Build and send ACK message"""
 
-        # Delay samples
-        num_samples = len(one_way_delays)
-        msg_bytes.extend(struct.pack('>I', num_samples))
-        for sample in one_way_delays:
-            msg_bytes.extend(struct.pack('>Q', int(sample)))
+        msg_bytes = ACK_ENCODER.encode(self.remote_channel, self.local_channel,
+                                       blocks, one_way_delays)
 
         # Send ACK
         self._owner.send_data(msg_bytes, (self._remote_ip, self._remote_port))
@@ -503,62 +676,48 @@ class LedbatTest(object):
             self.stats['Resent'] += 1
 
     def ack_received(self, ack_data, rx_time):
-        """Handle the ACK"""
-
-        delays = []
-        rtts = []
+        """Handle the ACK message (including the header)"""
 
         # Update time of latest datain
         self._time_last_rx = rx_time
 
         # Extract the data
-        (ack_from, ack_to, num_delays) = struct.unpack('>III', ack_data[0:12])
+        (blocks, delays) = codec.decode_ack(ack_data)
 
-        # Do not process duplicates
-        if ack_to < self._inflight.peek():
-            self.stats['DupPkt'] += 1
-            #logging.info('Duplciate ACK packet. ACKed: %s:%s; Head: %s',
-            #        ack_from, ack_to, self._inflight.peek())
+        (num_acked, rtts, resendable, self._cnt_ooo) = ack_rx(
+            self._inflight, zip(blocks[0::2], blocks[1::2]), rx_time, self._cnt_ooo, self.stats)
+        if not num_acked:
             return
 
-        # Check for out-of-order and calculate rtts
-        for acked_seq_num in range(ack_from, ack_to + 1):
-
-            if acked_seq_num == self._inflight.peek():
-                (time_stamp, resent, _) = self._inflight.pop()
-                if resent:
-                    pass
-                    #logging.info('Cleared resent from head: %s', acked_seq_num)
-                else:
-                    # Reset if clearing non-resends from head of line
-                    self._cnt_ooo = 0
-            else:
-                (time_stamp, resent, _, is_ooo) = self._inflight.pop_given(acked_seq_num)
-                if is_ooo:
-                    self._cnt_ooo += 1
-                    self.stats['OooPkt'] += 1
+        if resendable is not None:
+            self._resend_indicated(resendable)
+            self._ledbat.data_loss()
 
-            self.stats['Ack'] += 1
-            last_acked = acked_seq_num
+            if self._ack_log is not None:
+                self._ack_log.append((rx_time, metricslog.ACK_LOSS, len(resendable)))
 
-            if not resent:
-                rtts.append(rx_time - time_stamp)
+        # Feed new data to LEDBAT. Each packet is SZ_DATA + 24 Bytes for header
+        self._ledbat.update_measurements_raw(num_acked * (SZ_DATA + 24), delays, rtts)
 
-        if self._cnt_ooo >= OOO_THRESH:
-            resendable = self._inflight.get_resendable(last_acked)
-            self._resend_indicated(resendable)
-            self._ledbat.data_loss()
-            self._cnt_ooo = 0
+        if self._trace is not None:
+            self._trace.append(self._ledbat, rx_time, num_acked * (SZ_DATA + 24), delays, rtts)
+
+        if self._ack_log is not None:
+            self._record_ack(rx_time, num_acked * (SZ_DATA + 24), delays, rtts)
 
-        # Extract list of delays
-        for dalay in range(0, num_delays):
-            delays.append(int(struct.unpack('>Q', ack_data[12+dalay*8:20+dalay*8])[0]))
+        # ACK might have opened the window
+        self._owner.send_scheduler.wake(self)
 
-        # Move to milliseconds from microseconds
-        delays = [x / 1000 for x in delays]
+    def _record_ack(self, rx_time, bytes_acked, delays, rtts):
+        """Add the ACK as given to LEDBAT to the ACK recording"""
 
-        # Feed new data to LEDBAT
-        self._ledbat.update_measurements(((ack_to - ack_from + 1) * SZ_DATA) + 24, delays, rtts)
+        # Fields as in metricslog.ACK_FIELDS
+        append = self._ack_log.append
+        append((rx_time, metricslog.ACK_BYTES, bytes_acked))
+        for delay in delays:
+            append((rx_time, metricslog.ACK_DELAY, delay))
+        for rtt in rtts:
+            append((rx_time, metricslog.ACK_RTT, int(rtt)))
 
     def dispose(self):
         """Cleanup this test"""
@@ -575,9 +734,7 @@ class LedbatTest(object):
             self._hdl_act_to_data.cancel()
             self._hdl_act_to_data = None
 
-        if self._hdl_send_data is not None:
-            self._hdl_send_data.cancel()
-            self._hdl_send_data = None
+        self._owner.send_scheduler.remove(self)
 
         if self._hdl_idle is not None:
             self._hdl_idle.cancel()
@@ -587,6 +744,23 @@ class LedbatTest(object):
             self._hdl_log.cancel()
             self._hdl_log = None
 
+        # Keep what was logged if the test was not stopped
+        if self._metrics_log is not None:
+            self._metrics_log.close()
+            self._metrics_log = None
+
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+        if self._ack_log is not None:
+            self._ack_log.close()
+            self._ack_log = None
+
+        if self._hdl_ack is not None:
+            self._hdl_ack.cancel()
+            self._hdl_ack = None
+
         if self.stop_hdl is not None:
             self.stop_hdl.cancel()
             self.stop_hdl = None
@@ -0,0 +1,218 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Streaming log of the run-time values of a test. Fixed-width records are
+appended to a NumPy .npy file (1-D structured array) while the test runs,
+so memory use does not grow with the length of the run and a crash loses
+at most FLUSH_INTERVAL of data. The shape in the header is rewritten on
+every flush, so the file can always be opened with numpy.load(mmap_mode='r').
+
+Writing does not need NumPy. Reading and CSV export use it if available.
+
+Export to CSV: python -m testledbat.metricslog <log.npy> [<log.csv>]
+"""
+import ast
+import csv
+import struct
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# (name, type) of the record fields, types as in NumPy/struct (little endian)
+LOG_FIELDS = (
+    ('Time', 'f8'), ('dT', 'f8'),
+    ('Sent', 'i8'), ('Resent', 'i8'), ('Acked', 'i8'),
+    ('OooPkt', 'i8'), ('DupPkt', 'i8'), ('LostPkt', 'i8'),
+    ('Cwnd', 'i8'), ('FlightSz', 'i8'), ('QueuingDly', 'f8'),
+    ('Rtt', 'f8'), ('Srtt', 'f8'), ('Rttvar', 'f8'), ('Cto', 'f8'),
+    ('dSent', 'i8'), ('dResent', 'i8'), ('dAck', 'i8'),
+    ('dGateSent', 'i8'), ('dGateWaitCTO', 'i8'), ('dGateWaitCWND', 'i8'),
+    ('dOooPkt', 'i8'), ('dDupPkt', 'i8'), ('dLostPkt', 'i8'),
+)
+
+# Per-ACK trace. Field names end with the unit (Us - microseconds, Ms -
+# milliseconds, S - seconds) where it differs between the fields.
+TRACE_FIELDS = (
+    ('Time', 'f8'), ('BytesAcked', 'i8'),
+    ('NumDelays', 'i8'), ('DelayMinUs', 'i8'), ('DelayLastUs', 'i8'), ('RttMinUs', 'f8'),
+    ('BaseDelayMs', 'f8'), ('QueuingDlyMs', 'f8'),
+    ('Cwnd', 'i8'), ('FlightSz', 'i8'), ('CtoS', 'f8'),
+)
+
+# Raw one-way delay samples of the traced ACKs, one record per sample.
+# Time is the same as of the trace record of the ACK.
+TRACE_DELAY_FIELDS = (('Time', 'f8'), ('DelayUs', 'i8'))
+
+# Recording of ACKs as given to LEDBAT. Each ACK is an ACK_BYTES record
+# (bytes ACKed) followed by ACK_DELAY (one-way delay, us) and ACK_RTT
+# (round-trip time, us) records. ACK_LOSS (number of packets resent) is
+# recorded before the ACK that detected the loss.
+ACK_FIELDS = (('Time', 'f8'), ('Kind', 'i4'), ('Value', 'i8'))
+(ACK_BYTES, ACK_DELAY, ACK_RTT, ACK_LOSS) = range(4)
+
+BUFFER_RECORDS = 256    # Records kept in memory before writing
+FLUSH_INTERVAL = 5.0    # Max time between writes (seconds)
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+HEADER_SIZE = 1024      # Fixed, so the header can be rewritten in place
+
+_STRUCT_CODES = {'f8': 'd', 'i8': 'q', 'u8': 'Q', 'f4': 'f', 'i4': 'i', 'u4': 'I'}
+
+class MetricsLog(object):
+    """Writer of the streaming log. Values of a record are given in the
+       order of the fields. None is stored as NaN in float fields.
+       flush_interval=None writes only when the buffer is full.
+    """
+
+    def __init__(self, filepath, fields=LOG_FIELDS, **kwargs):
+        self.filepath = filepath
+        self._fields = fields
+        self._record = struct.Struct('<' + ''.join([_STRUCT_CODES[ftype] for (_, ftype) in fields]))
+        self._none_ok = [ftype[0] == 'f' for (_, ftype) in fields]
+        self._buffer_records = kwargs.get('buffer_records', BUFFER_RECORDS)
+        self._flush_interval = kwargs.get('flush_interval', FLUSH_INTERVAL)
+        self._clock = kwargs.get('clock', time.monotonic)
+
+        self._buffer = bytearray(self._record.size * self._buffer_records)
+        self._num_buffered = 0
+        self._num_written = 0
+        self._last_flush = self._clock()
+
+        self._file = open(filepath, 'wb')
+        self._write_header()
+
+    @property
+    def num_records(self):
+        """Get number of records logged so far"""
+        return self._num_written + self._num_buffered
+
+    def append(self, values):
+        """Add a record. Written to the file when the buffer is full or
+           FLUSH_INTERVAL has passed since the last write.
+        """
+
+        if None in values:
+            values = [float('nan') if value is None and none_ok else value
+                      for (value, none_ok) in zip(values, self._none_ok)]
+
+        self._record.pack_into(self._buffer, self._num_buffered * self._record.size, *values)
+        self._num_buffered += 1
+
+        if self._num_buffered == self._buffer_records:
+            self.flush()
+        elif (self._flush_interval is not None and
+              self._clock() - self._last_flush >= self._flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write buffered records and update the header"""
+
+        self._last_flush = self._clock()
+        if not self._num_buffered:
+            return
+
+        self._file.write(memoryview(self._buffer)[:self._num_buffered * self._record.size])
+        self._num_written += self._num_buffered
+        self._num_buffered = 0
+
+        self._write_header()
+        self._file.flush()
+
+    def close(self):
+        """Write the rest and close the file"""
+
+        if self._file is None:
+            return
+
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def _write_header(self):
+        """Write .npy header with the current number of records"""
+
+        descr = [(name, '<' + ftype) for (name, ftype) in self._fields]
+        header = "{{'descr': {}, 'fortran_order': False, 'shape': ({},), }}".format(
+            descr, self._num_written)
+        header = header.encode('latin1').ljust(HEADER_SIZE - len(NPY_MAGIC) - 3) + b'\n'
+
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(NPY_MAGIC + struct.pack('<H', len(header)) + header)
+        if position > HEADER_SIZE:
+            self._file.seek(position)
+
+def read_header(fp_log):
+    """Get (fields, num_records) from the header of the log"""
+
+    if fp_log.read(len(NPY_MAGIC)) != NPY_MAGIC:
+        raise ValueError('Not a metrics log file')
+
+    (header_len,) = struct.unpack('<H', fp_log.read(2))
+    header = ast.literal_eval(fp_log.read(header_len).decode('latin1'))
+    fields = [(name, ftype.lstrip('<')) for (name, ftype) in header['descr']]
+
+    return (fields, header['shape'][0])
+
+def read_log(filepath):
+    """Read the log as NumPy structured array (memory mapped)"""
+    return numpy.load(filepath, mmap_mode='r')
+
+def iter_records(filepath):
+    """Iterate over records of the log as tuples (does not need NumPy)"""
+
+    with open(filepath, 'rb') as fp_log:
+        (fields, num_records) = read_header(fp_log)
+        record = struct.Struct('<' + ''.join([_STRUCT_CODES[ftype] for (_, ftype) in fields]))
+        data = fp_log.read(num_records * record.size)
+
+    return record.iter_unpack(data)
+
+def export_csv(log_path, csv_path):
+    """Export the log to CSV file"""
+
+    with open(log_path, 'rb') as fp_log:
+        (fields, _) = read_header(fp_log)
+
+    with open(csv_path, 'w', newline='') as fp_csv:
+        csvwriter = csv.writer(fp_csv)
+        csvwriter.writerow([name for (name, _) in fields])
+        if numpy is not None:
+            csvwriter.writerows(read_log(log_path).tolist())
+        else:
+            csvwriter.writerows(iter_records(log_path))
+
+def main():
+    """Export log given on the command line to CSV"""
+
+    if len(sys.argv) < 2:
+        print('Usage: python -m testledbat.metricslog <log.npy> [<log.csv>]')
+        return
+
+    log_path = sys.argv[1]
+    if len(sys.argv) > 2:
+        csv_path = sys.argv[2]
+    else:
+        csv_path = log_path[:-4] + '.csv' if log_path.endswith('.npy') else log_path + '.csv'
+
+    export_csv(log_path, csv_path)
+
+if __name__ == '__main__':
+    main()
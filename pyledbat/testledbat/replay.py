@@ -0,0 +1,184 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Replay of ACKs recorded by LedbatTest (record_acks) into LEDBAT controllers.
+
+The controllers are given the recorded receive time as their clock, so a
+recording is replayed as fast as the controller can process it. The sender
+is assumed to always have data: before each ACK it sends as much as the
+controller allows. The same recording can be replayed into different
+controllers or parameters to compare their cwnd and delay estimates.
+
+Usage: python -m testledbat.replay <acks.npy> [<controller>[:<param>=<value>,...] ...]
+e.g. python -m testledbat.replay test.acks.npy simple simple:target=25 swift
+"""
+import array
+import ast
+import functools
+import sys
+
+from ledbat import baseledbat
+from . import ledbat_test
+from . import metricslog
+from . import simulator
+
+PKT_SIZE = ledbat_test.SZ_DATA + 24
+MAX_BURST = 1000        # Max packets sent before one ACK
+
+class ReplayClock(object):
+    """Clock returning the time of the ACK being replayed"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def read_acks(filepath):
+    """Read the recording as list of (rx_time, bytes_acked, delays, rtts,
+       num_lost) tuples. Delays and rtts are arrays of microseconds,
+       num_lost - packets resent before the ACK was given to LEDBAT.
+       Values are read as in the file header, so recordings with 32-bit
+       Value (before it was widened to 64-bit) are read as well.
+    """
+
+    acks = []
+    num_lost = 0
+
+    for (rx_time, kind, value) in metricslog.iter_records(filepath):
+        if kind == metricslog.ACK_BYTES:
+            delays = array.array('q')
+            rtts = array.array('d')
+            acks.append((rx_time, value, delays, rtts, num_lost))
+            num_lost = 0
+        elif kind == metricslog.ACK_DELAY:
+            delays.append(value)
+        elif kind == metricslog.ACK_RTT:
+            rtts.append(value)
+        elif kind == metricslog.ACK_LOSS:
+            num_lost += value
+
+    return acks
+
+def replay(acks, factory, trace_path=None):
+    """Feed the ACKs to the controller made by factory(clock=...). Returns
+       tuple (summary dict, array of cwnd after each ACK). Optionally LEDBAT
+       state after each ACK is saved as ledbat_test.AckTrace.
+    """
+
+    clock = ReplayClock(acks[0][0] if acks else 0.0)
+    ledbat = factory(clock=clock)
+
+    trace = None
+    if trace_path:
+        trace = ledbat_test.AckTrace(trace_path)
+
+    cwnds = array.array('d')
+    queuing_delays = array.array('d')
+    bytes_sent = 0
+    num_losses = 0
+
+    for (rx_time, bytes_acked, delays, rtts, num_lost) in acks:
+        clock.now = rx_time
+
+        # Send what the controller allows since the previous ACK
+        for _ in range(MAX_BURST):
+            if not ledbat.try_sending(PKT_SIZE)[0]:
+                break
+            if hasattr(ledbat, 'last_send_time'):
+                ledbat.last_send_time = rx_time
+            bytes_sent += PKT_SIZE
+
+        if num_lost:
+            ledbat.data_loss()
+            num_losses += 1
+
+        ledbat.update_measurements_raw(bytes_acked, delays, rtts)
+
+        cwnds.append(ledbat.cwnd)
+        queuing_delays.append(ledbat.queuing_delay)
+        if trace is not None:
+            trace.append(ledbat, rx_time, bytes_acked, delays, rtts)
+
+    if trace is not None:
+        trace.close()
+
+    duration = acks[-1][0] - acks[0][0] if len(acks) > 1 else 0
+    summary = {
+        'Acks': len(acks),
+        'Losses': num_losses,
+        'TxRate': bytes_sent * 8 / duration if duration else 0,
+        'CwndAvg': sum(cwnds) / len(cwnds) if cwnds else 0,
+        'CwndMax': max(cwnds) if cwnds else 0,
+        'QueuingP50': simulator.percentile(queuing_delays, 50),
+        'QueuingP99': simulator.percentile(queuing_delays, 99),
+        'Cto': ledbat.cto,
+    }
+
+    return (summary, cwnds)
+
+def make_factory(spec):
+    """Make controller factory from 'name[:param=value,...]' (params as in
+       baseledbat.LedbatConfig)
+    """
+
+    (name, _, params) = spec.partition(':')
+    changes = {}
+    for param in filter(None, params.split(',')):
+        (key, _, value) = param.partition('=')
+        changes[key.strip()] = ast.literal_eval(value.strip())
+
+    config = baseledbat.LedbatConfig(**changes) if changes else None
+    return functools.partial(simulator.CONTROLLERS[name], config)
+
+def compare(filepath, specs):
+    """Replay the recording into each of the controllers. Returns list of
+       (spec, summary) with CwndDiff - mean absolute difference of cwnd
+       from the first controller.
+    """
+
+    acks = read_acks(filepath)
+
+    results = []
+    first_cwnds = None
+    for spec in specs:
+        (summary, cwnds) = replay(acks, make_factory(spec))
+        if first_cwnds is None:
+            first_cwnds = cwnds
+        summary['CwndDiff'] = (sum([abs(a - b) for (a, b) in zip(cwnds, first_cwnds)]) /
+                               len(cwnds) if cwnds else 0)
+        results.append((spec, summary))
+
+    return results
+
+def main():
+    """Compare controllers given on the command line"""
+
+    if len(sys.argv) < 2:
+        print('Usage: python -m testledbat.replay <acks.npy> [<controller>[:<param>=<value>,...] ...]')
+        return
+
+    specs = sys.argv[2:] or ['simple', 'swift']
+
+    print('{:>28} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'Controller', 'Losses', 'TX Mbit/s', 'Cwnd avg', 'Cwnd diff', 'QD p50 ms', 'QD p99 ms'))
+    for (spec, summary) in compare(sys.argv[1], specs):
+        print('{:>28} {:>8} {:>10.2f} {:>10.0f} {:>10.0f} {:>10.2f} {:>10.2f}'.format(
+            spec, summary['Losses'], summary['TxRate'] / 1000000, summary['CwndAvg'],
+            summary['CwndDiff'], summary['QueuingP50'], summary['QueuingP99']))
+
+if __name__ == '__main__':
+    main()
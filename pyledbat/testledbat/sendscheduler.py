@@ -0,0 +1,128 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Send scheduler shared by all flows (tests) of a role. Flows allowed to send
+are served in deficit round-robin order from a single callback per event
+loop iteration, instead of each flow rescheduling itself.
+"""
+import asyncio
+import collections
+
+class FlowState(object):
+    """Scheduling state of one flow"""
+
+    __slots__ = ('weight', 'deficit', 'active', 'hdl_wake')
+
+    def __init__(self, weight):
+        self.weight = weight        # Share of sending relative to other flows
+        self.deficit = 0            # Packets the flow can still send this round
+        self.active = False         # Is the flow in the active list
+        self.hdl_wake = None        # Timer to wake the sleeping flow
+
+class SendScheduler(object):
+    """Deficit round-robin scheduler. Each round an active flow gets a
+       quantum of burst * weight packets. A flow is asked to send packets
+       with flow.send_next(), which returns tuple (sent, wait_time). When a
+       flow can not send, it sleeps for wait_time or until wake() is called.
+    """
+
+    def __init__(self, burst=1):
+        self._burst = burst
+        self._flows = {}                        # flow -> FlowState
+        self._active = collections.deque()      # (flow, state) ready to send
+        self._hdl_run = None                    # Handle of the scheduled round
+
+        self.num_rounds = 0     # Callbacks made to send data
+
+    def add(self, flow, weight=1):
+        """Start scheduling the flow"""
+
+        if weight <= 0:
+            raise ValueError('Weight of the flow must be positive')
+
+        self._flows[flow] = FlowState(weight)
+        self.wake(flow)
+
+    def remove(self, flow):
+        """Stop scheduling the flow"""
+
+        state = self._flows.pop(flow, None)
+        if state is None:
+            return
+
+        # Removed from the active list lazily
+        state.active = False
+        if state.hdl_wake is not None:
+            state.hdl_wake.cancel()
+            state.hdl_wake = None
+
+    def wake(self, flow):
+        """Make the sleeping flow active (e.g. when ACK opens cwnd)"""
+
+        state = self._flows.get(flow)
+        if state is None or state.active:
+            return
+
+        if state.hdl_wake is not None:
+            state.hdl_wake.cancel()
+            state.hdl_wake = None
+
+        state.active = True
+        self._active.append((flow, state))
+
+        if self._hdl_run is None:
+            self._hdl_run = asyncio.get_event_loop().call_soon(self._run)
+
+    def _timer_wake(self, flow):
+        """Sleep time of the flow is over"""
+
+        state = self._flows.get(flow)
+        if state is not None:
+            state.hdl_wake = None
+            self.wake(flow)
+
+    def _run(self):
+        """Make one round over the active flows"""
+
+        self._hdl_run = None
+        self.num_rounds += 1
+
+        loop = asyncio.get_event_loop()
+        for _ in range(len(self._active)):
+            (flow, state) = self._active.popleft()
+            if self._flows.get(flow) is not state or not state.active:
+                # Removed flow
+                continue
+
+            sent = True
+            state.deficit += self._burst * state.weight
+            while state.deficit >= 1:
+                (sent, wait_time) = flow.send_next()
+                if not sent:
+                    break
+                state.deficit -= 1
+
+            if sent:
+                # Still can send, next round
+                self._active.append((flow, state))
+            else:
+                # Flow sleeps and does not keep the unused quantum
+                state.active = False
+                state.deficit = 0
+                state.hdl_wake = loop.call_later(wait_time, self._timer_wake, flow)
+
+        if self._active and self._hdl_run is None:
+            self._hdl_run = loop.call_soon(self._run)
@@ -19,31 +19,42 @@ All protocol intelligence is in the client. One server can be replying to multip
 clients concurrently.
 """
 import logging
-import struct
-import random
 import time
 
 from testledbat import ledbat_test
 from testledbat import baserole
+from testledbat import codec
 
 class ServerRole(baserole.BaseRole):
     """description of class"""
 
-    def start_server(self):
-        """Start acting as a server"""
-        pass
+    def __init__(self, udp_protocol):
+        super().__init__(udp_protocol)
 
-    def datagram_received(self, data, addr):
+        self._ack_every = None  # ACK coalescing settings (None - defaults)
+        self._ack_delay = None
+        self._num_tests = 0     # Tests started in total
+
+    def start_server(self, **kwargs):
+        """Start acting as a server. ACK coalescing can be set with
+           ack_every (packets) and ack_delay (seconds) arguments.
+        """
+
+        self._ack_every = kwargs.get('ack_every')
+        self._ack_delay = kwargs.get('ack_delay')
+
+    def datagram_received(self, data, addr, rx_time=None):
         """Process the received datagram"""
 
         # Take time msg received for later use
-        rx_time = time.time()
+        if rx_time is None:
+            rx_time = time.time()
 
         # Extract the header
-        (msg_type, rem_ch, loc_ch) = struct.unpack('>III', data[0:12])
+        (msg_type, rem_ch, loc_ch) = codec.decode_header(data)
 
         # Either init new test or get the running test
-        if msg_type == 1 and rem_ch == 0:
+        if msg_type == codec.MSG_INIT and rem_ch == 0:
             self._test_init_req(loc_ch, addr)
             return
         else:
@@ -54,18 +65,45 @@ class ServerRole(baserole.BaseRole):
                 logging.warning('Could not find ledbat test with our id: %s', rem_ch)
                 return
 
-            if msg_type == 1:
+            if msg_type == codec.MSG_INIT:
                 logging.warning('Server should not receive INIT-ACK')
-            elif msg_type == 2:
-                this_test.data_received(data[12:], rx_time)
-            elif msg_type == 3:
+            elif msg_type == codec.MSG_DATA:
+                this_test.data_received(data, rx_time)
+            elif msg_type == codec.MSG_ACK:
                 logging.warning('Server should not receive ACK message')
             else:
                 logging.warning('Discarded unknown message type (%s) from %s', msg_type, addr)
 
+    def get_stats(self):
+        """Get dict of server statistics"""
+
+        return {
+            'TestsActive': len(self._tests),
+            'TestsTotal': self._num_tests,
+            'RxPkt': self._udp_protocol.num_received,
+            'TxPkt': self._udp_protocol.num_datagrams,
+        }
+
+    def remove_test(self, test):
+        """Extend remove_test to report receive timestamp gap"""
+        super().remove_test(test)
+
+        rx_ts_gap = self.rx_ts_gap()
+        if rx_ts_gap is not None:
+            logging.info('Kernel to user RX gap avg/max: %.3f/%.3f ms',
+                         rx_ts_gap[0] * 1000, rx_ts_gap[1] * 1000)
+
     def _test_init_req(self, their_channel, addr):
         """Initialize new test as requested"""
 
+        # INIT from the peer of existing test. A new test of the peer comes
+        # from another channel, so this is a duplicate (INIT-ACK was lost)
+        # or a late retransmission - keep the running test.
+        existing_test = self._tests.get_by_peer(addr, their_channel)
+        if existing_test is not None:
+            existing_test.init_received()
+            return
+
         # This is attempt to start a new test
         test_args = {
             'is_client':False,
@@ -74,15 +112,17 @@ class ServerRole(baserole.BaseRole):
             'owner':self,
             'make_log':None,
             'log_name':None,
-            'ledbat_params':{},
+            'ledbat_config':None,
             'log_dir':None,
+            'ack_every':self._ack_every,
+            'ack_delay':self._ack_delay,
         }
         lebat_test = ledbat_test.LedbatTest(**test_args)
         lebat_test.remote_channel = their_channel
-        lebat_test.local_channel = random.randint(1, 65534)
 
-        # Add to a list of tests
-        self._tests[lebat_test.local_channel] = lebat_test
+        # Add to a list of tests. This gives the local channel
+        self._tests.add(lebat_test, addr, their_channel)
+        self._num_tests += 1
 
         # Send INIT-ACK
         lebat_test.send_init_ack()
@@ -0,0 +1,174 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Multi-process LEDBAT test server. Worker processes share the UDP port with
+SO_REUSEPORT and each runs its own ServerRole with its own table of tests.
+
+The kernel selects the socket by the hash of the 4-tuple, so all packets
+of a test (one client socket talking to the server port) reach the same
+worker for as long as the group of sockets does not change. To keep the
+group fixed, all sockets are bound by the parent before the workers are
+started, and the parent keeps its copies open until the server exits.
+
+Workers periodically send their statistics to the parent, which logs the
+totals.
+"""
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import signal
+import socket
+import time
+
+from testledbat import serverrole
+
+STATS_INTERVAL = 5.0   # How often workers report statistics (seconds)
+
+def bind_sockets(num_sockets, local_addr):
+    """Bind num_sockets UDP sockets to the same local_addr"""
+
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise OSError('SO_REUSEPORT is not supported on this platform')
+
+    sockets = []
+    try:
+        for _ in range(num_sockets):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sockets.append(sock)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(local_addr)
+            sock.setblocking(False)
+    except OSError:
+        for sock in sockets:
+            sock.close()
+        raise
+
+    return sockets
+
+def run_workers(num_workers, local_addr, protocol_factory, server_args):
+    """Run num_workers server processes until Ctrl-C"""
+
+    sockets = bind_sockets(num_workers, local_addr)
+
+    # Sockets are inherited by the forked workers
+    context = multiprocessing.get_context('fork')
+    workers = []
+    connections = []
+    for (worker_id, sock) in enumerate(sockets):
+        (parent_conn, child_conn) = context.Pipe(duplex=False)
+        worker = context.Process(target=_worker_main,
+                                 args=(worker_id, sock, protocol_factory,
+                                       server_args, child_conn),
+                                 name='ledbat-worker-{}'.format(worker_id),
+                                 daemon=True)
+        worker.start()
+        child_conn.close()
+        workers.append(worker)
+        connections.append(parent_conn)
+
+    logging.info('Started %s server workers on port %s', num_workers, local_addr[1])
+
+    # Latest stats from each worker
+    worker_stats = [None] * num_workers
+    prev_stats = None
+    prev_time = time.time()
+
+    try:
+        while any([worker.is_alive() for worker in workers]):
+            for conn in multiprocessing.connection.wait(connections, STATS_INTERVAL):
+                try:
+                    (worker_id, stats) = conn.recv()
+                except EOFError:
+                    connections.remove(conn)
+                    logging.warning('Server worker exited')
+                    continue
+                worker_stats[worker_id] = stats
+
+            # Log the totals once per interval
+            time_now = time.time()
+            if time_now - prev_time >= STATS_INTERVAL:
+                total_stats = aggregate_stats(worker_stats)
+                _log_stats(total_stats, prev_stats, time_now - prev_time)
+                prev_stats = total_stats
+                prev_time = time_now
+    except KeyboardInterrupt:
+        pass
+
+    # Workers get Ctrl-C too. Do not interrupt the cleanup
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for worker in workers:
+        worker.join(1.0)
+        if worker.is_alive():
+            worker.terminate()
+
+    for sock in sockets:
+        sock.close()
+
+def aggregate_stats(worker_stats):
+    """Sum statistics of the workers that reported them"""
+
+    total = {'Workers': 0}
+    for stats in worker_stats:
+        if stats is None:
+            continue
+        total['Workers'] += 1
+        for (key, value) in stats.items():
+            total[key] = total.get(key, 0) + value
+
+    return total
+
+def _log_stats(stats, prev_stats, time_delta):
+    """Log the statistics totals and packet rates"""
+
+    if not stats['Workers']:
+        return
+
+    if prev_stats is None or not prev_stats['Workers']:
+        prev_stats = {'RxPkt': 0, 'TxPkt': 0}
+
+    logging.info('Workers: %s; Tests active/total: %s/%s; RX: %.0f pkt/s; TX: %.0f pkt/s;',
+                 stats['Workers'], stats['TestsActive'], stats['TestsTotal'],
+                 (stats['RxPkt'] - prev_stats['RxPkt']) / time_delta,
+                 (stats['TxPkt'] - prev_stats['TxPkt']) / time_delta)
+
+def _worker_main(worker_id, sock, protocol_factory, server_args, conn):
+    """Entry point of the worker process"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    listen = loop.create_datagram_endpoint(protocol_factory, sock=sock)
+    (transport, protocol) = loop.run_until_complete(listen)
+
+    server = serverrole.ServerRole(protocol)
+    server.start_server(**server_args)
+
+    def report_stats():
+        conn.send((worker_id, server.get_stats()))
+        loop.call_later(STATS_INTERVAL, report_stats)
+    loop.call_soon(report_stats)
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    transport.close()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+    conn.close()
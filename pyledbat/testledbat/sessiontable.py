@@ -0,0 +1,125 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Channel allocation and table of the tests (sessions) run by a role.
+"""
+import collections
+
+MAX_CHANNEL = 0xFFFFFFFF    # Channel field in the header is 32 bit
+REUSE_DELAY = 4096          # Released channels wait for this many releases before reuse
+
+class ChannelAllocator(object):
+    """Collision free allocator of the local channels 1..MAX_CHANNEL (0 is
+       reserved for INIT). New channels are taken from a counter. Released
+       channels go to a FIFO free list and are reused only after
+       REUSE_DELAY other channels are released (or the counter runs out),
+       so late packets of an old session do not reach the new one.
+    """
+
+    __slots__ = ('_next', '_free', '_reuse_delay')
+
+    def __init__(self, reuse_delay=REUSE_DELAY):
+        self._next = 1
+        self._free = collections.deque()
+        self._reuse_delay = reuse_delay
+
+    def __len__(self):
+        """Get number of allocated channels"""
+        return self._next - 1 - len(self._free)
+
+    def allocate(self):
+        """Get a free channel. Raises RuntimeError if all are in use"""
+
+        if len(self._free) > self._reuse_delay or (self._free and self._next > MAX_CHANNEL):
+            return self._free.popleft()
+
+        if self._next > MAX_CHANNEL:
+            raise RuntimeError('All channels are in use')
+
+        channel = self._next
+        self._next += 1
+        return channel
+
+    def release(self, channel):
+        """Return the channel to the allocator"""
+        self._free.append(channel)
+
+class SessionTable(object):
+    """Tests of a role indexed by the local channel and by the remote peer,
+       i.e. ((ip, port), remote channel), with local channels given by
+       ChannelAllocator.
+    """
+
+    __slots__ = ('_channels', '_by_channel', '_by_peer', '_peer_of')
+
+    def __init__(self, reuse_delay=REUSE_DELAY):
+        self._channels = ChannelAllocator(reuse_delay)
+        self._by_channel = {}       # Local channel -> test
+        self._by_peer = {}          # (addr, remote channel) -> test
+        self._peer_of = {}          # Local channel -> (addr, remote channel)
+
+    def __len__(self):
+        return len(self._by_channel)
+
+    def __contains__(self, local_channel):
+        return local_channel in self._by_channel
+
+    def values(self):
+        """Get list of all tests"""
+        return list(self._by_channel.values())
+
+    def add(self, test, addr=None, remote_channel=None):
+        """Allocate local channel for the test and add it to the table.
+           If remote_channel is given, the test can be found by the peer.
+           Returns the local channel.
+        """
+
+        local_channel = self._channels.allocate()
+        test.local_channel = local_channel
+        self._by_channel[local_channel] = test
+
+        if remote_channel is not None:
+            self.set_peer(test, addr, remote_channel)
+
+        return local_channel
+
+    def set_peer(self, test, addr, remote_channel):
+        """Make the test found by (addr, remote_channel)"""
+
+        peer = (tuple(addr), remote_channel)
+        self._by_peer[peer] = test
+        self._peer_of[test.local_channel] = peer
+
+    def get(self, local_channel):
+        """Get test by the local channel (None if not found)"""
+        return self._by_channel.get(local_channel)
+
+    def get_by_peer(self, addr, remote_channel):
+        """Get test by the remote peer (None if not found)"""
+        return self._by_peer.get((tuple(addr), remote_channel))
+
+    def remove(self, local_channel):
+        """Remove test with the local channel and release the channel"""
+
+        test = self._by_channel.pop(local_channel, None)
+        if test is None:
+            return
+
+        peer = self._peer_of.pop(local_channel, None)
+        if peer is not None and self._by_peer.get(peer) is test:
+            del self._by_peer[peer]
+
+        self._channels.release(local_channel)
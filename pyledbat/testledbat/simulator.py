@@ -0,0 +1,488 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Discrete-event simulator of LEDBAT flows sharing a bottleneck link.
+
+Time is virtual: events are run in order of their time without waiting, and
+the LEDBAT instances are given the simulator clock. Flows follow the protocol
+of LedbatTest (SACK blocks, ACK coalescing, out-of-order loss detection) and
+log the same records (metricslog.LOG_FIELDS), so results can be compared with
+the test application. The protocol logic is shared with LedbatTest (see
+ledbat_test.data_rx, sack_blocks and ack_rx). Runs with the same seed give
+the same results.
+
+Every packet is simulated: about four events (send, arrival, ACK, ACK
+arrival) and 40-50 us of CPU per DATA packet. The speed-up over real time is
+therefore bound by the packet rate: about 20-40x for a 10 Mbit/s link, a few
+hundred times for 1 Mbit/s, and thousands of times only for idle or low-rate
+periods, not for a loaded link.
+"""
+import heapq
+import itertools
+import random
+import logging
+import array
+import math
+
+from ledbat import baseledbat
+from ledbat import simpleledbat
+from ledbat import swiftledbat
+from .inflight_track import InflightTrack
+from .interval_set import IntervalSet
+from . import ledbat_test
+from . import metricslog
+
+PKT_SIZE = ledbat_test.SZ_DATA + 24     # DATA message size on the wire
+HOST_RATE = 1000000000  # Rate of sender's network interface (bits/s)
+MIN_WAIT = 0.001        # Min time before retrying gated send
+
+CONTROLLERS = {
+    'simple': simpleledbat.SimpleLedbat,
+    'swift': swiftledbat.SwiftLedbat,
+}
+
+class Event(object):
+    """Scheduled callback. Can be cancelled before it runs"""
+
+    __slots__ = ('callback', 'args', 'cancelled')
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Do not run the callback"""
+        self.cancelled = True
+
+class Simulator(object):
+    """Event queue with the virtual clock"""
+
+    def __init__(self, seed=0):
+        self._now = 0.0
+        self._queue = []                # Heap of (time, order, event)
+        self._order = itertools.count() # Events at the same time run FIFO
+        self.random = random.Random(seed)
+        self.num_events = 0
+
+    def now(self):
+        """Get the virtual time (seconds)"""
+        return self._now
+
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) at the virtual time when"""
+
+        event = Event(callback, args)
+        heapq.heappush(self._queue, (when, next(self._order), event))
+        return event
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) after delay seconds of virtual time"""
+        return self.call_at(self._now + delay, callback, *args)
+
+    def run(self, until):
+        """Run events up to the virtual time until"""
+
+        queue = self._queue
+        while queue and queue[0][0] <= until:
+            (when, _, event) = heapq.heappop(queue)
+            if event.cancelled:
+                continue
+
+            self._now = when
+            self.num_events += 1
+            event.callback(*event.args)
+
+        self._now = until
+
+class BottleneckLink(object):
+    """FIFO drop-tail link. Packets wait in the buffer while the link is busy
+       sending the packets ahead, then take the propagation delay to arrive.
+       Accepted packets can also be lost at random.
+    """
+
+    def __init__(self, sim, rate, buffer_size, delay, loss=0):
+        """rate - bits/s, buffer_size - bytes, delay - seconds,
+           loss - probability of losing a packet
+        """
+
+        self._sim = sim
+        self._byte_rate = rate / 8
+        self._buffer_size = buffer_size
+        self._delay = delay
+        self._loss = loss
+        self._busy_until = 0.0          # Time the last accepted packet leaves the buffer
+
+        self.num_sent = 0               # Packets accepted
+        self.num_dropped = 0            # Packets dropped at full buffer
+        self.num_lost = 0               # Packets lost at random
+        self.queuing_sum = 0            # Sum and max of queuing delay of
+        self.queuing_max = 0            # accepted packets (seconds)
+        self.queuing_delays = array.array('d')  # Queuing delay of each accepted packet
+
+    @property
+    def delay(self):
+        """Get propagation delay"""
+        return self._delay
+
+    def queuing_delay(self):
+        """Get the time a packet sent now would wait in the buffer"""
+        return max(0.0, self._busy_until - self._sim.now())
+
+    def send(self, size, callback, *args):
+        """Send a packet of size bytes. On arrival callback(*args) is run.
+           Returns False if the packet was dropped or lost.
+        """
+
+        backlog = self.queuing_delay()
+        if backlog * self._byte_rate + size > self._buffer_size:
+            self.num_dropped += 1
+            return False
+
+        self._busy_until = self._sim.now() + backlog + size / self._byte_rate
+        self.num_sent += 1
+        self.queuing_sum += backlog
+        self.queuing_max = max(self.queuing_max, backlog)
+        self.queuing_delays.append(backlog)
+
+        if self._loss and self._sim.random.random() < self._loss:
+            self.num_lost += 1
+            return False
+
+        self._sim.call_at(self._busy_until + self._delay, callback, *args)
+        return True
+
+    def get_stats(self):
+        """Get dict with the link statistics"""
+
+        return {
+            'Sent': self.num_sent,
+            'Dropped': self.num_dropped,
+            'Lost': self.num_lost,
+            'QueuingAvg': self.queuing_sum / self.num_sent if self.num_sent else 0,
+            'QueuingMax': self.queuing_max,
+            'QueuingP50': percentile(self.queuing_delays, 50),
+            'QueuingP99': percentile(self.queuing_delays, 99),
+        }
+
+class CrossTraffic(object):
+    """Packets of other traffic sent through the link with exponentially
+       distributed gaps (Poisson) at the given average rate. If on_time and
+       off_time are given the source is periodically silent.
+    """
+
+    def __init__(self, sim, link, rate, **kwargs):
+        self._sim = sim
+        self._link = link
+        self._pkt_size = kwargs.get('pkt_size', 1500)
+        self._on_time = kwargs.get('on_time')
+        self._off_time = kwargs.get('off_time')
+        self._mean_gap = self._pkt_size * 8 / rate
+
+        self.num_sent = 0
+
+        sim.call_at(kwargs.get('start', 0), self._send)
+
+    def _send(self):
+        """Send the packet and schedule the next one"""
+
+        if self._link.send(self._pkt_size, self._arrived):
+            self.num_sent += 1
+
+        t_next = self._sim.now() + self._sim.random.expovariate(1 / self._mean_gap)
+
+        # Skip the silent part of the period
+        if self._on_time and self._off_time:
+            period = self._on_time + self._off_time
+            if t_next % period >= self._on_time:
+                t_next += period - t_next % period
+
+        self._sim.call_at(t_next, self._send)
+
+    def _arrived(self):
+        pass
+
+class SimFlow(object):
+    """LEDBAT flow over the link. Plays both the sending and the receiving
+       test. ACKs return over an uncongested path. LostPkt counts DATA
+       dropped or lost by the link.
+    """
+
+    def __init__(self, sim, link, **kwargs):
+
+        self._sim = sim
+        self._link = link
+        self._stream_id = kwargs.get('stream_id')
+        self._ack_every = kwargs.get('ack_every') or ledbat_test.ACK_EVERY
+        self._ack_delay = kwargs.get('ack_delay')
+        if self._ack_delay is None:
+            self._ack_delay = ledbat_test.ACK_DELAY
+        self._ack_path_delay = kwargs.get('ack_path_delay', link.delay)
+        self._tx_time = PKT_SIZE * 8 / kwargs.get('host_rate', HOST_RATE)
+        self._log_path = kwargs.get('log_path')
+
+        controller = CONTROLLERS[kwargs.get('ledbat', 'simple')]
+        self._ledbat = controller(kwargs.get('ledbat_config'), clock=sim.now)
+
+        self._next_seq = 1
+        self._inflight = InflightTrack()
+        self._cnt_ooo = 0
+        self._hdl_send = None
+        self._gated = False             # Waiting for the window (not pacing)
+        self._last_ack_time = None
+
+        self._rx_seqs = IntervalSet()
+        self._ack_delays = array.array('q')
+        self._ack_seq = None
+        self._hdl_ack = None
+        self._delay_sum = 0             # Sum of one-way delays received (us)
+        self._num_delays = 0
+
+        self._time_start = None
+        self._time_stop = None
+        self._hdl_log = None
+        self._metrics_log = None
+
+        self.stats = ledbat_test.new_stats()
+
+        sim.call_at(kwargs.get('start', 0), self._start)
+        if kwargs.get('duration'):
+            sim.call_at(kwargs.get('start', 0) + kwargs.get('duration'), self.stop)
+
+    def _start(self):
+        """Start sending and logging"""
+
+        self._time_start = self._sim.now()
+
+        if self._log_path:
+            self._metrics_log = metricslog.MetricsLog(self._log_path, clock=self._sim.now)
+            self._log_data()
+
+        self._send()
+
+    def _log_data(self):
+        """Make LOG entry"""
+
+        self._metrics_log.append(ledbat_test.log_record(self.stats, self._ledbat, self._sim.now()))
+        self._hdl_log = self._sim.call_later(ledbat_test.LOG_INTERVAL, self._log_data)
+
+    def stop(self):
+        """Stop sending and close the log"""
+
+        if self._time_stop is not None:
+            return
+
+        self._time_stop = self._sim.now()
+
+        if self._hdl_send is not None:
+            self._hdl_send.cancel()
+            self._hdl_send = None
+
+        if self._metrics_log is not None:
+            self._hdl_log.cancel()
+            self._log_data()
+            self._hdl_log.cancel()
+            self._metrics_log.close()
+
+    def get_summary(self):
+        """Get dict with the results (as LedbatTest.get_summary)"""
+
+        t_stop = self._time_stop if self._time_stop is not None else self._sim.now()
+        duration = t_stop - self._time_start if self._time_start is not None else 0
+        all_sent = self.stats['Sent'] + self.stats['Resent']
+
+        return {
+            'StreamId': self._stream_id,
+            'Duration': duration,
+            'Sent': self.stats['Sent'],
+            'Acked': self.stats['Ack'],
+            'Resent': self.stats['Resent'],
+            'OooPkt': self.stats['OooPkt'],
+            'DupPkt': self.stats['DupPkt'],
+            'LostPkt': self.stats['LostPkt'],
+            'TxRate': all_sent / duration if duration else 0,
+            'Goodput': self.stats['Ack'] * PKT_SIZE * 8 / duration if duration else 0,
+            'DelayAvg': self._delay_sum / self._num_delays / 1000 if self._num_delays else 0,
+            'LogFile': self._log_path,
+        }
+
+    def _send(self):
+        """Send next data segment if LEDBAT allows, then try again after
+           the interface is free or when the window might be open
+        """
+
+        self._hdl_send = None
+        self._gated = False
+
+        if self._time_stop is not None:
+            return
+
+        ledbat = self._ledbat
+        if isinstance(ledbat, simpleledbat.SimpleLedbat):
+            (can_send, reason, wait_time) = ledbat.try_sending_timed(PKT_SIZE)
+            if not can_send:
+                if reason == simpleledbat.FailReason.CTO:
+                    self.stats['GateWaitCTO'] += 1
+                else:
+                    self.stats['GateWaitCWND'] += 1
+
+                    # Only an ACK (which wakes the flow) or the congestion
+                    # timeout can open the window, no need to retry earlier
+                    if self._last_ack_time is not None:
+                        t_cto = self._last_ack_time + ledbat.cto - self._sim.now()
+                        if t_cto > wait_time:
+                            wait_time = t_cto
+        else:
+            (can_send, wait_time) = ledbat.try_sending(PKT_SIZE)
+            if can_send:
+                ledbat.last_send_time = ledbat.now()
+            else:
+                self.stats['GateWaitCWND'] += 1
+
+        if not can_send:
+            self._gated = True
+            self._hdl_send = self._sim.call_later(max(wait_time, MIN_WAIT), self._send)
+            return
+
+        self.stats['GateSent'] += 1
+
+        seq_num = self._next_seq
+        self._next_seq += 1
+        self._send_data(seq_num)
+        self._inflight.add(seq_num, self._sim.now(), None)
+        self.stats['Sent'] += 1
+
+        self._hdl_send = self._sim.call_later(self._tx_time, self._send)
+
+    def _send_data(self, seq_num):
+        """Put the DATA on the link"""
+
+        if not self._link.send(PKT_SIZE, self._data_arrived, seq_num, self._sim.now()):
+            self.stats['LostPkt'] += 1
+
+    def _wake(self):
+        """ACK might have opened the window"""
+
+        if self._gated:
+            self._hdl_send.cancel()
+            self._send()
+
+    def _data_arrived(self, seq, time_sent):
+        """Receiver side of LedbatTest.data_received"""
+
+        one_way_delay = int((self._sim.now() - time_sent) * 1000000)
+        self._delay_sum += one_way_delay
+        self._num_delays += 1
+
+        self._ack_delays.append(one_way_delay)
+        self._ack_seq = seq
+
+        if ledbat_test.data_rx(self._rx_seqs, seq, len(self._ack_delays),
+                               self._ack_every, self._ack_delay):
+            self._flush_ack()
+        elif self._hdl_ack is None:
+            self._hdl_ack = self._sim.call_later(self._ack_delay, self._flush_ack)
+
+    def _flush_ack(self):
+        """Send ACK for DATA received since the last ACK"""
+
+        if self._hdl_ack is not None:
+            self._hdl_ack.cancel()
+            self._hdl_ack = None
+
+        if not self._ack_delays:
+            return
+
+        blocks = ledbat_test.sack_blocks(self._rx_seqs, self._ack_seq)
+        self._sim.call_later(self._ack_path_delay, self._ack_arrived, blocks, self._ack_delays)
+        self._ack_delays = array.array('q')
+
+    def _ack_arrived(self, blocks, delays):
+        """Sender side of LedbatTest.ack_received"""
+
+        rx_time = self._sim.now()
+
+        (num_acked, rtts, resendable, self._cnt_ooo) = ledbat_test.ack_rx(
+            self._inflight, blocks, rx_time, self._cnt_ooo, self.stats)
+        if not num_acked:
+            return
+
+        self._last_ack_time = rx_time
+
+        if resendable is not None:
+            for seq_num in resendable:
+                self._send_data(seq_num)
+                self._inflight.set_resent(seq_num)
+                self.stats['Resent'] += 1
+            self._ledbat.data_loss()
+
+        self._ledbat.update_measurements_raw(num_acked * PKT_SIZE, delays, rtts)
+        self._wake()
+
+def percentile(values, percent):
+    """Get the percentile of the values (nearest rank)"""
+
+    if not values:
+        return 0
+
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * percent / 100) - 1)]
+
+def run_simulation(**kwargs):
+    """Simulate flows over a bottleneck. Returns tuple (list of flow
+       summaries, link statistics, number of events run).
+    """
+
+    sim = Simulator(kwargs.get('seed', 0))
+    link = BottleneckLink(sim, kwargs.get('rate', 10000000), kwargs.get('buffer_size', 150000),
+                          kwargs.get('delay', 0.025), kwargs.get('loss', 0))
+
+    if kwargs.get('cross_rate'):
+        CrossTraffic(sim, link, kwargs.get('cross_rate'),
+                     on_time=kwargs.get('cross_on'), off_time=kwargs.get('cross_off'))
+
+    ledbat_config = (kwargs.get('ledbat_config') or
+                     baseledbat.LedbatConfig.from_params(kwargs.get('ledbat_params')))
+    sim_time = kwargs.get('sim_time', 60)
+    log_name = kwargs.get('log_name')
+
+    flows = []
+    for stream_id in range(kwargs.get('flows', 1)):
+        log_path = None
+        if log_name:
+            log_path = '{}-stream-{}.npy'.format(log_name, stream_id)
+
+        flows.append(SimFlow(sim, link,
+                             stream_id=stream_id,
+                             ledbat=kwargs.get('ledbat', 'simple'),
+                             ledbat_config=ledbat_config,
+                             ack_every=kwargs.get('ack_every'),
+                             ack_delay=kwargs.get('ack_delay'),
+                             start=stream_id * kwargs.get('stagger', 0),
+                             log_path=log_path))
+
+    sim.run(sim_time)
+
+    for flow in flows:
+        flow.stop()
+
+    summaries = [flow.get_summary() for flow in flows]
+    for summary in summaries:
+        logging.info('Stream %s: Goodput: %.2f Mbit/s DelayAvg: %.2f ms Sent/Resent/Lost: %s/%s/%s',
+                     summary['StreamId'], summary['Goodput'] / 1000000, summary['DelayAvg'],
+                     summary['Sent'], summary['Resent'], summary['LostPkt'])
+
+    return (summaries, link.get_stats(), sim.num_events)
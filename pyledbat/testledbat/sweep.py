@@ -0,0 +1,197 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Sweep over a grid of LEDBAT parameters and link scenarios. Each point of
+the grid is run in the simulator (or replayed from ACK recordings) in a
+pool of processes, and the results are written to a CSV summary table.
+
+Usage: python -m testledbat.sweep --grid target=25,50,100 gain=1,2
+           [--scenario dsl lossy] [--replay <acks.npy> ...] [--out sweep.csv]
+"""
+import argparse
+import ast
+import csv
+import itertools
+import logging
+import multiprocessing
+
+from ledbat import baseledbat
+from . import simulator
+from . import replay
+
+# Link scenarios as simulator.run_simulation arguments
+SCENARIOS = {
+    'lan': {'rate': 100000000, 'buffer_size': 100000, 'delay': 0.001},
+    'dsl': {'rate': 10000000, 'buffer_size': 150000, 'delay': 0.025},
+    'lossy': {'rate': 10000000, 'buffer_size': 150000, 'delay': 0.025, 'loss': 0.01},
+    'cross': {'rate': 10000000, 'buffer_size': 150000, 'delay': 0.025,
+              'cross_rate': 5000000, 'cross_on': 5, 'cross_off': 5},
+    'longfat': {'rate': 50000000, 'buffer_size': 1000000, 'delay': 0.1},
+}
+
+# Simulated points (Source 'sim') fill the link measurements: Throughput
+# (goodput, bits/s), QueuingP50/P99 (link queuing delay, s), Loss (packets
+# lost per packet sent) and Fairness. Replayed points (Source 'replay') can
+# only give what the controller would do: TxRate (bits/s it would send),
+# EstQueuingP50/P99 (its own queuing delay estimate, s) and LossEvents (loss
+# events per ACK). Fields that do not apply are left empty.
+SUMMARY_FIELDS = ['Scenario', 'Source', 'Params',
+                  'Throughput', 'QueuingP50', 'QueuingP99', 'Loss', 'Fairness',
+                  'TxRate', 'EstQueuingP50', 'EstQueuingP99', 'LossEvents']
+
+def make_grid(grid_specs):
+    """Get list of parameter dicts from ['param=value,value', ...]. Param
+       'controller' selects the controller, others are LedbatConfig fields.
+    """
+
+    names = []
+    values = []
+    for spec in grid_specs:
+        (name, _, spec_values) = spec.partition('=')
+        names.append(name.strip())
+        values.append([ast.literal_eval(value.strip()) if name.strip() != 'controller' else value.strip()
+                       for value in spec_values.split(',')])
+
+    return [dict(zip(names, point)) for point in itertools.product(*values)]
+
+def jain_index(values):
+    """Jain's fairness index of the values (1 - all equal)"""
+
+    total_sq = sum([value * value for value in values])
+    if not total_sq:
+        return 1.0
+    return sum(values) ** 2 / (len(values) * total_sq)
+
+def run_point(point):
+    """Run one point of the sweep. point is tuple (scenario name, run
+       arguments, params). Returns dict with SUMMARY_FIELDS.
+    """
+
+    (scenario, run_args, params) = point
+
+    params = dict(params)
+    controller = params.pop('controller', 'simple')
+    config = baseledbat.LedbatConfig(**params)
+
+    if 'replay' in run_args:
+        factory = lambda clock: simulator.CONTROLLERS[controller](config, clock=clock)
+        (summary, _) = replay.replay(replay.read_acks(run_args['replay']), factory)
+        return {
+            'Scenario': scenario,
+            'Source': 'replay',
+            'TxRate': summary['TxRate'],
+            'EstQueuingP50': summary['QueuingP50'] / 1000,
+            'EstQueuingP99': summary['QueuingP99'] / 1000,
+            'LossEvents': summary['Losses'] / summary['Acks'] if summary['Acks'] else 0,
+        }
+
+    (summaries, link_stats, _) = simulator.run_simulation(
+        ledbat=controller, ledbat_config=config, **run_args)
+
+    num_sent = sum([summary['Sent'] + summary['Resent'] for summary in summaries])
+    num_lost = sum([summary['LostPkt'] for summary in summaries])
+    goodputs = [summary['Goodput'] for summary in summaries]
+
+    return {
+        'Scenario': scenario,
+        'Source': 'sim',
+        'Throughput': sum(goodputs),
+        'QueuingP50': link_stats['QueuingP50'],
+        'QueuingP99': link_stats['QueuingP99'],
+        'Loss': num_lost / num_sent if num_sent else 0,
+        'Fairness': jain_index(goodputs),
+    }
+
+def _init_worker():
+    """Keep the workers quiet"""
+    logging.getLogger().setLevel(logging.WARNING)
+
+def run_sweep(grid, scenarios, processes=None):
+    """Run all points of grid x scenarios (dict name -> run arguments) in a
+       process pool. Returns list of result dicts in the grid order.
+    """
+
+    points = [(name, run_args, params)
+              for (name, run_args) in scenarios.items() for params in grid]
+
+    with multiprocessing.Pool(processes, _init_worker) as pool:
+        results = pool.map(run_point, points, chunksize=1)
+
+    for (result, (_, _, params)) in zip(results, points):
+        result['Params'] = ' '.join(['{}={}'.format(name, value) for (name, value) in params.items()])
+
+    return results
+
+def save_results(results, filepath):
+    """Save the results to CSV file"""
+
+    with open(filepath, 'w', newline='') as fp_csv:
+        csvwriter = csv.DictWriter(fp_csv, SUMMARY_FIELDS)
+        csvwriter.writeheader()
+        csvwriter.writerows(results)
+
+def main():
+    """Run the sweep given on the command line"""
+
+    parser = argparse.ArgumentParser(description='LEDBAT parameter sweep')
+    parser.add_argument('--grid', help='Values of the parameters, e.g. target=25,50 gain=1,2 controller=simple,swift', nargs='+', required=True)
+    parser.add_argument('--scenario', help='Simulated links {}'.format('|'.join(sorted(SCENARIOS))), nargs='*', default=['dsl'])
+    parser.add_argument('--replay', help='Replay ACK recordings instead of / in addition to simulation', nargs='*', default=[])
+    parser.add_argument('--time', help='Virtual time to simulate (s)', type=float, default=60)
+    parser.add_argument('--parallel', help='Number of LEDBAT flows', type=int, default=2)
+    parser.add_argument('--seed', help='Random seed', type=int, default=0)
+    parser.add_argument('--processes', help='Number of processes (default - number of CPUs)', type=int)
+    parser.add_argument('--out', help='CSV file of the summary', default='sweep.csv')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(message)s')
+
+    scenarios = {}
+    for name in args.scenario:
+        run_args = dict(SCENARIOS[name])
+        run_args.update(sim_time=args.time, flows=args.parallel, seed=args.seed)
+        scenarios[name] = run_args
+    for filepath in args.replay:
+        scenarios[filepath] = {'replay': filepath}
+
+    grid = make_grid(args.grid)
+    logging.info('Running %d points', len(grid) * len(scenarios))
+
+    results = run_sweep(grid, scenarios, args.processes)
+    save_results(results, args.out)
+
+    simulated = [result for result in results if result['Source'] == 'sim']
+    if simulated:
+        print('{:>10} {:>32} {:>10} {:>10} {:>10} {:>8} {:>8}'.format(
+            'Scenario', 'Params', 'Mbit/s', 'QD p50 ms', 'QD p99 ms', 'Loss %', 'Fair'))
+        for result in simulated:
+            print('{:>10} {:>32} {:>10.2f} {:>10.2f} {:>10.2f} {:>8.2f} {:>8.3f}'.format(
+                result['Scenario'][-10:], result['Params'], result['Throughput'] / 1000000,
+                result['QueuingP50'] * 1000, result['QueuingP99'] * 1000,
+                result['Loss'] * 100, result['Fairness']))
+
+    replayed = [result for result in results if result['Source'] == 'replay']
+    if replayed:
+        print('{:>10} {:>32} {:>10} {:>10} {:>10} {:>8}'.format(
+            'Replay', 'Params', 'TX Mbit/s', 'Est p50 ms', 'Est p99 ms', 'Loss/ACK'))
+        for result in replayed:
+            print('{:>10} {:>32} {:>10.2f} {:>10.2f} {:>10.2f} {:>8.4f}'.format(
+                result['Scenario'][-10:], result['Params'], result['TxRate'] / 1000000,
+                result['EstQueuingP50'] * 1000, result['EstQueuingP99'] * 1000,
+                result['LossEvents']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Copyright 2017, J. Poderys, Technical University of Denmark
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Hierarchical timer wheel for the per-test timers (INIT/INIT-ACK timeouts,
+idle checks, logging). Arming and cancelling a timer is O(1) and the event
+loop sees a single periodic callback, instead of one heap entry per timer.
+Timers fire on the first tick at or after their deadline, so resolution
+is one tick.
+"""
+import asyncio
+
+TICK = 0.01         # Wheel resolution (seconds)
+SLOT_BITS = 8       # 256 slots per level
+LEVELS = 4          # Covers 2**32 ticks (over a year at 10 ms)
+
+class Timer(object):
+    """Handle of the scheduled timer"""
+
+    __slots__ = ('tick', 'callback', 'args', 'slot', 'wheel')
+
+    def __init__(self, tick, callback, args, wheel):
+        self.tick = tick            # Tick number the timer expires at
+        self.callback = callback
+        self.args = args
+        self.slot = None            # Set of timers holding this one
+        self.wheel = wheel
+
+    def cancel(self):
+        """Cancel the timer (no-op if fired or cancelled)"""
+
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+            self.wheel.num_timers -= 1
+
+class TimerWheel(object):
+    """Timers in LEVELS wheels of 2**SLOT_BITS slots each. Level N slot
+       holds timers expiring within a span of 2**(N*SLOT_BITS) ticks. When
+       the lower level wraps around, the timers of the next upper slot are
+       moved (cascaded) down.
+    """
+
+    def __init__(self, tick=TICK, loop=None):
+        self._tick = tick
+        self._loop = loop or asyncio.get_event_loop()
+        self._mask = (1 << SLOT_BITS) - 1
+        self._wheels = [[set() for _ in range(1 << SLOT_BITS)] for _ in range(LEVELS)]
+        self._max_ticks = (1 << (SLOT_BITS * LEVELS)) - 1
+        self._now = self._current_tick()   # Last processed tick
+        self._hdl_tick = None              # Event loop callback (None - wheel stopped)
+
+        self.num_timers = 0
+
+    def call_later(self, delay, callback, *args):
+        """Schedule callback(*args) after delay seconds. Returns Timer"""
+
+        if self._hdl_tick is None:
+            # Wheel was stopped, catch up with the time
+            self._now = self._current_tick()
+
+        # First tick at or after the deadline
+        tick = -int(-(self._loop.time() + delay) // self._tick)
+        timer = Timer(min(tick, self._now + self._max_ticks), callback, args, self)
+        self._insert(timer)
+        self.num_timers += 1
+
+        if self._hdl_tick is None:
+            self._hdl_tick = self._loop.call_later(self._tick, self._run)
+
+        return timer
+
+    def _current_tick(self):
+        """Get the number of the current tick"""
+        return int(self._loop.time() / self._tick)
+
+    def _insert(self, timer):
+        """Put the timer into the slot by the time left"""
+
+        ticks_left = timer.tick - self._now
+        if ticks_left <= 0:
+            # Due - fire on the next tick
+            timer.tick = self._now + 1
+            ticks_left = 1
+
+        level = 0
+        while level < LEVELS - 1 and ticks_left >> (SLOT_BITS * (level + 1)):
+            level += 1
+
+        slot = self._wheels[level][(timer.tick >> (SLOT_BITS * level)) & self._mask]
+        slot.add(timer)
+        timer.slot = slot
+
+    def _run(self):
+        """Process all ticks up to now"""
+
+        current = self._current_tick()
+
+        while self._now < current and self.num_timers:
+            self._now += 1
+            now = self._now
+
+            # Cascade upper levels where the lower level wrapped around
+            level = 1
+            while level < LEVELS and not now & ((1 << (SLOT_BITS * level)) - 1):
+                slot = self._wheels[level][(now >> (SLOT_BITS * level)) & self._mask]
+                if slot:
+                    self._wheels[level][(now >> (SLOT_BITS * level)) & self._mask] = set()
+                    for timer in slot:
+                        self._insert(timer)
+                level += 1
+
+            # Fire the expired timers
+            slot = self._wheels[0][now & self._mask]
+            if slot:
+                self._wheels[0][now & self._mask] = set()
+                for timer in list(slot):
+                    if timer.slot is not slot:
+                        # Cancelled by the callback of another timer
+                        continue
+                    timer.slot = None
+                    self.num_timers -= 1
+                    try:
+                        timer.callback(*timer.args)
+                    except Exception as exc:
+                        # As asyncio Handle: report and keep the other timers running
+                        self._loop.call_exception_handler({
+                            'message': 'Exception in timer callback {!r}'.format(timer.callback),
+                            'exception': exc,
+                        })
+
+        self._now = current
+        if self.num_timers:
+            self._hdl_tick = self._loop.call_later(self._tick, self._run)
+        else:
+            self._hdl_tick = None
@@ -15,9 +15,40 @@ limitations under the License.
 """
 """
 Asyncio implementation of UDP server.
+
+Datagrams given to send_data during one event loop iteration are copied to
+preallocated send buffers, queued and flushed together at the start of the
+next one. The buffers are reused once the queue is flushed. On Linux runs of datagrams to
+the same address are sent with a single sendmsg() using UDP generic
+segmentation offload (UDP_SEGMENT), otherwise each datagram is sent on its own.
+
+On POSIX systems datagrams are received in batches: on socket readiness the
+socket is read in a loop into preallocated buffers, and the whole batch of
+(data, addr, rx_time) is given to the receiver at once. Optionally rx_time is
+the kernel receive timestamp (SO_TIMESTAMPNS) instead of the time the
+datagram was read, so event loop lag is not seen as network delay.
 """
 import asyncio
 import logging
+import socket
+import struct
+import time
+import sys
+import os
+
+# Not exported by the socket module. Value from linux/udp.h
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+
+GSO_MAX_SEGMENTS = 64       # Kernel limit of segments in one send
+GSO_MAX_SIZE = 65000        # Max payload of one GSO send (below 64 KiB UDP limit)
+
+RX_BATCH = 64               # Max datagrams read per socket readiness
+RX_BUF_SIZE = 2048          # Size of receive buffer (larger datagrams are truncated)
+TX_BUF_SIZE = 2048          # Size of send buffer (larger datagrams are copied to bytes)
+
+# Not exported by the socket module. Value from asm-generic/socket.h
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+TIMESPEC = struct.Struct('@ll')
 
 class UdpServer(asyncio.DatagramProtocol):
     """Extension of asyncio DatagramProtocol"""
@@ -25,9 +56,132 @@ class UdpServer(asyncio.DatagramProtocol):
     def __init__(self, **kwargs):
         self._transport = None
         self._receiver = None
+        self._sock = None               # Dup of the transport socket for sendmsg/recv_into
+        self._gso = kwargs.get('gso', True)
+        self._rx_batch = kwargs.get('rx_batch', RX_BATCH)
+        self._rx_views = None           # Views of the preallocated receive buffers
+        self._kernel_ts = kwargs.get('kernel_ts', False)
+
+        self.num_rx_ts = 0              # Datagrams with kernel timestamp
+        self.rx_ts_gap_sum = 0          # Sum and max of the time from kernel timestamp
+        self.rx_ts_gap_max = 0          # until reading the datagram (seconds)
+        self._tx_queue = []             # (data, addr) waiting for the flush
+        self._tx_free = []              # Send buffers ready for reuse
+        self._tx_used = []              # Send buffers holding the queued data
+        self._hdl_flush = None          # Handle of the scheduled flush
+
+        self.num_received = 0           # Datagrams received
+        self.num_datagrams = 0          # Datagrams sent
+        self.num_syscalls = 0           # Send system calls made
+
+    @property
+    def gso_enabled(self):
+        """Check if datagrams are sent with UDP GSO"""
+        return self._gso
+
+    @property
+    def batch_rx_enabled(self):
+        """Check if datagrams are received in batches"""
+        return self._rx_views is not None
+
+    @property
+    def kernel_ts_enabled(self):
+        """Check if kernel receive timestamps are used"""
+        return self._kernel_ts
 
     def send_data(self, data, addr):
-        self._transport.sendto(data, addr)
+        """Queue the data to be sent in the next flush. The data is copied,
+           so the caller can reuse the buffer.
+        """
+
+        size = len(data)
+        if size <= TX_BUF_SIZE:
+            free = self._tx_free
+            buf = free.pop() if free else memoryview(bytearray(TX_BUF_SIZE))
+            buf[:size] = data
+            self._tx_used.append(buf)
+            data = buf[:size]
+        else:
+            data = bytes(data)
+
+        self._tx_queue.append((data, addr))
+        if self._hdl_flush is None:
+            self._hdl_flush = asyncio.get_event_loop().call_soon(self._flush)
+
+    def _flush(self):
+        """Send all queued datagrams"""
+
+        self._hdl_flush = None
+        queue = self._tx_queue
+        self._tx_queue = []
+
+        self.num_datagrams += len(queue)
+
+        if self._transport is not None and not self._transport.is_closing():
+            self._send_queue(queue)
+
+        # Transport copies what it could not send, so the buffers are free
+        self._tx_free.extend(self._tx_used)
+        self._tx_used = []
+
+    def _send_queue(self, queue):
+        """Send the datagrams of the queue"""
+
+        num_queued = len(queue)
+        idx = 0
+        while idx < num_queued:
+            (data, addr) = queue[idx]
+            end = idx + 1
+
+            # Group following datagrams to the same addr and of the same
+            # size. The last datagram in a group can be shorter.
+            if self._gso:
+                seg_size = len(data)
+                max_end = idx + min(GSO_MAX_SEGMENTS, GSO_MAX_SIZE // seg_size)
+                while end < num_queued and end < max_end:
+                    (next_data, next_addr) = queue[end]
+                    if next_addr != addr or len(next_data) > seg_size:
+                        break
+                    end += 1
+                    if len(next_data) < seg_size:
+                        break
+
+            if end - idx > 1 and self._send_gso(queue, idx, end):
+                idx = end
+                continue
+
+            # Single datagram (or GSO failed)
+            for (data, addr) in queue[idx:end]:
+                self._transport.sendto(data, addr)
+                self.num_syscalls += 1
+            idx = end
+
+    def _send_gso(self, queue, first, last):
+        """Send queue[first:last] in one GSO call. Returns False
+           if the datagrams must be sent by other means.
+        """
+
+        # Keep the order with the data already buffered in the transport
+        if self._transport.get_write_buffer_size():
+            return False
+
+        (data, addr) = queue[first]
+        cmsg = [(socket.SOL_UDP, UDP_SEGMENT, struct.pack('=H', len(data)))]
+
+        try:
+            # Segments are gathered by the kernel from the send buffers
+            self._sock.sendmsg([item[0] for item in queue[first:last]], cmsg, 0, addr)
+        except (BlockingIOError, InterruptedError):
+            # Socket is full - let the transport buffer the data
+            return False
+        except OSError as exc:
+            # E.g. NIC without checksum offload - give up on GSO
+            logging.warning('UDP GSO failed, disabling: %s', exc)
+            self._gso = False
+            return False
+
+        self.num_syscalls += 1
+        return True
 
     def register_receiver(self, receiver):
         self._receiver = receiver
@@ -35,13 +189,155 @@ class UdpServer(asyncio.DatagramProtocol):
     def connection_made(self, transport):
         self._transport = transport
 
+        # GSO is Linux only, reading in batches needs selector event loop
+        self._gso = self._gso and sys.platform.startswith('linux')
+        self._rx_batch = self._rx_batch if os.name == 'posix' else 0
+
+        if self._gso or self._rx_batch:
+            self._open_sock(transport.get_extra_info('socket'))
+
+        if self._sock is None:
+            self._gso = False
+            return
+
+        if self._gso:
+            try:
+                self._sock.getsockopt(socket.SOL_UDP, UDP_SEGMENT)
+            except OSError:
+                self._gso = False
+
+        if self._rx_batch:
+            # Take over reading from the transport
+            buffer = memoryview(bytearray(self._rx_batch * RX_BUF_SIZE))
+            self._rx_views = [buffer[idx:idx+RX_BUF_SIZE]
+                              for idx in range(0, len(buffer), RX_BUF_SIZE)]
+            transport.pause_reading()
+            asyncio.get_event_loop().add_reader(self._sock.fileno(), self._read_ready)
+
+        # Kernel timestamps are read from ancillary data in batch receive
+        if self._kernel_ts and self._rx_views is not None:
+            try:
+                self._sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+            except OSError:
+                self._kernel_ts = False
+        else:
+            self._kernel_ts = False
+
+    def _open_sock(self, transport_sock):
+        """Duplicate the transport socket (transport does not expose sendmsg
+           and recv_into)
+        """
+
+        if transport_sock is None:
+            return
+
+        try:
+            sock = socket.fromfd(transport_sock.fileno(), transport_sock.family,
+                                 transport_sock.type)
+        except (OSError, AttributeError):
+            return
+
+        sock.setblocking(False)
+        self._sock = sock
+
+    def _close_sock(self):
+        """Stop using the duplicated socket"""
+
+        if self._sock is None:
+            return
+
+        if self._rx_views is not None:
+            asyncio.get_event_loop().remove_reader(self._sock.fileno())
+            self._rx_views = None
+            self._kernel_ts = False
+
+        self._sock.close()
+        self._sock = None
+
+    def _read_ready(self):
+        """Read all available datagrams (up to the batch size) and give
+           them to the receiver. Data are views of the receive buffers, so
+           they are only valid until the receiver returns.
+        """
+
+        if self._kernel_ts:
+            self._read_ready_ts()
+            return
+
+        sock = self._sock
+        batch = []
+
+        rx_time = time.time()
+        for view in self._rx_views:
+            try:
+                (nbytes, addr) = sock.recvfrom_into(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as exc:
+                self.error_received(exc)
+                break
+
+            batch.append((view[:nbytes], addr, rx_time))
+
+        if batch:
+            self.num_received += len(batch)
+            self._receiver.datagrams_received(batch)
+
+    def _read_ready_ts(self):
+        """Same as _read_ready, but rx_time is the kernel timestamp"""
+
+        sock = self._sock
+        anc_size = socket.CMSG_SPACE(TIMESPEC.size)
+        batch = []
+        kernel_times = []
+
+        for view in self._rx_views:
+            try:
+                (nbytes, ancdata, _, addr) = sock.recvmsg_into([view], anc_size)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as exc:
+                self.error_received(exc)
+                break
+
+            rx_time = None
+            for (level, msg_type, data) in ancdata:
+                if level == socket.SOL_SOCKET and msg_type == SO_TIMESTAMPNS:
+                    (sec, nsec) = TIMESPEC.unpack_from(data)
+                    rx_time = sec + nsec / 1000000000
+                    kernel_times.append(rx_time)
+
+            batch.append((view[:nbytes], addr, rx_time))
+
+        if not batch:
+            return
+
+        # Datagrams without kernel timestamp get the userspace time
+        user_time = time.time()
+        if len(kernel_times) != len(batch):
+            batch = [(data, addr, user_time if rx_time is None else rx_time)
+                     for (data, addr, rx_time) in batch]
+
+        if kernel_times:
+            self.num_rx_ts += len(kernel_times)
+            self.rx_ts_gap_sum += len(kernel_times) * user_time - sum(kernel_times)
+            self.rx_ts_gap_max = max(self.rx_ts_gap_max, user_time - min(kernel_times))
+
+        self.num_received += len(batch)
+        self._receiver.datagrams_received(batch)
+
     def datagram_received(self, data, addr):
+        self.num_received += 1
         self._receiver.datagram_received(data, addr)
 
     def error_received(self, exc):
         logging.warning('Error received: %s', exc)
 
     def connection_lost(self, exc):
+        self._close_sock()
+        if self._hdl_flush is not None:
+            self._hdl_flush.cancel()
+            self._hdl_flush = None
         logging.error('Connection lost: %s', exc)
 
     def pause_writing(self):